@@ -0,0 +1,62 @@
+import json
+import os
+import time
+
+from chess.Game import Game
+
+# keeping the attack maps current on every move, against rebuilding them from
+# scratch after each one. plays the recorded tidewater match both ways.
+# run with: python -m bench.attacks
+
+BENCH = os.path.dirname(__file__)
+REPLAY = os.path.join(BENCH, "replays", "tidewater.json")
+ROUNDS = 20
+
+
+def load():
+    with open(REPLAY) as f:
+        record = json.load(f)
+    with open(os.path.join(BENCH, "configs", record["config"])) as f:
+        config = f.read()
+    return config, [(tuple(a), tuple(b)) for a, b in record["moves"]]
+
+
+def play(config: str, moves: list, incremental: bool) -> float:
+    """Seconds spent on moves plus having both maps current afterwards."""
+    total = 0.0
+    for _ in range(ROUNDS):
+        game = Game.from_config(config, [])
+        board = game.board
+        board.attack_map(0)
+        for from_pos, to_pos in moves:
+            start = time.perf_counter()
+            game.move_piece(from_pos, to_pos, validate=False)
+            if not incremental:
+                board.attack_counts = None
+            board.attack_map(0)
+            board.attack_map(1)
+            total += time.perf_counter() - start
+    return total
+
+
+def main() -> None:
+    config, moves = load()
+    plies = ROUNDS * len(moves)
+
+    full = play(config, moves, incremental=False) / plies * 1e6
+    incremental = play(config, moves, incremental=True) / plies * 1e6
+
+    game = Game.from_config(config, [])
+    start = time.perf_counter()
+    for _ in range(ROUNDS * 100):
+        game.board.threatened_pieces(0)
+    query = (time.perf_counter() - start) / (ROUNDS * 100) * 1e6
+
+    print(f"plies:           {len(moves)} x {ROUNDS}")
+    print(f"full rebuild:    {full:.1f} us per move")
+    print(f"incremental:     {incremental:.1f} us per move ({full / incremental:.1f}x)")
+    print(f"threatened:      {query:.1f} us per query")
+
+
+if __name__ == "__main__":
+    main()
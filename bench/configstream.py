@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import List, Tuple
+
+from chess import sandbox, valuation
+from chess.Game import Game
+from chess.match import Match
+from server.configstream import ConfigStreamParser
+from server.conn import Server
+from server.fakegen import CHUNK_DELAY, CHUNK_SIZE, FakeGemini
+
+# how long after gemini starts answering the players see the first piece and the
+# board is ready, streaming the config against waiting for all of it first.
+# gemini is stood in for by server.fakegen streaming a config from disk.
+# run with: python -m bench.configstream [config.json]
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(__file__), "configs", "tidewater.json")
+ROUNDS = 3
+# random chunkings the parser is checked against
+PARSER_CHECKS = 500
+
+
+class FakePlayer:
+    def __init__(self, match) -> None:
+        self.match = match
+        self.sent: List[Tuple[float, dict]] = []
+
+    async def send(self, obj: dict) -> None:
+        self.sent.append((time.perf_counter(), obj))
+
+
+def cold() -> None:
+    sandbox._cache.clear()
+    valuation._cache.clear()
+
+
+def check_parser(config_json: str) -> None:
+    config = json.loads(config_json)
+    rng = random.Random(0)
+    for _ in range(PARSER_CHECKS):
+        cuts = sorted(rng.sample(range(1, len(config_json)), rng.randint(1, 40)))
+        parser = ConfigStreamParser()
+        found = {"rulesets": [], "pieces": [], "starting_pos": []}
+        for start, end in zip([0] + cuts, cuts + [len(config_json)]):
+            for section, index, data in parser.feed(config_json[start:end]):
+                assert index == len(found[section])
+                found[section].append(data)
+        assert parser.done and found == {key: config[key] for key in found}, "parser disagrees with json.loads"
+    print(f"parser: {PARSER_CHECKS} random chunkings match json.loads")
+
+
+# each returns seconds until the first piece was shown, until the board was
+# ready, and from the last chunk arriving to the board being ready
+
+
+async def streaming(server: Server) -> Tuple[float, float, float]:
+    match = Match()
+    players = [FakePlayer(match), FakePlayer(match)]
+    start = time.perf_counter()
+    config_json = await server.stream_config(match, players)
+    await asyncio.to_thread(Game.from_config, config_json, [])
+    ready = time.perf_counter()
+    return players[0].sent[0][0] - start, ready - start, ready - server.gemini.models.finished
+
+
+async def buffered(server: Server) -> Tuple[float, float, float]:
+    start = time.perf_counter()
+    config_json = "".join(await asyncio.to_thread(lambda: list(server.generate_config())))
+    await asyncio.to_thread(Game.from_config, config_json, [])
+    ready = time.perf_counter()
+    # the vs screen had nothing to show until the board was built
+    return ready - start, ready - start, ready - server.gemini.models.finished
+
+
+async def run(path: str) -> None:
+    with open(path) as f:
+        size = len(f.read())
+    server = Server()
+    server._gemini = FakeGemini(path)
+    print(f"config: {path} ({size} bytes, {CHUNK_SIZE} byte chunks every {CHUNK_DELAY * 1000:.0f} ms)")
+    print(f"{'':<12} {'first piece':>12} {'board ready':>12} {'after last chunk':>17}")
+    for name, how in (("buffered", buffered), ("streaming", streaming)):
+        results = []
+        for _ in range(ROUNDS):
+            cold()
+            results.append(await how(server))
+        first, ready, tail = (min(r[i] for r in results) for i in range(3))
+        print(f"{name:<12} {first * 1000:>9.0f} ms {ready * 1000:>9.0f} ms {tail * 1000:>14.1f} ms")
+
+
+def main() -> None:
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CONFIG
+    with open(path) as f:
+        check_parser(f.read())
+    asyncio.run(run(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from chess.configstore import config_hash
+from server.conn import Server
+from server.journal import Journal, read_journal
+
+# what journaling costs the move handler (the append) and how many moves share
+# each fsync under load, and a check that a server recovers several live
+# matches (with their clocks and sessions) from what was journaled.
+# run with: python -m bench.journal
+
+MOVES = 20000
+MATCHES = 50
+
+BENCH = os.path.dirname(__file__)
+RECOVERY_CONFIG = os.path.join(BENCH, "configs", "tidewater.json")
+RECOVERY_REPLAY = os.path.join(BENCH, "replays", "tidewater.json")
+# live matches journaled for the recovery check, plus one that finished
+RECOVERY_MATCHES = 3
+
+
+async def check_recovery(tmp: str) -> None:
+    with open(RECOVERY_CONFIG) as f:
+        config = f.read()
+    with open(RECOVERY_REPLAY) as f:
+        moves = [(tuple(a), tuple(b)) for a, b in json.load(f)["moves"]]
+    path = os.path.join(tmp, "recovery.journal")
+    journal = Journal(path)
+    journal.recover()
+    journal.start()
+    h = config_hash(config)
+    journal.config(h, config)
+    for match_id in range(RECOVERY_MATCHES + 1):
+        players = [{"name": "white", "id": match_id * 2 + 1}, {"name": "black", "id": match_id * 2 + 2}]
+        journal.match_start(match_id, h, players, [f"token {match_id} {i}" for i in range(2)])
+        for i, (from_pos, to_pos) in enumerate(moves[: match_id + 4]):
+            journal.move(match_id, from_pos, to_pos, 500.0 - i)
+    journal.match_end(RECOVERY_MATCHES, 0, "resign")
+    await journal.close()
+
+    server = Server(journal_path=path)
+    server.recover_matches()
+    assert sorted(server.live_matches) == list(range(RECOVERY_MATCHES)), "live matches not recovered"
+    assert len(server.parked) == RECOVERY_MATCHES * 2, "sessions not parked"
+    for match_id, match in server.live_matches.items():
+        played = match_id + 4
+        assert match.move == played
+        # each side's clock is back to its time after its last move
+        expected = [500.0 - max(i for i in range(played) if i % 2 == team) for team in range(2)]
+        assert server.clocks[match_id].remaining == expected, "clocks not recovered"
+    print(f"recovery:         {len(server.live_matches)} live matches, {len(server.parked)} parked sessions")
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.journal")
+        journal = Journal(path)
+        journal.recover()
+        journal.start()
+
+        syncs = 0
+        write_and_sync = journal._write_and_sync
+
+        def counting_sync(data: bytes) -> None:
+            nonlocal syncs
+            syncs += 1
+            write_and_sync(data)
+
+        journal._write_and_sync = counting_sync
+
+        for match_id in range(MATCHES):
+            journal.config("00" * 32, "{}")
+            journal.match_start(match_id, "00" * 32, [], [])
+
+        append_time = 0.0
+        start = time.perf_counter()
+        for i in range(MOVES):
+            t = time.perf_counter()
+            journal.move(i % MATCHES, (1, 4), (2, 4))
+            append_time += time.perf_counter() - t
+            if i % 100 == 0:
+                # give the flusher a chance, like real traffic would
+                await asyncio.sleep(0)
+        await journal.close()
+        elapsed = time.perf_counter() - start
+
+        state = read_journal(path)
+        recovered = sum(len(m.moves) for m in state.matches.values())
+
+        print(f"append cost:      {append_time / MOVES * 1e6:.2f} us/move")
+        print(f"throughput:       {MOVES / elapsed:,.0f} moves/s")
+        print(f"fsyncs:           {syncs} ({MOVES / max(syncs, 1):.0f} moves per fsync)")
+        print(f"journal size:     {os.path.getsize(path)} bytes")
+
+        t = time.perf_counter()
+        read_journal(path)
+        print(f"replay read:      {(time.perf_counter() - t) * 1000:.1f} ms for {recovered} moves")
+
+        await check_recovery(tmp)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
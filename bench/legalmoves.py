@@ -0,0 +1,56 @@
+import os
+import time
+
+from chess.Game import Game
+from client.legalmoves import LegalMoveMap
+
+# what selecting a piece costs inside a frame: generating its moves on the spot
+# like the client used to, versus looking them up in the background move map.
+# run with: python -m bench.legalmoves
+
+CONFIG = os.path.join(os.path.dirname(__file__), "configs", "tidewater.json")
+ROUNDS = 200
+
+
+def main() -> None:
+    with open(CONFIG) as f:
+        game = Game.from_config(f.read(), [])
+    board = game.board
+    pieces = list(board.legal_moves(0))
+    # without attack maps, so moves really get generated
+    board.attack_counts = None
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for pos in pieces:
+            board.get_valid_actions(pos)
+    sync_us = (time.perf_counter() - start) / (ROUNDS * len(pieces)) * 1e6
+    worst_us = 0.0
+    for pos in pieces:
+        start = time.perf_counter()
+        board.get_valid_actions(pos)
+        worst_us = max(worst_us, (time.perf_counter() - start) * 1e6)
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        board.legal_moves(0)
+    map_ms = (time.perf_counter() - start) / ROUNDS * 1000
+
+    move_map = LegalMoveMap()
+    move_map.refresh(board, 0)
+    move_map.job.result()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for pos in pieces:
+            move_map.lookup(board, pos)
+    lookup_us = (time.perf_counter() - start) / (ROUNDS * len(pieces)) * 1e6
+    move_map.shutdown()
+
+    print(f"pieces:         {len(pieces)}")
+    print(f"select (sync):  {sync_us:.1f} us avg, {worst_us:.1f} us worst")
+    print(f"select (map):   {lookup_us:.2f} us")
+    print(f"full side map:  {map_ms:.2f} ms on the worker")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import asyncio
+import contextlib
+import os
+import random
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from client.conn import ClientConnection
+from client.game import ClientGame
+
+# a lobby join/leave storm hitting the client: applying it one packet per frame
+# (what handling each packet as it was read amounted to) against draining the
+# whole batch in one frame, with roster packets coalesced.
+# run with: python -m bench.lobby
+
+PACKETS = 5000
+
+
+def storm(rng: random.Random) -> list:
+    online = []
+    packets = []
+    next_id = 1000
+    for _ in range(PACKETS):
+        roll = rng.random()
+        if online and roll < 0.35:
+            player = online.pop(rng.randrange(len(online)))
+            packets.append({"type": "playerleave", "player": player})
+        elif online and roll < 0.45:
+            host = rng.choice(online)
+            packets.append({"type": "matchcreate", "host_id": host["id"]})
+        else:
+            player = {"id": next_id, "name": f"p{next_id}"}
+            next_id += 1
+            online.append(player)
+            packets.append({"type": "playerjoin", "player": player})
+    return packets
+
+
+def make_lobby() -> ClientGame:
+    client = ClientGame(ClientConnection())
+    client.connected = True
+    client.rebuilds = 0
+    update_player_count = client.update_player_count
+
+    def counted() -> None:
+        client.rebuilds += 1
+        update_player_count()
+
+    client.update_player_count = counted
+    return client
+
+
+async def per_packet(packets: list) -> ClientGame:
+    client = make_lobby()
+    for message in packets:
+        await client.receive_packet(message)
+        await client.process_inbox()
+        client.update_match_buttons()
+    return client
+
+
+async def batched(packets: list) -> ClientGame:
+    client = make_lobby()
+    for message in packets:
+        await client.receive_packet(message)
+    await client.process_inbox()
+    client.update_match_buttons()
+    return client
+
+
+async def main() -> None:
+    packets = storm(random.Random(3))
+    for name, apply in (("per packet", per_packet), ("batched", batched)):
+        # handle_packet prints every packet, which would swamp the numbers
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            client = await apply(packets)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(
+            f"{name:<11} {elapsed:8.1f} ms  {client.rebuilds} roster rebuilds, "
+            f"{len(client.players)} players, {len(client.join_list)} open matches"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
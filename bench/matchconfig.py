@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+
+from chess.configstore import ConfigStore, available_encodings
+from chess.protocol import BINARY_CODEC, JSON_CODEC
+
+# bytes on the wire for the matchconfig packets of one match start, and for a
+# resumed player or a spectator joining a match already under way.
+# run with: python -m bench.matchconfig [config.json]
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(__file__), "configs", "tidewater.json")
+
+
+def main() -> None:
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CONFIG
+    with open(path) as f:
+        config_json = f.read()
+
+    inline = {"type": "matchconfig", "config": config_json}
+    before = 2 * len(JSON_CODEC.encode(inline))
+    print(f"config: {path} ({len(config_json)} bytes of json)")
+    print(f"{'before (inline json, 2 players)':<44} {before:>7} bytes")
+
+    for encoding in available_encodings():
+        store = ConfigStore()
+        start = time.perf_counter()
+        stored = store.put(config_json)
+        full = stored.message(encoding)
+        compress_ms = (time.perf_counter() - start) * 1000
+        hash_only = stored.message(include_data=False)
+
+        for codec in (JSON_CODEC, BINARY_CODEC):
+            after = 2 * len(codec.encode(full))
+            cached = 2 * len(codec.encode(hash_only))
+            print(f"{f'after ({encoding}, {codec.name}, 2 players)':<44} {after:>7} bytes")
+            print(f"{f'after ({encoding}, {codec.name}, both cached)':<44} {cached:>7} bytes")
+        print(f"{f'compress once ({encoding})':<44} {compress_ms:>7.2f} ms")
+
+    # a new session used to always get the whole config, now it gets the hash
+    # first and only asks for the rest if its disk cache doesn't have it
+    stored = ConfigStore().put(config_json)
+    full = len(BINARY_CODEC.encode(stored.message()))
+    hash_only = len(BINARY_CODEC.encode(stored.message(include_data=False)))
+    configreq = len(BINARY_CODEC.encode({"type": "configreq", "hash": stored.hash}))
+    print(f"{'resume/spectate, before (bin1)':<44} {full:>7} bytes")
+    print(f"{'resume/spectate, cached on disk (bin1)':<44} {hash_only:>7} bytes")
+    print(f"{'spectate, not cached (bin1, +1 round trip)':<44} {hash_only + configreq + full:>7} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import asyncio
+import contextlib
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from chess.player import PlayerState
+from client.conn import ClientConnection
+from client.game import ClientGame
+
+# lobby frames with a busy server's worth of open matches: the matchlist
+# arriving, frames where nothing changed, frames with a few matches opening and
+# closing, and frames scrolling through the list.
+# run with: python -m bench.matchlist [matches]
+
+MATCHES = 10_000
+FRAMES = 120
+# matches opened and closed per churn frame
+CHURN = 5
+
+
+async def frame(client: ClientGame, packets: list = ()) -> float:
+    """One lobby frame with packets applied, in ms."""
+    for message in packets:
+        await client.receive_packet(message)
+    start = time.perf_counter()
+    await client.process_inbox()
+    client.needs_redraw = True
+    client.ui_manager.update(1 / 60)
+    client.render_gui(1 / 60)
+    return (time.perf_counter() - start) * 1000
+
+
+def report(name: str, times: list) -> None:
+    times.sort()
+    print(f"{name:<16} {sum(times) / len(times):8.2f} ms avg {times[len(times) * 99 // 100]:8.2f} ms p99")
+
+
+async def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else MATCHES
+    rng = random.Random(5)
+    client = ClientGame(ClientConnection())
+    client.connected = True
+    client.join_list.show()
+    client.watch_list.show()
+    for i in range(count + FRAMES * CHURN):
+        client.players[i] = PlayerState(name=f"host {i}", id=i)
+
+    # handle_packet prints every packet, which would swamp the numbers
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        matchlist = {
+            "type": "matchlist",
+            "matches": [{"host_id": i, "host_name": f"host {i}"} for i in range(count)],
+        }
+        first = await frame(client, [matchlist])
+
+        steady = [await frame(client) for _ in range(FRAMES)]
+
+        churn = []
+        next_id = count
+        for _ in range(FRAMES):
+            packets = []
+            for host_id in rng.sample(list(client.available_matches), CHURN):
+                packets.append({"type": "matchremove", "host_id": host_id})
+                packets.append({"type": "matchcreate", "host_id": next_id})
+                next_id += 1
+            churn.append(await frame(client, packets))
+
+        scrolling = []
+        for _ in range(FRAMES):
+            client.join_list.scroll(rng.randint(-3, 3))
+            scrolling.append(await frame(client))
+
+    print(f"{count} open matches, {len(client.join_list.buttons)} join rows on screen")
+    report("matchlist", [first])
+    report("steady", steady)
+    report(f"churn ({CHURN}+{CHURN})", churn)
+    report("scrolling", scrolling)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
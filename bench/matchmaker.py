@@ -0,0 +1,84 @@
+import random
+import time
+
+from server.matchmaker import MATCHMAKER_TICK, Matchmaker
+
+# thousands of players trickling into the matchmaking queue on a simulated
+# clock, ticked the same way the server does. reports how long people wait for
+# a pairing and what a tick costs.
+# run with: python -m bench.matchmaker
+
+PLAYERS = 5000
+ARRIVAL_RATE = 50.0  # players per second
+RATING_MEAN = 1500
+RATING_SPREAD = 350
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main() -> None:
+    rng = random.Random(1)
+    matchmaker = Matchmaker()
+
+    arrivals = []
+    now = 0.0
+    for player_id in range(PLAYERS):
+        now += rng.expovariate(ARRIVAL_RATE)
+        rating = int(rng.gauss(RATING_MEAN, RATING_SPREAD))
+        arrivals.append((now, player_id, rating))
+
+    enqueued_at = {}
+    waits = []
+    tick_times = []
+    peak_queue = 0
+    now = 0.0
+    i = 0
+    while i < len(arrivals) or len(matchmaker) > 1:
+        now += MATCHMAKER_TICK
+        while i < len(arrivals) and arrivals[i][0] <= now:
+            arrived, player_id, rating = arrivals[i]
+            matchmaker.enqueue(player_id, arrived, rating)
+            enqueued_at[player_id] = arrived
+            i += 1
+        peak_queue = max(peak_queue, len(matchmaker))
+
+        start = time.perf_counter()
+        pairs = matchmaker.pair(now)
+        tick_times.append(time.perf_counter() - start)
+
+        for p1, p2 in pairs:
+            waits.append(now - enqueued_at.pop(p1))
+            waits.append(now - enqueued_at.pop(p2))
+
+        if i >= len(arrivals) and not pairs and now > arrivals[-1][0] + 120:
+            break
+
+    print(f"players:       {PLAYERS} ({ARRIVAL_RATE:.0f}/s arriving)")
+    print(f"paired:        {len(waits)} ({len(matchmaker)} left over)")
+    print(f"peak queue:    {peak_queue}")
+    print(
+        f"wait:          p50 {percentile(waits, 0.5):.1f}s  "
+        f"p90 {percentile(waits, 0.9):.1f}s  p99 {percentile(waits, 0.99):.1f}s"
+    )
+    print(
+        f"tick:          mean {sum(tick_times) / len(tick_times) * 1e6:.1f} us  "
+        f"max {max(tick_times) * 1e6:.1f} us"
+    )
+
+    # worst case for a single tick: a big backlog that all pairs at once
+    matchmaker = Matchmaker()
+    for player_id in range(PLAYERS):
+        matchmaker.enqueue(player_id, 0.0, int(rng.gauss(RATING_MEAN, RATING_SPREAD)))
+    start = time.perf_counter()
+    pairs = matchmaker.pair(100.0)
+    print(
+        f"backlog tick:  {(time.perf_counter() - start) * 1000:.2f} ms "
+        f"({len(pairs)} pairs from {PLAYERS} queued)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import time
+from typing import Any
+
+from chess.protocol import BINARY_CODEC, JSON_CODEC
+
+# compares the newline json protocol against the binary framing.
+# run with: python -m bench.protocol
+
+ROUNDS = 20000
+
+SAMPLE_MESSAGES: dict[str, dict[str, Any]] = {
+    "move": {"type": "move", "from": [1, 4], "to": [3, 4]},
+    "move+seq": {"type": "move", "from": [6, 2], "to": [5, 3], "seq": 41},
+    "legalmoves": {
+        "type": "legalmoves",
+        "from": [0, 3],
+        "moves": [[1, 2], [1, 3], [1, 4], [2, 1], [2, 3], [2, 5], [3, 3]],
+    },
+    "playerjoin": {
+        "type": "playerjoin",
+        "player": {
+            "name": "tideweaver",
+            "id": 1234,
+            "color": None,
+            "ready": False,
+            "connected_at": 1760000000.123,
+        },
+    },
+    "matchcreate": {"type": "matchcreate", "host_id": 1234},
+}
+
+
+def time_encode(codec, message: dict[str, Any]) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        codec.encode(message)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+async def time_decode(codec, message: dict[str, Any]) -> float:
+    # goes through the same StreamReader path the connections use
+    frame = codec.encode(message)
+    reader = asyncio.StreamReader()
+    reader.feed_data(frame * ROUNDS)
+    reader.feed_eof()
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        decoded = await codec.read(reader)
+    elapsed = time.perf_counter() - start
+
+    if json.dumps(decoded, sort_keys=True) != json.dumps(message, sort_keys=True):
+        raise AssertionError(f"{codec.name} round trip mismatch: {decoded} != {message}")
+    return elapsed / ROUNDS
+
+
+async def main() -> None:
+    print(f"{'message':<12} {'codec':<5} {'bytes':>6} {'encode us':>10} {'decode us':>10}")
+    for label, message in SAMPLE_MESSAGES.items():
+        for codec in (JSON_CODEC, BINARY_CODEC):
+            size = len(codec.encode(message))
+            enc = time_encode(codec, message) * 1e6
+            dec = await time_decode(codec, message) * 1e6
+            print(f"{label:<12} {codec.name:<5} {size:>6} {enc:>10.2f} {dec:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
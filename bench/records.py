@@ -0,0 +1,72 @@
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from chess.configstore import config_hash
+from chess.Game import Game
+from chess.record import GameArchive, GameRecord
+from chess.replay import replay
+
+# size of the binary game archive against the json replays, and how fast
+# chess.replay checks an archive of random games in process and on a pool.
+# run with: python -m bench.records
+
+CONFIG = os.path.join(os.path.dirname(__file__), "configs", "tidewater.json")
+GAMES = 400
+SEED = 7
+
+
+def random_game(config: str, rng: random.Random) -> GameRecord:
+    game = Game.from_config(config, [])
+    moves = []
+    while game.result is None:
+        options = [
+            (from_pos, to_pos)
+            for from_pos, targets in game.board.legal_moves(game.current_turn).items()
+            for to_pos in targets
+        ]
+        move = rng.choice(options)
+        game.move_piece(*move)
+        moves.append(move)
+    return GameRecord(config_hash(config), moves, game.result.winner, game.result.reason)
+
+
+def main() -> None:
+    with open(CONFIG) as f:
+        config = f.read()
+    rng = random.Random(SEED)
+    records = [random_game(config, rng) for _ in range(GAMES)]
+    moves = sum(len(r.moves) for r in records)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.wtcr")
+        archive = GameArchive(path)
+        start = time.perf_counter()
+        for record in records:
+            archive.add(record, config)
+        write = time.perf_counter() - start
+
+        as_json = sum(
+            len(json.dumps({"config": record.config_hash, "moves": record.moves}))
+            for record in records
+        )
+        size = os.path.getsize(path)
+        print(f"games:        {GAMES}, {moves} moves")
+        print(f"archive:      {size} bytes ({size / moves:.2f} per move), json {as_json} bytes")
+        print(f"write:        {write / GAMES * 1e6:.1f} us per game")
+
+        for workers in sorted({1, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            games, replayed, diverged = replay([path], workers, out=io.StringIO())
+            elapsed = time.perf_counter() - start
+            print(
+                f"replay x{workers:<3}   {games / elapsed:.0f} games/s, "
+                f"{replayed / elapsed:.0f} moves/s, {diverged} diverged"
+            )
+
+
+if __name__ == "__main__":
+    main()
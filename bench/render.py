@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+# no window needed, sdl renders into memory
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from chess.Game import Game
+from client.conn import ClientConnection
+from client.game import ClientGame
+from client.render import RenderCache
+
+# frame time of the in-game board: full repaints with and without the render
+# cache (the uncached run rebuilds fonts, labels and squares every frame like the
+# client used to), dirty rect frames, and cpu use of the game loop left idle.
+# run with: python -m bench.render
+#
+# --replay plays a recorded match through the board renderer instead and
+# reports frame time percentiles. with --budget it exits non-zero when p99 goes
+# over, for catching render regressions on a ci box:
+#   python -m bench.render --replay bench/replays/tidewater.json --budget 4
+
+CONFIGS = os.path.join(os.path.dirname(__file__), "configs")
+CONFIG = os.path.join(CONFIGS, "tidewater.json")
+FRAMES = 600
+IDLE_SECONDS = 3.0
+
+
+class UncachedRenderCache(RenderCache):
+    """Same drawing, but nothing survives past the call that made it."""
+
+    def font(self, size):
+        self.fonts.clear()
+        return super().font(size)
+
+    def text(self, text, size, color):
+        self.texts.clear()
+        return super().text(text, size, color)
+
+    def wrap(self, text, size, width):
+        self.wrapped.clear()
+        return super().wrap(text, size, width)
+
+    def piece(self, name, team, square_size, ring, label):
+        self.pieces.clear()
+        return super().piece(name, team, square_size, ring, label)
+
+    def board(self, grid_size, square_size, my_team, light, dark):
+        self.boards.clear()
+        return super().board(grid_size, square_size, my_team, light, dark)
+
+
+def make_game() -> ClientGame:
+    client = ClientGame(ClientConnection())
+    with open(CONFIG) as f:
+        client.game = Game.from_config(f.read(), [])
+    client.game_state = "game"
+    client.opponent_name = "bench"
+    # hovering a piece also draws its info box
+    client.hovered_tile = (1, 4)
+    client.selected_tile = (1, 4)
+    client.valid_moves = [(2, 4), (3, 4)]
+    return client
+
+
+def frame_ms(client: ClientGame, full: bool, hover: bool = False) -> float:
+    client.render_gui(1 / 60)
+    start = time.perf_counter()
+    for i in range(FRAMES):
+        client.needs_redraw = full
+        if hover:
+            # sweep the mouse along an empty rank
+            client.hovered_tile = (3, i % 8)
+        client.render_gui(1 / 60)
+    return (time.perf_counter() - start) / FRAMES * 1000
+
+
+async def idle_cpu(client: ClientGame) -> float:
+    """Fraction of one core the game loop burns with nothing happening."""
+    client.last_activity = 0.0
+    loop = asyncio.create_task(client.game_loop())
+    await asyncio.sleep(0.5)
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    await asyncio.sleep(IDLE_SECONDS)
+    used = (time.process_time() - cpu) / (time.perf_counter() - wall)
+    client.running = False
+    await loop
+    return used
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def replay(client: ClientGame, path: str, full: bool, frames_per_move: int) -> list:
+    """Frame times (ms) of playing the recorded match like a player would.
+
+    Each move gets a frame selecting the piece, some frames hovering towards the
+    target, then the frame that shows the move landing.
+    """
+    with open(path) as f:
+        record = json.load(f)
+    with open(os.path.join(CONFIGS, record["config"])) as f:
+        client.game = Game.from_config(f.read(), [])
+    client.selected_tile = None
+    client.hovered_tile = None
+    client.valid_moves = []
+    client.needs_redraw = True
+    client.render_gui(1 / 60)
+
+    times = []
+
+    def frame() -> None:
+        client.needs_redraw = full
+        start = time.perf_counter()
+        client.render_gui(1 / 60)
+        times.append((time.perf_counter() - start) * 1000)
+
+    board = client.game.board
+    for from_pos, to_pos in record["moves"]:
+        from_pos, to_pos = tuple(from_pos), tuple(to_pos)
+        client.my_team = client.game.current_turn
+        client.hovered_tile = from_pos
+        client.selected_tile = from_pos
+        client.valid_moves = board.get_valid_actions(from_pos) or []
+        frame()
+
+        for i in range(1, frames_per_move):
+            # walk the mouse over to the target square
+            t = i / frames_per_move
+            client.hovered_tile = (
+                round(from_pos[0] + (to_pos[0] - from_pos[0]) * t),
+                round(from_pos[1] + (to_pos[1] - from_pos[1]) * t),
+            )
+            frame()
+
+        client.game.move_piece(from_pos, to_pos, validate=False)
+        client.selected_tile = None
+        client.valid_moves = []
+        client.hovered_tile = to_pos
+        frame()
+    return times
+
+
+def report_replay(args) -> int:
+    client = make_game()
+    failed = False
+    for name, full in (("full repaint", True), ("dirty rects", False)):
+        times = replay(client, args.replay, full, args.frames_per_move)
+        p99 = percentile(times, 0.99)
+        print(
+            f"{name:<13} {len(times)} frames  p50 {percentile(times, 0.5):.3f}  "
+            f"p90 {percentile(times, 0.9):.3f}  p99 {p99:.3f}  max {max(times):.3f} ms"
+        )
+        if args.budget is not None and p99 > args.budget:
+            print(f"  p99 over the {args.budget} ms budget")
+            failed = True
+    return 1 if failed else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay", help="recorded match to play through the renderer")
+    parser.add_argument("--frames-per-move", type=int, default=4)
+    parser.add_argument("--budget", type=float, help="fail when replay p99 exceeds this many ms")
+    args = parser.parse_args()
+    if args.replay:
+        sys.exit(report_replay(args))
+
+    client = make_game()
+
+    client.render_cache = UncachedRenderCache()
+    before = frame_ms(client, full=True)
+
+    client.render_cache = RenderCache()
+    after = frame_ms(client, full=True)
+    hover = frame_ms(client, full=False, hover=True)
+    still = frame_ms(client, full=False)
+
+    print(f"uncached frame: {before:.3f} ms")
+    print(f"cached frame:   {after:.3f} ms ({before / after:.1f}x)")
+    print(f"hover frame:    {hover:.3f} ms (dirty rects)")
+    print(f"still frame:    {still:.3f} ms (dirty rects)")
+
+    client.hovered_tile = None
+    cpu = asyncio.run(idle_cpu(client))
+    print(f"idle loop cpu:  {cpu * 100:.1f}% of a core")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import json
+import os
+import time
+
+from chess.Board import Board
+from chess.Game import Game
+from chess import sandbox
+from chess.rulecompiler import lower, normalise
+from chess.Ruleset import _normalise_func
+
+# cost of the ruleset compiler: lowering each mv_func/tk_func source to a table,
+# evaluating a whole config in the sandbox worker (cold and from the cache), a
+# vector lookup against calling the exec'd function and normalising its output
+# like the board used to, and get_valid_actions over the whole board.
+# run with: python -m bench.rulecompiler
+
+CONFIG = os.path.join(os.path.dirname(__file__), "configs", "tidewater.json")
+ROUNDS = 2000
+MOVE_NUMBERS = range(1, 41)
+
+
+def sources(config: dict) -> list:
+    return [
+        (_normalise_func(r["target_moves"]), _normalise_func(r["target_takes"]))
+        for r in config["rulesets"]
+    ]
+
+
+def legacy(src: str, namespace: dict):
+    ns: dict = {}
+    exec(src, dict(namespace), ns)
+    return [obj for name, obj in ns.items() if callable(obj) and not name.startswith("__")][0]
+
+
+def main() -> None:
+    with open(CONFIG) as f:
+        raw = f.read()
+    pairs = sources(json.loads(raw))
+
+    start = time.perf_counter()
+    tables = []
+    for mv, tk in pairs:
+        mv_table = lower(mv)
+        tables.append((mv_table, lower(tk, {"mv_func": mv_table})))
+    cold_us = (time.perf_counter() - start) / (2 * len(pairs)) * 1e6
+
+    start = time.perf_counter()
+    sandbox.evaluate(pairs)
+    worker_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        sandbox.evaluate(pairs)
+    cached_us = (time.perf_counter() - start) / ROUNDS * 1e6
+
+    shapes = [
+        f"{len(t.prefix)}+{len(t.cycle)}" if t.func is None else "memo"
+        for table in tables for t in table
+    ]
+    print(f"rulesets:      {len(pairs)} ({', '.join(shapes)} prefix+cycle entries)")
+    print(f"compile:       {cold_us:.1f} us per function")
+    print(f"sandbox:       {worker_ms:.1f} ms for the config in a worker, {cached_us:.2f} us cached")
+
+    funcs = []
+    for mv, tk in pairs:
+        mv_func = legacy(mv, {})
+        funcs.append((mv_func, legacy(tk, {"mv_func": mv_func})))
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS // 10):
+        for mv_func, tk_func in funcs:
+            for n in MOVE_NUMBERS:
+                [(-x, -y) for (x, y) in normalise(mv_func(n))]
+                [(-x, -y) for (x, y) in normalise(tk_func(n))]
+    calls = ROUNDS // 10 * len(funcs) * len(MOVE_NUMBERS) * 2
+    exec_us = (time.perf_counter() - start) / calls * 1e6
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS // 10):
+        for mv_table, tk_table in tables:
+            for n in MOVE_NUMBERS:
+                mv_table.lookup_flipped(n)
+                tk_table.lookup_flipped(n)
+    table_us = (time.perf_counter() - start) / calls * 1e6
+    print(f"vectors:       {exec_us:.2f} us exec'd call + normalise, {table_us:.2f} us lookup ({exec_us / table_us:.1f}x)")
+
+    board: Board = Game.from_config(raw, []).board
+    # without attack maps, so get_valid_actions generates instead of looking up
+    board.attack_counts = None
+    positions = [
+        (row, col)
+        for row in range(board.size)
+        for col in range(board.size)
+        if board.get_piece((row, col)) is not None
+    ]
+    start = time.perf_counter()
+    for _ in range(ROUNDS // 10):
+        for pos in positions:
+            board.get_valid_actions(pos)
+    actions_us = (time.perf_counter() - start) / (ROUNDS // 10 * len(positions)) * 1e6
+    print(f"valid actions: {actions_us:.1f} us per piece")
+
+
+if __name__ == "__main__":
+    main()
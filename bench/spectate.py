@@ -0,0 +1,69 @@
+import os
+import time
+
+from chess.Game import Game
+from chess.match import Match
+from chess.protocol import BINARY_CODEC, JSON_CODEC
+from server.spectate import MatchFeed
+
+# cost of fanning a move out to N spectators, i.e. what a mover pays on top of
+# their own move. sockets are stand-ins that just collect bytes.
+# run with: python -m bench.spectate
+
+CONFIG = os.path.join(os.path.dirname(__file__), "configs", "tidewater.json")
+MOVES = [((1, 4), (2, 4)), ((2, 4), (1, 4))]
+ROUNDS = 200
+
+
+class FakeTransport:
+    def is_closing(self) -> bool:
+        return False
+
+    def get_write_buffer_size(self) -> int:
+        return 0
+
+
+class FakeWriter:
+    def __init__(self) -> None:
+        self.transport = FakeTransport()
+        self.written = 0
+
+    def write(self, data: bytes) -> None:
+        self.written += len(data)
+
+
+class FakePlayer:
+    id = 0
+
+
+class FakeConnection:
+    def __init__(self, codec) -> None:
+        self.writer = FakeWriter()
+        self.codec = codec
+        self.spectating = None
+        self.player_state = FakePlayer()
+
+
+def main() -> None:
+    with open(CONFIG) as f:
+        config_json = f.read()
+
+    print(f"{'spectators':>10} {'us/move':>10} {'us/spectator':>13}")
+    for count in (0, 10, 100, 500, 1000):
+        game = Game.from_config(config_json, [])
+        feed = MatchFeed(Match(id=1, game=game))
+        for i in range(count):
+            # mixed codecs, so each move is encoded twice at most
+            feed.add_spectator(FakeConnection(BINARY_CODEC if i % 2 else JSON_CODEC))
+
+        start = time.perf_counter()
+        for i in range(ROUNDS):
+            from_pos, to_pos = MOVES[i % 2]
+            feed.fan_out(feed.publish_move(from_pos, to_pos))
+        per_move = (time.perf_counter() - start) / ROUNDS * 1e6
+        per_spectator = per_move / count if count else 0.0
+        print(f"{count:>10} {per_move:>10.1f} {per_spectator:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+# cold start costs, each measured in a fresh interpreter so nothing is already
+# imported: the client and server modules, the llm stack they used to pull in
+# eagerly, and how long the client takes to put its first frame up.
+# run with: python -m bench.startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 5
+
+IMPORT = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+FIRST_FRAME = """
+import os, time
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+start = time.perf_counter()
+from client.conn import ClientConnection
+from client.game import ClientGame
+game = ClientGame(ClientConnection())
+game.render_gui(0)
+print(time.perf_counter() - start)
+"""
+
+SERVER = """
+import time
+start = time.perf_counter()
+from server.conn import Server
+Server(journal_path=None)
+print(time.perf_counter() - start)
+"""
+
+
+def measure(code: str) -> float:
+    """Best of RUNS, in ms."""
+    times = []
+    for _ in range(RUNS):
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return min(times) * 1000
+
+
+def main() -> None:
+    print(f"import client.game:  {measure(IMPORT.format(module='client.game')):7.1f} ms")
+    print(f"import server.conn:  {measure(IMPORT.format(module='server.conn')):7.1f} ms")
+    print(f"server constructed:  {measure(SERVER):7.1f} ms")
+    print(f"client first frame:  {measure(FIRST_FRAME):7.1f} ms")
+    print(f"deferred google.genai: {measure(IMPORT.format(module='google.genai')):5.1f} ms")
+    print(f"deferred pydantic:     {measure(IMPORT.format(module='pydantic')):5.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import json
+import os
+import time
+
+from chess.Game import Game
+
+# checking for the end of the game after every move: the incremental counters
+# Game keeps, against rescanning the board for pieces, legal moves and the
+# position hash the way a caller without them would. Game doesn't need the
+# attack maps for this, it only scans for a piece that can move; the plain
+# board move with the maps on (as the client and engine keep them) is timed
+# for comparison.
+# run with: python -m bench.terminal
+
+BENCH = os.path.dirname(__file__)
+REPLAY = os.path.join(BENCH, "replays", "tidewater.json")
+ROUNDS = 20
+
+
+def load():
+    with open(REPLAY) as f:
+        record = json.load(f)
+    with open(os.path.join(BENCH, "configs", record["config"])) as f:
+        config = f.read()
+    return config, [(tuple(a), tuple(b)) for a, b in record["moves"]]
+
+
+def rescan(game: Game) -> bool:
+    board = game.board
+    to_move = game.current_turn
+    pieces = 0
+    position = [to_move]
+    for row in range(board.size):
+        for col in range(board.size):
+            piece = board.board[row][col]
+            if piece is not None:
+                pieces += piece.team == to_move
+                position.append((row, col, piece.kind, piece.team, piece.move_count))
+    hash(tuple(position))
+    if pieces == 0:
+        return True
+    return not any(board.legal_moves(to_move).values())
+
+
+def best_round(config: str, moves: list, step) -> float:
+    """Fastest of ROUNDS replays in us per move, the machine is noisy."""
+    best = float("inf")
+    for _ in range(ROUNDS):
+        game = Game.from_config(config, [])
+        start = time.perf_counter()
+        for from_pos, to_pos in moves:
+            step(game, from_pos, to_pos)
+        best = min(best, time.perf_counter() - start)
+    return best / len(moves) * 1e6
+
+
+def tracked(game: Game, from_pos, to_pos) -> None:
+    game.move_piece(from_pos, to_pos, validate=False)
+
+
+def maps_only(game: Game, from_pos, to_pos) -> None:
+    # built on the first move, then kept up to date by set_piece
+    game.board.attack_map(0)
+    game.board.move_piece(from_pos, to_pos)
+
+
+def scanned(game: Game, from_pos, to_pos) -> None:
+    # plain board moves and no attack maps, none of Game's bookkeeping
+    game.board.attack_counts = None
+    game.board.move_piece(from_pos, to_pos)
+    game.current_turn = 1 - game.current_turn
+    rescan(game)
+
+
+def main() -> None:
+    config, moves = load()
+
+    print(f"plies:       {len(moves)}, best of {ROUNDS}")
+    print(f"rescan:      {best_round(config, moves, scanned):.1f} us per move")
+    print(f"incremental: {best_round(config, moves, tracked):.1f} us per move (move_piece with result tracking)")
+    print(f"maps only:   {best_round(config, moves, maps_only):.1f} us per move (board move keeping attack maps)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import random
+import time
+
+from server.timers import TimerWheel
+
+# cost of the timer wheel with tens of thousands of live timers, roughly one
+# heartbeat per connection plus a clock per match.
+# run with: python -m bench.timers
+
+CONNECTIONS = 50000
+
+
+def main() -> None:
+    wheel = TimerWheel(tick=0.1)
+    fired = 0
+
+    def heartbeat() -> None:
+        nonlocal fired
+        fired += 1
+        # rescheduling is what every heartbeat does
+        wheel.schedule(15.0, heartbeat)
+
+    start = time.perf_counter()
+    timers = [wheel.schedule(random.uniform(0.1, 15.0), heartbeat) for _ in range(CONNECTIONS)]
+    schedule_us = (time.perf_counter() - start) / CONNECTIONS * 1e6
+
+    start = time.perf_counter()
+    for timer in timers[: CONNECTIONS // 10]:
+        timer.cancel()
+    cancel_us = (time.perf_counter() - start) / (CONNECTIONS // 10) * 1e6
+
+    # one simulated minute of ticks
+    ticks = 600
+    start = time.perf_counter()
+    for _ in range(ticks):
+        wheel.advance()
+    tick_ms = (time.perf_counter() - start) / ticks * 1000
+
+    print(f"live timers:   {len(wheel)}")
+    print(f"schedule:      {schedule_us:.2f} us")
+    print(f"cancel:        {cancel_us:.2f} us")
+    print(f"tick:          {tick_ms:.3f} ms ({fired} callbacks over {ticks} ticks)")
+
+
+if __name__ == "__main__":
+    main()
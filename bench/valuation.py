@@ -0,0 +1,41 @@
+import os
+import time
+
+from chess import valuation
+from chess.configstore import config_hash
+from chess.Game import Game
+
+# what the piece valuation pass costs when a config loads, cold and once the
+# config hash is cached, and the values it hands out.
+# run with: python -m bench.valuation
+
+CONFIG = os.path.join(os.path.dirname(__file__), "configs", "tidewater.json")
+ROUNDS = 20
+
+
+def main() -> None:
+    with open(CONFIG) as f:
+        config = f.read()
+    templates = Game.from_config(config, []).board.templates
+    digest = config_hash(config)
+
+    cold = 0.0
+    for _ in range(ROUNDS):
+        valuation._cache.clear()
+        start = time.perf_counter()
+        values = valuation.piece_values(digest, templates, 8)
+        cold += time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS * 100):
+        valuation.piece_values(digest, templates, 8)
+    cached = (time.perf_counter() - start) / (ROUNDS * 100)
+
+    print(f"cold:   {cold / ROUNDS * 1000:.2f} ms per config ({len(templates)} pieces, {valuation.SAMPLES} samples)")
+    print(f"cached: {cached * 1e6:.2f} us")
+    for template, value in sorted(zip(templates, values), key=lambda tv: -tv[1]):
+        print(f"  {template['name']:<16} {value}")
+
+
+if __name__ == "__main__":
+    main()
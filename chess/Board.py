@@ -3,7 +3,9 @@ import math
 from dataclasses import dataclass
 from typing import Optional
 
-from chess.Ruleset import Piece, Ruleset
+from chess.configstore import config_hash
+from chess.Ruleset import Piece, Ruleset, preload_rulesets
+from chess.valuation import piece_values
 
 
 class Board:
@@ -12,6 +14,24 @@ class Board:
         self.board: list[list[Optional[Piece]]] = [
             [None for _ in range(self.size)] for _ in range(self.size)
         ]
+        # piece types from the match config, indexed by Piece.kind
+        self.templates: list[dict] = []
+        # bumped on every change, so anything derived from the position can tell it's stale
+        self.version = 0
+
+        # attack maps, built on first use and then kept up to date by set_piece.
+        # attack_counts[team][row][col] is how many of team's pieces could take on
+        # that square if an enemy stood there.
+        self.attack_counts: Optional[list[list[list[int]]]] = None
+        # valid actions summed over each team's pieces, kept up to date alongside
+        self.mobility_counts = [0, 0]
+        # per piece: the squares it attacks, every square whose occupancy went
+        # into working out its attacks and actions, and its valid actions
+        self.attacks_from: dict[
+            tuple[int, int], tuple[list[tuple[int, int]], list[tuple[int, int]], list[tuple[int, int]]]
+        ] = {}
+        # square -> pieces whose attacks depend on what stands there
+        self.watchers: dict[tuple[int, int], set[tuple[int, int]]] = {}
 
     '''
     Piece manipulation
@@ -24,7 +44,19 @@ class Board:
         if row >= self.size or col >= self.size or row < 0 or col < 0: 
             return False
 
-        self.board[row][col] = piece
+        if self.attack_counts is None:
+            self.board[row][col] = piece
+        else:
+            # only the piece on this square and the pieces whose rays run
+            # through it can attack or move anywhere different afterwards
+            pos = (row, col)
+            affected = {pos, *self.watchers.get(pos, ())}
+            for attacker in affected:
+                self._remove_attacks(attacker)
+            self.board[row][col] = piece
+            for attacker in affected:
+                self._add_attacks(attacker)
+        self.version += 1
         return True
     
     def move_piece(self, from_pos: tuple[int, int], to_pos: tuple[int, int]) -> Optional[Piece]:
@@ -44,93 +76,201 @@ class Board:
     '''
 
     def get_valid_actions(self, piece_pos: tuple[int, int]) -> Optional[list[tuple[int, int]]]:
-        valid_actions: list[tuple[int, int]] = []
-
         # Check if current square is a piece or not
         # None in this case means it is NOT a piece
         if self.get_piece(piece_pos) is None:
             return None
-        piece: Piece = self.get_piece(piece_pos)
-        team: int = piece.team
 
-        flip_actions: bool = False
+        # with the attack maps up, every piece's actions are already worked out
+        entry = self.attacks_from.get(piece_pos) if self.attack_counts is not None else None
+        if entry is not None:
+            return list(entry[2])
+        return self._scan(piece_pos)[2]
 
-        if team % 2 == 1:
-            flip_actions = True
+    def _scan(
+        self, piece_pos: tuple[int, int]
+    ) -> tuple[list[tuple[int, int]], list[tuple[int, int]], list[tuple[int, int]]]:
+        """(attacked squares, squares whose occupancy was read, valid actions) of the piece at piece_pos.
+
+        A square counts as attacked whatever stands on it, so pieces defending
+        their own side show up too. Actions only take enemies.
+        """
+        valid_actions: list[tuple[int, int]] = []
+        attacked: set[tuple[int, int]] = set()
+        watched: set[tuple[int, int]] = set()
 
+        piece = self.get_piece(piece_pos)
         # Check for bounds
-        if not (0 <= piece_pos[0] < self.size and 0 <= piece_pos[1] < self.size):
-            return None
+        if piece is None or not (0 <= piece_pos[0] < self.size and 0 <= piece_pos[1] < self.size):
+            return [], [], valid_actions
 
+        board = self.board
+        size = self.size
+        flip_actions = piece.team % 2 == 1
+        n = piece.move_count + 1
         for rule_set in piece.rule_sets:
-            # First compute take at initial pos
-            tk_dir_vecs_raw = rule_set.tk_func(piece.move_count + 1)
-            mv_dir_vecs_raw = rule_set.mv_func(piece.move_count + 1)
-
-            tk_dir_vecs: list[tuple[int, int]] = self._normalise_vectors(tk_dir_vecs_raw)
-            mv_dir_vecs: list[tuple[int, int]] = self._normalise_vectors(mv_dir_vecs_raw)
-
+            # (row, col) vectors come out of the ruleset tables already normalised
+            # and flipped, so this is just a lookup
             if flip_actions:
-                mv_dir_vecs = [(-x, -y) for (x, y) in mv_dir_vecs]
-                tk_dir_vecs = [(-x, -y) for (x, y) in tk_dir_vecs]
-
-            # Extend moves to max range
-            #TODO: FUTURE ME OPTIMIZE THIS BRO
-
-            for dir_vec in tk_dir_vecs:
-                if rule_set.jump:
-                    # Jumping pieces move exactly to their targets
-                    take: tuple[int, int] = self.add_vec(dir_vec, piece_pos)
-                    if take not in valid_actions and self.is_valid_take(piece, take):
-                        valid_actions.append(take)
-                else:
-                    # Sliding pieces move along direction until blocked
-                    i: int = 1
-                    while i <= rule_set.max_range:
-                        take: tuple[int, int] = self.add_vec(self.scale_vec(dir_vec, i), piece_pos)
-                        if not (0 <= take[0] < self.size and 0 <= take[1] < self.size):
+                tk_dir_vecs = rule_set.tk_table.lookup_flipped(n)
+                mv_dir_vecs = rule_set.mv_table.lookup_flipped(n)
+            else:
+                tk_dir_vecs = rule_set.tk_table.lookup(n)
+                mv_dir_vecs = rule_set.mv_table.lookup(n)
+
+            # takes first, then moves, each vector in order
+            for dir_vecs, taking in ((tk_dir_vecs, True), (mv_dir_vecs, False)):
+                for dir_row, dir_col in dir_vecs:
+                    if rule_set.jump:
+                        # Jumping pieces move exactly to their targets
+                        row, col = piece_pos[0] + dir_row, piece_pos[1] + dir_col
+                        if not (0 <= row < size and 0 <= col < size):
+                            continue
+                        target = (row, col)
+                        watched.add(target)
+                        occupant = board[row][col]
+                        if taking:
+                            attacked.add(target)
+                            if occupant is not None and occupant.team != piece.team and target not in valid_actions:
+                                valid_actions.append(target)
+                        elif occupant is None and target not in valid_actions:
+                            valid_actions.append(target)
+                        continue
+
+                    # Sliding pieces move along direction until blocked. a vector like
+                    # (2, 2) lands every second step, but is blocked by anything on
+                    # the squares in between too, so walk it one unit step at a time
+                    steps = math.gcd(abs(dir_row), abs(dir_col))
+                    if steps == 0:
+                        continue
+                    unit_row, unit_col = dir_row // steps, dir_col // steps
+                    row, col = piece_pos
+                    for k in range(1, rule_set.max_range * steps + 1):
+                        row += unit_row
+                        col += unit_col
+                        if not (0 <= row < size and 0 <= col < size):
                             break  # Out of bounds
+                        target = (row, col)
+                        watched.add(target)
+                        occupant = board[row][col]
+                        if k % steps:
+                            if occupant is not None:
+                                break  # Another piece is in the way
+                            continue
 
-                        if not self._is_path_clear(piece_pos, take):
-                            break  # Another piece is in the way
+                        if taking:
+                            attacked.add(target)
+                            if occupant is None:
+                                continue
+                            if occupant.team != piece.team and target not in valid_actions:
+                                valid_actions.append(target)
+                            break  # Stop after encountering any piece
+
+                        if occupant is not None or target in valid_actions:
+                            break  # stop extending in this direction
+                        valid_actions.append(target)
+
+        return list(attacked), list(watched), valid_actions
+
+    def legal_moves(self, team: int) -> dict[tuple[int, int], list[tuple[int, int]]]:
+        """Valid actions of every piece on team, keyed by position."""
+        moves = {}
+        for row in range(self.size):
+            for col in range(self.size):
+                piece = self.board[row][col]
+                if piece is not None and piece.team == team:
+                    moves[(row, col)] = self.get_valid_actions((row, col)) or []
+        return moves
+
+    def has_moves(self, team: int) -> bool:
+        """Whether any of team's pieces has a valid action.
+
+        Reads the mobility count when the attack maps are up, otherwise scans
+        team's pieces until one can move, without building the maps.
+        """
+        if self.attack_counts is not None:
+            return self.mobility_counts[team % 2] > 0
+        for row in range(self.size):
+            for col in range(self.size):
+                piece = self.board[row][col]
+                if piece is not None and piece.team == team and self._scan((row, col))[2]:
+                    return True
+        return False
 
-                        target_piece = self.get_piece(take)
-                        if target_piece is None:
-                            i += 1
-                            continue
+    '''
+    Attack maps and mobility
+    '''
+
+    def attack_map(self, team: int) -> list[list[int]]:
+        """How many of team's pieces attack each square, indexed [row][col]. Don't modify it."""
+        if self.attack_counts is None:
+            self._build_attack_maps()
+        return self.attack_counts[team % 2]
+
+    def mobility(self, team: int) -> int:
+        """Number of valid actions team has, summed over its pieces."""
+        if self.attack_counts is None:
+            self._build_attack_maps()
+        return self.mobility_counts[team % 2]
+
+    def is_attacked(self, pos: tuple[int, int], by_team: int) -> bool:
+        return self.attack_map(by_team)[pos[0]][pos[1]] > 0
+
+    def threatened_pieces(self, team: int) -> list[tuple[int, int]]:
+        """Positions of team's pieces that the other team could take."""
+        enemy_attacks = self.attack_map(1 - team)
+        return [
+            (row, col)
+            for row in range(self.size)
+            for col in range(self.size)
+            if self.board[row][col] is not None
+            and self.board[row][col].team == team
+            and enemy_attacks[row][col] > 0
+        ]
+
+    def piece_attacks(self, piece_pos: tuple[int, int]) -> list[tuple[int, int]]:
+        """Squares the piece at piece_pos could take on if an enemy stood there."""
+        entry = self.attacks_from.get(piece_pos) if self.attack_counts is not None else None
+        if entry is not None:
+            return list(entry[0])
+        return self._scan(piece_pos)[0]
+
+    def _build_attack_maps(self) -> None:
+        self.attack_counts = [[[0] * self.size for _ in range(self.size)] for _ in range(2)]
+        self.mobility_counts = [0, 0]
+        self.attacks_from = {}
+        self.watchers = {}
+        for row in range(self.size):
+            for col in range(self.size):
+                self._add_attacks((row, col))
+
+    def _add_attacks(self, pos: tuple[int, int]) -> None:
+        piece = self.board[pos[0]][pos[1]]
+        if piece is None:
+            return
+        attacked, watched, actions = self._scan(pos)
+        team = piece.team % 2
+        counts = self.attack_counts[team]
+        for row, col in attacked:
+            counts[row][col] += 1
+        self.mobility_counts[team] += len(actions)
+        for square in watched:
+            self.watchers.setdefault(square, set()).add(pos)
+        self.attacks_from[pos] = (attacked, watched, actions)
+
+    def _remove_attacks(self, pos: tuple[int, int]) -> None:
+        entry = self.attacks_from.pop(pos, None)
+        if entry is None:
+            return
+        attacked, watched, actions = entry
+        team = self.board[pos[0]][pos[1]].team % 2
+        counts = self.attack_counts[team]
+        for row, col in attacked:
+            counts[row][col] -= 1
+        self.mobility_counts[team] -= len(actions)
+        for square in watched:
+            self.watchers[square].discard(pos)
 
-                        if (
-                            take not in valid_actions
-                            and target_piece.team != piece.team
-                        ):
-                            valid_actions.append(take)
-
-                        break  # Stop after encountering any piece
-
-            for dir_vec in mv_dir_vecs:
-                if rule_set.jump:
-                    # Jumping pieces move exactly to their targets
-                    move: tuple[int, int] = self.add_vec(dir_vec, piece_pos)
-                    if move not in valid_actions and self.is_valid_move(piece, move):
-                        valid_actions.append(move)
-                else:
-                    # Sliding pieces move along direction until blocked
-                    i: int = 1
-                    blocked: bool = False
-                    while i <= rule_set.max_range and not blocked:
-                        move: tuple[int, int] = self.add_vec(self.scale_vec(dir_vec, i), piece_pos)
-                        if not (0 <= move[0] < self.size and 0 <= move[1] < self.size):
-                            break  # Out of bounds
-                        if not self._is_path_clear(piece_pos, move):
-                            blocked = True
-                        elif move not in valid_actions and self.is_valid_move(piece, move):
-                            valid_actions.append(move)
-                        else:
-                            blocked = True  # stop extending in this direction
-                        i += 1
-
-        return valid_actions
-        
     def is_valid_take(self, curr_piece: Piece, pos: tuple[int, int]) -> bool:
         # Check in bounds
         if not (0 <= pos[0] < self.size and 0 <= pos[1] < self.size):
@@ -163,51 +303,59 @@ class Board:
     Helper Functions
     '''
 
-    def _normalise_vectors(self, vectors: Optional[list[tuple[int, int]]]) -> list[tuple[int, int]]:
-        """Convert (x, y) offsets from configs into (row, col) board deltas."""
-        if not vectors:
-            return []
-
-        normalised: list[tuple[int, int]] = []
-        for vec in vectors:
-            if not isinstance(vec, (tuple, list)) or len(vec) != 2:
-                continue
-            x, y = int(vec[0]), int(vec[1])
-            normalised.append((y, x))
-        return normalised
-
     def add_vec(self, a: tuple[int, int], b: tuple[int, int]) -> tuple[int, int]:
         return (a[0] + b[0], a[1] + b[1])
 
     def scale_vec(self, v: tuple[int, int], k: int) -> tuple[int, int]:
         return (v[0] * k, v[1] * k)
 
-    def _is_path_clear(self, start: tuple[int, int], end: tuple[int, int]) -> bool:
-        """Ensure no pieces block a non-jumping move between start and end (exclusive)."""
-        delta_row = end[0] - start[0]
-        delta_col = end[1] - start[1]
-
-        steps = math.gcd(abs(delta_row), abs(delta_col))
-        if steps <= 1:
-            return True
-
-        step_row = delta_row // steps
-        step_col = delta_col // steps
-
-        current_row, current_col = start
-        for _ in range(steps - 1):
-            current_row += step_row
-            current_col += step_col
-            if self.get_piece((current_row, current_col)) is not None:
-                return False
+    def make_piece(self, kind: int, team: int, move_count: int = 0) -> Piece:
+        template = self.templates[kind]
+        return Piece(
+            name=template["name"],
+            piece_desc=template["piece_desc"],
+            move_desc=template["move_desc"],
+            rule_sets=template["rule_sets"],
+            value=template["value"],
+            move_count=move_count,
+            team=team,
+            kind=kind,
+        )
+
+    def snapshot(self) -> list[list[int]]:
+        """Compact [row, col, kind, team, move_count] list of every piece."""
+        pieces = []
+        for row in range(self.size):
+            for col in range(self.size):
+                piece = self.board[row][col]
+                if piece is not None:
+                    pieces.append([row, col, piece.kind, piece.team, piece.move_count])
+        return pieces
+
+    def copy(self) -> 'Board':
+        """Copy of the grid sharing the same Piece objects. Attack maps get rebuilt on use."""
+        board = Board(self.size)
+        board.templates = self.templates
+        board.board = [row[:] for row in self.board]
+        board.version = self.version
+        return board
 
-        return True
+    def load_snapshot(self, pieces: list[list[int]]) -> None:
+        self.board = [[None for _ in range(self.size)] for _ in range(self.size)]
+        self.version += 1
+        # rebuilt on next use, cheaper than updating them piece by piece
+        self.attack_counts = None
+        for row, col, kind, team, move_count in pieces:
+            self.set_piece(row, col, self.make_piece(kind, team, move_count))
 
     @classmethod
     def from_config(cls, config_json: str) -> 'Board':
         config = json.loads(config_json)
 
         # Create rulesets
+        preload_rulesets(
+            [(data["target_moves"], data["target_takes"]) for data in config["rulesets"]]
+        )
         rulesets = []
         for ruleset_data in config["rulesets"]:
             ruleset = Ruleset(
@@ -220,20 +368,26 @@ class Board:
 
         # Create piece templates
         piece_templates = []
-        for piece_data in config["pieces"]:
+        for kind, piece_data in enumerate(config["pieces"]):
             piece_rulesets = [rulesets[i] for i in piece_data["rulesets"]]
             piece_template = {
                 "name": piece_data["name"],
                 "piece_desc": piece_data["desc"],
                 "move_desc": piece_data["move_desc"],
                 "rule_sets": piece_rulesets,
-                "value": 10,  # default value
-                "move_count": 0
+                "value": 0,  # filled in below, once every template exists
+                "move_count": 0,
+                "kind": kind,
             }
             piece_templates.append(piece_template)
 
+        # worth of each piece type estimated from how far it reaches
+        for template, value in zip(piece_templates, piece_values(config_hash(config_json), piece_templates, 8)):
+            template["value"] = value
+
         # Create board
         board = cls(size=8)
+        board.templates = piece_templates
 
         # Place pieces for both teams
         for start_pos in config["starting_pos"]:
@@ -248,7 +402,8 @@ class Board:
                 rule_sets=piece_template["rule_sets"],
                 value=piece_template["value"],
                 move_count=piece_template["move_count"],
-                team=0
+                team=0,
+                kind=piece_template["kind"],
             )
             board.set_piece(y, x, piece_team0)
 
@@ -260,7 +415,8 @@ class Board:
                 rule_sets=piece_template["rule_sets"],
                 value=piece_template["value"],
                 move_count=piece_template["move_count"],
-                team=1
+                team=1,
+                kind=piece_template["kind"],
             )
             mirrored_y = 7 - y
             board.set_piece(mirrored_y, x, piece_team1)
@@ -1,6 +1,67 @@
+import math
+import random
+from dataclasses import dataclass
 from chess.Board import Board
 from chess.Ruleset import Piece
-from typing import List, Optional
+from typing import Dict, List, Optional
+
+# a game still going after this many plies is a draw
+MAX_PLIES = 400
+# the same position (pieces and side to move) coming up this many times is a draw
+REPETITION_LIMIT = 3
+# the ways a game ends on the board, as opposed to timeouts, disconnects and so on
+RESULT_REASONS = ("eliminated", "no_moves", "move_cap", "repetition")
+
+# zobrist keys per (kind, team, square, phase), made on first use. seeded so
+# every process hashes positions the same way.
+_zobrist_rng = random.Random(0x5EED)
+_zobrist_keys: Dict[tuple, int] = {}
+SIDE_KEY = _zobrist_rng.getrandbits(64)
+
+
+def _phase(piece: Piece, move_count: int) -> int:
+    """Where the piece is in its move tables, equal for move counts that move the same.
+
+    Past the longest table prefix every table just cycles, so the count only
+    matters mod the cycle lengths from there on.
+    """
+    n = move_count + 1
+    prefix, cycle = 0, 1
+    for rule_set in piece.rule_sets:
+        period = rule_set.period
+        if period is None:
+            return n  # vectors come from a function, any count could differ
+        prefix = max(prefix, period[0])
+        cycle = math.lcm(cycle, period[1])
+    if n <= prefix:
+        return n
+    return prefix + 1 + n % cycle
+
+
+def _zobrist(piece: Piece, pos: tuple[int, int], move_count: int) -> int:
+    # the move count matters, the same piece on the same square can have other moves
+    key = (piece.kind, piece.team, pos, _phase(piece, move_count))
+    value = _zobrist_keys.get(key)
+    if value is None:
+        value = _zobrist_keys[key] = _zobrist_rng.getrandbits(64)
+    return value
+
+
+@dataclass
+class MoveRecord:
+    """Everything needed to take a move back."""
+    from_pos: tuple[int, int]
+    to_pos: tuple[int, int]
+    piece: Piece
+    captured: Optional[Piece]
+    turn: int
+
+
+@dataclass
+class GameResult:
+    winner: Optional[int]  # None for a draw
+    reason: str  # one of RESULT_REASONS
+
 
 class Game:
     def __init__(self, players: List):
@@ -9,6 +70,15 @@ class Game:
         self.white_taken: List[Piece] = []
         self.black_taken: List[Piece] = []
         self.current_turn = 0
+        self.history: List[MoveRecord] = []
+
+        # kept up to date by move_piece and undo_move so checking for the end
+        # of the game never has to scan the board
+        self.piece_counts = [0, 0]
+        self.ply = 0
+        self.position_hash = 0
+        self.position_counts: Dict[int, int] = {}
+        self.result: Optional[GameResult] = None
 
     def move_piece(
         self,
@@ -23,7 +93,7 @@ class Game:
 
         mover_team = piece.team
 
-        if validate and mover_team != self.current_turn:
+        if validate and (mover_team != self.current_turn or self.result is not None):
             return False
 
         if validate:
@@ -31,6 +101,8 @@ class Game:
             if valid_moves is None or to_pos not in valid_moves:
                 return False
 
+        # counted before the board moves it, so the attack maps see the new count
+        piece.move_count += 1
         killed_piece = self.board.move_piece(from_pos, to_pos)
 
         if killed_piece is not None:
@@ -39,10 +111,94 @@ class Game:
             else:
                 self.black_taken.append(killed_piece)
 
-        piece.move_count += 1
+        self.history.append(
+            MoveRecord(from_pos, to_pos, piece, killed_piece, self.current_turn)
+        )
         self.current_turn = 1 - mover_team
+
+        self._hash_move(piece, from_pos, to_pos, killed_piece)
+        if killed_piece is not None:
+            self.piece_counts[killed_piece.team % 2] -= 1
+        self.ply += 1
+        self.position_counts[self.position_hash] = self.position_counts.get(self.position_hash, 0) + 1
+        self.result = self.check_result()
         return True
 
+    def undo_move(self) -> Optional[MoveRecord]:
+        """Takes back the last move, None if there is nothing to take back."""
+        if not self.history:
+            return None
+        record = self.history.pop()
+
+        remaining = self.position_counts[self.position_hash] - 1
+        if remaining:
+            self.position_counts[self.position_hash] = remaining
+        else:
+            del self.position_counts[self.position_hash]
+        self._hash_move(record.piece, record.from_pos, record.to_pos, record.captured)
+        if record.captured is not None:
+            self.piece_counts[record.captured.team % 2] += 1
+        self.ply -= 1
+        # the game went on from here, so it wasn't over
+        self.result = None
+
+        record.piece.move_count -= 1
+        self.board.set_piece(record.from_pos[0], record.from_pos[1], record.piece)
+        self.board.set_piece(record.to_pos[0], record.to_pos[1], record.captured)
+
+        if record.captured is not None:
+            taken = self.white_taken if record.captured.team == 0 else self.black_taken
+            taken.pop()
+
+        self.current_turn = record.turn
+        return record
+
+    def load_snapshot(self, turn: int, pieces: list[list[int]], ply: int = 0) -> None:
+        self.board.load_snapshot(pieces)
+        self.current_turn = turn
+        # nothing before a snapshot can be taken back
+        self.history.clear()
+        self.reset_tracking(ply)
+
+    def reset_tracking(self, ply: int = 0) -> None:
+        """Recounts pieces and rehashes the position, after the board was replaced wholesale."""
+        self.piece_counts = [0, 0]
+        self.position_hash = SIDE_KEY if self.current_turn else 0
+        for row in range(self.board.size):
+            for col in range(self.board.size):
+                piece = self.board.board[row][col]
+                if piece is not None:
+                    self.piece_counts[piece.team % 2] += 1
+                    self.position_hash ^= _zobrist(piece, (row, col), piece.move_count)
+        self.ply = ply
+        # repetitions from before this point are forgotten
+        self.position_counts = {self.position_hash: 1}
+        self.result = self.check_result()
+
+    def check_result(self) -> Optional[GameResult]:
+        """How the game ended, or None if the side to move can still play on."""
+        to_move = self.current_turn
+        if self.piece_counts[to_move] == 0:
+            return GameResult(1 - to_move, "eliminated")
+        if not self.board.has_moves(to_move):
+            # nothing to move is a loss, there's no check to make it a stalemate
+            return GameResult(1 - to_move, "no_moves")
+        if self.position_counts.get(self.position_hash, 0) >= REPETITION_LIMIT:
+            return GameResult(None, "repetition")
+        if self.ply >= MAX_PLIES:
+            return GameResult(None, "move_cap")
+        return None
+
+    def _hash_move(
+        self, piece: Piece, from_pos: tuple[int, int], to_pos: tuple[int, int], captured: Optional[Piece]
+    ) -> None:
+        # xor is its own inverse, the same call takes the move back out. piece's
+        # move count is the one after the move both ways
+        moved = piece.move_count
+        self.position_hash ^= _zobrist(piece, from_pos, moved - 1) ^ _zobrist(piece, to_pos, moved) ^ SIDE_KEY
+        if captured is not None:
+            self.position_hash ^= _zobrist(captured, to_pos, captured.move_count)
+
     def get_current_player(self) -> str:
         return "white" if self.current_turn == 0 else "black"
 
@@ -58,4 +214,5 @@ class Game:
     def from_config(cls, config_json: str, players: List):
         game = cls(players)
         game.board = Board.from_config(config_json)
+        game.reset_tracking()
         return game
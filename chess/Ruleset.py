@@ -1,5 +1,8 @@
+import math
 from dataclasses import dataclass
-from typing import Callable, List, Tuple
+from typing import Callable, List, Optional, Tuple
+
+from chess import sandbox
 
 
 def _normalise_func(src: str) -> str:
@@ -70,18 +73,35 @@ class Ruleset:
     max_range: int
 
     def __init__(self, mv_func_str: str, tk_func_str: str):
-        mv_ns: dict[str, object] = {}
-        exec(_normalise_func(mv_func_str), {}, mv_ns)
-        user_callables = [obj for name, obj in mv_ns.items() if callable(obj) and not name.startswith('__')]
-        self.mv_func = user_callables[0]
-
-        tk_ns: dict[str, object] = {}
-        exec(_normalise_func(tk_func_str), {}, tk_ns)
-        user_callables = [obj for name, obj in tk_ns.items() if callable(obj) and not name.startswith('__')]
-        self.tk_func = user_callables[0]
+        # (row, col) vectors per move number, see chess/rulecompiler.py. the
+        # sources never run in this process, chess/sandbox.py evaluates them.
+        self.mv_table, self.tk_table = sandbox.evaluate_one(
+            _normalise_func(mv_func_str), _normalise_func(tk_func_str)
+        )
+        # the tables are callable like the original functions
+        self.mv_func = self.mv_table
+        self.tk_func = self.tk_table
+        # (prefix, cycle) both tables repeat with, None if either one has no table
+        self.period: Optional[Tuple[int, int]] = None
+        if self.mv_table.func is None and self.tk_table.func is None:
+            self.period = (
+                max(len(self.mv_table.prefix), len(self.tk_table.prefix)),
+                math.lcm(len(self.mv_table.cycle), len(self.tk_table.cycle)),
+            )
         self.jump = False
         self.max_range = 1
 
+
+def preload_rulesets(sources: List[Tuple[str, str]]) -> None:
+    """Evaluates (mv_func, tk_func) sources in one sandbox worker.
+
+    Ruleset() evaluates its own sources, this just saves starting a worker per
+    ruleset when loading a whole config. Raises RuleCompileError if any of them
+    are rejected.
+    """
+    sandbox.evaluate([(_normalise_func(mv), _normalise_func(tk)) for mv, tk in sources])
+
+
 @dataclass
 class Piece:
     name: str
@@ -92,3 +112,5 @@ class Piece:
     value: int
     move_count: int
     team: int
+    # index of the piece type in the match config, -1 for hand made pieces
+    kind: int = -1
@@ -0,0 +1,131 @@
+import base64
+import hashlib
+import os
+import zlib
+from dataclasses import dataclass, field
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # optional, zlib is always available
+    zstandard = None
+
+# match configs are referenced by the sha256 of their json text. the server
+# compresses each config once and reuses the blob for every recipient, clients
+# keep a copy on disk so rematches, reconnects and spectators can skip the
+# transfer when they already have it.
+
+ENCODING_ZLIB = "zlib"
+ENCODING_ZSTD = "zstd"
+ENCODINGS = [ENCODING_ZLIB, ENCODING_ZSTD]
+
+
+def available_encodings() -> list[str]:
+    if zstandard is not None:
+        return [ENCODING_ZSTD, ENCODING_ZLIB]
+    return [ENCODING_ZLIB]
+
+
+def config_hash(config_json: str) -> str:
+    return hashlib.sha256(config_json.encode()).hexdigest()
+
+
+def compress_config(config_json: str, encoding: str = ENCODING_ZLIB) -> bytes:
+    data = config_json.encode()
+    if encoding == ENCODING_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstandard is not installed")
+        return zstandard.ZstdCompressor(level=19).compress(data)
+    if encoding == ENCODING_ZLIB:
+        return zlib.compress(data, 9)
+    raise ValueError(f"unknown config encoding {encoding}")
+
+
+def decompress_config(blob: bytes, encoding: str = ENCODING_ZLIB) -> str:
+    if encoding == ENCODING_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob).decode()
+    if encoding == ENCODING_ZLIB:
+        return zlib.decompress(blob).decode()
+    raise ValueError(f"unknown config encoding {encoding}")
+
+
+@dataclass
+class StoredConfig:
+    hash: str
+    config_json: str
+    # opening book (see chess.opening), sent along to clients that ask for it
+    book: Optional[dict] = None
+    # encoding -> base64 of the compressed blob, filled in lazily and then reused
+    _payloads: dict[str, str] = field(default_factory=dict)
+
+    def payload(self, encoding: str = ENCODING_ZLIB) -> str:
+        if encoding not in self._payloads:
+            blob = compress_config(self.config_json, encoding)
+            self._payloads[encoding] = base64.b64encode(blob).decode()
+        return self._payloads[encoding]
+
+    def message(
+        self, encoding: Optional[str] = None, *, include_data: bool = True, include_book: bool = False
+    ) -> dict:
+        message = {"type": "matchconfig", "hash": self.hash}
+        if include_data:
+            encoding = encoding or ENCODING_ZLIB
+            message["encoding"] = encoding
+            message["data"] = self.payload(encoding)
+        if include_book and self.book:
+            message["book"] = self.book
+        return message
+
+
+class ConfigStore:
+    """Server side, in-memory configs keyed by hash."""
+
+    def __init__(self) -> None:
+        self.configs: dict[str, StoredConfig] = {}
+
+    def put(self, config_json: str) -> StoredConfig:
+        h = config_hash(config_json)
+        if h not in self.configs:
+            self.configs[h] = StoredConfig(h, config_json)
+        return self.configs[h]
+
+    def get(self, h: str) -> Optional[StoredConfig]:
+        return self.configs.get(h)
+
+
+class ConfigCache:
+    """Client side, configs cached on disk keyed by hash."""
+
+    def __init__(self, directory: Optional[str] = None) -> None:
+        self.directory = directory or os.path.join(
+            os.path.expanduser("~"), ".cache", "what-the-chess", "configs"
+        )
+
+    def path(self, h: str) -> str:
+        return os.path.join(self.directory, f"{h}.json.z")
+
+    def has(self, h: str) -> bool:
+        return os.path.exists(self.path(h))
+
+    def get(self, h: str) -> Optional[str]:
+        try:
+            with open(self.path(h), "rb") as f:
+                config_json = decompress_config(f.read())
+        except (OSError, zlib.error, UnicodeDecodeError):
+            return None
+        # don't trust a corrupted or tampered cache entry
+        if config_hash(config_json) != h:
+            return None
+        return config_json
+
+    def put(self, h: str, config_json: str) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = self.path(h) + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(compress_config(config_json))
+            os.replace(tmp, self.path(h))
+        except OSError as e:
+            print(f"Failed to cache config {h[:12]}: {e}")
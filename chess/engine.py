@@ -0,0 +1,210 @@
+import random
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+
+from chess.Game import Game
+
+# computer player. searches by playing moves on the real Game and taking them
+# back with undo_move, so the attack maps, mobility and result tracking all come
+# along for free: an alpha-beta negamax, deepened one ply at a time until the
+# move's time runs out, keeping the best move of the deepest search that
+# finished.
+#
+# positions are scored for the side to move as material (Piece.value, which
+# comes from the config's valuation) plus a little for mobility.
+#
+# given an opening book (chess.opening) the engine plays straight from it while
+# the game is still in book.
+#
+# variants are named presets (see VARIANTS) that can be tweaked on the command
+# line, "alphabeta:depth=3,mobility=0" say, so tournaments can pit settings
+# against each other.
+
+WIN_SCORE = 1_000_000
+# longest line a search could find a forced result in, for telling win scores apart
+MAX_SEARCH_PLY = 256
+# deadline checked every this many nodes, perf_counter isn't free
+CHECK_EVERY = 64
+
+Move = Tuple[Tuple[int, int], Tuple[int, int]]
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Variant:
+    name: str
+    # deepest iteration, 0 picks moves at random
+    depth: int = 64
+    # score per valid action more than the opponent has
+    mobility: float = 1.0
+    # search captures first, best victim for the least valuable attacker
+    order: bool = True
+
+
+VARIANTS: Dict[str, Variant] = {
+    "random": Variant("random", depth=0),
+    "greedy": Variant("greedy", depth=1),
+    "alphabeta": Variant("alphabeta"),
+    "material": Variant("material", mobility=0.0),
+    "unordered": Variant("unordered", order=False),
+}
+
+
+def parse_variant(spec: str) -> Variant:
+    """A preset from VARIANTS, optionally with settings overridden: "alphabeta:depth=3"."""
+    name, _, overrides = spec.partition(":")
+    if name not in VARIANTS:
+        raise ValueError(f"unknown engine {name}, pick from {', '.join(VARIANTS)}")
+    variant = VARIANTS[name]
+    changes = {}
+    for override in filter(None, overrides.split(",")):
+        key, _, value = override.partition("=")
+        if key == "depth":
+            changes[key] = int(value)
+        elif key == "mobility":
+            changes[key] = float(value)
+        elif key == "order":
+            changes[key] = value.lower() in ("1", "true", "yes")
+        else:
+            raise ValueError(f"unknown engine setting {key}")
+    # the spec is the name, so results from different settings don't get mixed up
+    return replace(variant, name=spec, **changes)
+
+
+@dataclass
+class SearchResult:
+    move: Optional[Move]
+    score: float
+    depth: int  # deepest search that finished
+    nodes: int
+    elapsed: float
+
+
+class Engine:
+    def __init__(self, variant: Variant, seed: int = 0, book: Optional[dict] = None) -> None:
+        self.variant = variant
+        self.book = book
+        self.rng = random.Random(seed)
+        self.nodes = 0
+        self.deadline = 0.0
+
+    def choose_move(self, game: Game, move_time: float) -> SearchResult:
+        """Best move for the side to move, searching for about move_time seconds."""
+        start = time.perf_counter()
+        self.nodes = 0
+        self.deadline = start + move_time
+
+        moves = self._moves(game)
+        if not moves or game.result is not None:
+            return SearchResult(None, 0.0, 0, 0, 0.0)
+        if self.book:
+            # imported here, chess.opening builds its books with this engine
+            from chess.opening import book_move
+
+            hit = book_move(self.book, game)
+            if hit is not None:
+                return SearchResult(hit[0], hit[1], 0, 0, time.perf_counter() - start)
+        if self.variant.depth == 0:
+            return SearchResult(self.rng.choice(moves), 0.0, 0, 0, time.perf_counter() - start)
+
+        # shuffled once so equal moves don't always go to the first piece on the board
+        self.rng.shuffle(moves)
+        best: Tuple[Optional[Move], float] = (moves[0], 0.0)
+        finished = 0
+        # the material balance is carried through the search instead of recounted per leaf
+        material = self._material(game)
+        for depth in range(1, self.variant.depth + 1):
+            try:
+                best = self._root(game, moves, depth, material)
+            except SearchTimeout:
+                break
+            finished = depth
+            # search the best move first next time, it makes the cutoffs
+            moves.remove(best[0])
+            moves.insert(0, best[0])
+            if abs(best[1]) >= WIN_SCORE - MAX_SEARCH_PLY:
+                break  # found a forced result, deeper won't change it
+        return SearchResult(best[0], best[1], finished, self.nodes, time.perf_counter() - start)
+
+    def _root(self, game: Game, moves: List[Move], depth: int, material: float) -> Tuple[Move, float]:
+        best_move, alpha = moves[0], -float("inf")
+        for move in moves:
+            gain = self._play(game, move)
+            try:
+                score = -self._negamax(game, depth - 1, -float("inf"), -alpha, -(material + gain), 1)
+            finally:
+                game.undo_move()
+            if score > alpha:
+                best_move, alpha = move, score
+        return best_move, alpha
+
+    def _negamax(self, game: Game, depth: int, alpha: float, beta: float, material: float, ply: int) -> float:
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        result = game.result
+        if result is not None:
+            if result.winner is None:
+                return 0.0
+            # sooner wins and later losses score higher
+            score = WIN_SCORE - ply
+            return score if result.winner == game.current_turn else -score
+        if depth == 0:
+            return self._evaluate(game, material)
+
+        for move in self._moves(game):
+            gain = self._play(game, move)
+            try:
+                score = -self._negamax(game, depth - 1, -beta, -alpha, -(material + gain), ply + 1)
+            finally:
+                game.undo_move()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def _play(self, game: Game, move: Move) -> int:
+        """Plays move, returning the value of what it took."""
+        captured = game.board.get_piece(move[1])
+        game.move_piece(move[0], move[1], validate=False)
+        return captured.value if captured is not None else 0
+
+    def _moves(self, game: Game) -> List[Move]:
+        board = game.board
+        moves = [
+            (from_pos, to_pos)
+            for from_pos, targets in board.legal_moves(game.current_turn).items()
+            for to_pos in targets
+        ]
+        if self.variant.order:
+            grid = board.board
+
+            def order(move: Move) -> int:
+                victim = grid[move[1][0]][move[1][1]]
+                if victim is None:
+                    return 0
+                return victim.value * 16 - grid[move[0][0]][move[0][1]].value
+
+            moves.sort(key=order, reverse=True)
+        return moves
+
+    def _material(self, game: Game) -> float:
+        """Value of the side to move's pieces minus the opponent's."""
+        total = 0
+        for row in game.board.board:
+            for piece in row:
+                if piece is not None:
+                    total += piece.value if piece.team == game.current_turn else -piece.value
+        return total
+
+    def _evaluate(self, game: Game, material: float) -> float:
+        if not self.variant.mobility:
+            return material
+        board = game.board
+        to_move = game.current_turn
+        return material + self.variant.mobility * (board.mobility(to_move) - board.mobility(1 - to_move))
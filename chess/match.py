@@ -7,7 +7,9 @@ from chess.Game import Game
 
 @dataclass
 class Match:
+    id: int = 0
     p1: Optional[PlayerState] = None
     p2: Optional[PlayerState] = None
     move: int = 0
     game: Optional[Game] = None
+    config_hash: Optional[str] = None
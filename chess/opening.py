@@ -0,0 +1,135 @@
+import os
+import time
+from concurrent.futures import Executor, wait
+from typing import Dict, List, Optional, Tuple
+
+from chess.configstore import config_hash
+from chess.engine import Engine, Variant
+from chess.Game import Game
+from chess.protocol import square_index, square_pos
+
+# opening book for a freshly generated config, worked out while the players are
+# still on the vs screen and sent along with the matchconfig.
+#
+# the book maps a line (the moves played so far) to the best reply for the side
+# to move and its score. every first move gets an entry for its reply, so
+# whatever white opens with is covered, then the book follows the best replies
+# from there up to BOOK_PLIES deep. each line is its own shallow search, so they
+# run side by side on a process pool, all under one wall clock budget.
+#
+# lines are square indices, "12-28" is a move from square 12 to 28 and
+# "12-28,52-36" that followed by a reply. the empty line is the start position.
+# entries are [from square, to square, score for the side to move].
+
+BOOK_PLIES = 3
+BOOK_DEPTH = 2
+# wall clock for the whole book, whatever isn't done by then is left out
+BOOK_SECONDS = 1.5
+BOOK_VARIANT = Variant("book", depth=BOOK_DEPTH)
+
+Move = Tuple[Tuple[int, int], Tuple[int, int]]
+Book = Dict[str, List[int]]
+
+MAX_CACHED = 256
+_cache: Dict[str, Book] = {}
+
+
+def line_key(moves: List[Move]) -> str:
+    return ",".join(f"{square_index(a)}-{square_index(b)}" for a, b in moves)
+
+
+def _parse_key(key: str) -> List[Move]:
+    moves = []
+    for part in filter(None, key.split(",")):
+        a, b = part.split("-")
+        moves.append((tuple(square_pos(int(a))), tuple(square_pos(int(b)))))
+    return moves
+
+
+def _search_line(config_json: str, key: str, deadline: float) -> Tuple[str, Optional[Move], float]:
+    """Best reply after the line and its score, searched until the (time.time()) deadline."""
+    game = Game.from_config(config_json, [])
+    for from_pos, to_pos in _parse_key(key):
+        game.move_piece(from_pos, to_pos, validate=False)
+    search = Engine(BOOK_VARIANT).choose_move(game, max(deadline - time.time(), 0.0))
+    if search.depth == 0:
+        return key, None, 0.0  # out of time before even one ply was done
+    return key, search.move, search.score
+
+
+def _first_moves(config_json: str) -> List[str]:
+    game = Game.from_config(config_json, [])
+    return [
+        line_key([(from_pos, to_pos)])
+        for from_pos, targets in game.board.legal_moves(game.current_turn).items()
+        for to_pos in targets
+    ]
+
+
+def build_book(config_json: str, pool: Optional[Executor] = None, seconds: float = BOOK_SECONDS) -> Book:
+    """Opening book for config_json, cached per config. Blocks for up to about seconds.
+
+    Lines are searched on pool when there is one, one after the other otherwise.
+    """
+    h = config_hash(config_json)
+    book = _cache.get(h)
+    if book is not None:
+        return book
+
+    deadline = time.time() + seconds
+    book = {}
+    # replies to every first move, then deeper along the best replies
+    lines = _first_moves(config_json)
+    root_scores: Dict[str, float] = {}
+    for _ in range(BOOK_PLIES - 1):
+        if pool is None:
+            results = []
+            for key in lines:
+                if time.time() >= deadline:
+                    break
+                results.append(_search_line(config_json, key, deadline))
+        else:
+            futures = [pool.submit(_search_line, config_json, key, deadline) for key in lines]
+            # a little slack for the workers to notice the deadline and report back
+            done, not_done = wait(futures, timeout=max(deadline - time.time(), 0.0) + 0.2)
+            for future in not_done:
+                future.cancel()
+            results = [future.result() for future in done if future.exception() is None]
+
+        lines = []
+        for key, move, score in results:
+            if move is None:
+                continue
+            book[key] = [square_index(move[0]), square_index(move[1]), round(score, 1)]
+            if "," not in key:
+                root_scores[key] = -score
+            lines.append(f"{key},{line_key([move])}")
+        if time.time() >= deadline:
+            break
+
+    if root_scores:
+        best = max(root_scores, key=root_scores.get)
+        (from_pos, to_pos), = _parse_key(best)
+        book[""] = [square_index(from_pos), square_index(to_pos), round(root_scores[best], 1)]
+
+    if len(_cache) >= MAX_CACHED:
+        _cache.clear()
+    _cache[h] = book
+    return book
+
+
+def book_move(book: Book, game: Game) -> Optional[Tuple[Move, float]]:
+    """The book's move and score for the game's current position, None once out of book."""
+    if game.ply != len(game.history):
+        return None  # resumed from a snapshot, the line that got here is gone
+    if game.ply >= BOOK_PLIES:
+        return None
+    entry = book.get(line_key([(record.from_pos, record.to_pos) for record in game.history]))
+    if entry is None:
+        return None
+    return (tuple(square_pos(entry[0])), tuple(square_pos(entry[1]))), entry[2]
+
+
+def book_workers() -> int:
+    # leave a core for the server's event loop
+    return max((os.cpu_count() or 2) - 1, 1)
@@ -0,0 +1,359 @@
+import asyncio
+import base64
+import json
+import struct
+from typing import Any, Optional
+
+# wire protocol shared by the server and the client.
+#
+# every connection starts out speaking newline-delimited JSON. the server opens
+# with a hello listing the protocols it understands, a client that wants the
+# binary framing answers with its pick, and the server acks with one last JSON
+# hello before switching. the client switches its writes right after its hello
+# and its reads once it sees the ack, so both directions flip at a well defined
+# point in the stream. clients that never answer just stay on JSON.
+#
+# binary frames are <varint length><u8 kind><payload>. hot messages get a fixed
+# struct layout, everything else rides along as a JSON payload.
+
+PROTOCOL_JSON = "json"
+PROTOCOL_BINARY = "bin1"
+SUPPORTED_PROTOCOLS = [PROTOCOL_BINARY, PROTOCOL_JSON]
+
+BOARD_SIZE = 8
+
+# largest frame a reader accepts by default, configs are the biggest thing sent
+MAX_FRAME_SIZE = 1 << 20
+
+KIND_JSON = 0
+KIND_MOVE = 1
+KIND_LEGAL_MOVES = 2
+KIND_PLAYER_JOIN = 3
+KIND_PLAYER_LEAVE = 4
+KIND_PLAYER_MOD = 5
+KIND_CONFIG = 6
+KIND_SNAPSHOT = 7
+# matchconfig with an opening book: <varint length><book json> then the KIND_CONFIG payload
+KIND_CONFIG_BOOK = 8
+# snapshot with the game's ply: <varint ply> then the KIND_SNAPSHOT payload
+KIND_SNAPSHOT_PLY = 9
+
+PLAYER_KINDS = {
+    "playerjoin": KIND_PLAYER_JOIN,
+    "playerleave": KIND_PLAYER_LEAVE,
+    "playermod": KIND_PLAYER_MOD,
+}
+PLAYER_TYPES = {kind: mtype for mtype, kind in PLAYER_KINDS.items()}
+PLAYER_FIELDS = {"name", "id", "color", "ready", "connected_at"}
+COLORS = [None, "white", "black"]
+
+# id, connected_at, flags. the name follows as raw utf-8
+PLAYER_STRUCT = struct.Struct(">IdB")
+# from square + 64 bit mask of destination squares
+LEGAL_STRUCT = struct.Struct(">BQ")
+
+# matchconfig payloads: sha256 digest, then optionally an encoding id and the raw blob
+CONFIG_HASH_SIZE = 32
+CONFIG_ENCODINGS = ["zlib", "zstd"]
+
+# json.dumps builds a fresh encoder whenever separators are passed, so keep one around
+COMPACT_JSON = json.JSONEncoder(separators=(",", ":"))
+
+FLAG_READY = 0x01
+FLAG_NO_NAME = 0x02
+COLOR_SHIFT = 2
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def encode_varint(value: int) -> bytes:
+    if value < 0:
+        raise ProtocolError("varints are unsigned")
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(data: bytes, offset: int = 0) -> tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ProtocolError("truncated varint")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+        if shift > 63:
+            raise ProtocolError("varint too long")
+
+
+def square_index(pos) -> int:
+    row, col = int(pos[0]), int(pos[1])
+    if not (0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE):
+        raise ProtocolError(f"square {pos} is off the board")
+    return row * BOARD_SIZE + col
+
+
+def square_pos(index: int) -> list[int]:
+    return [index // BOARD_SIZE, index % BOARD_SIZE]
+
+
+class JsonCodec:
+    name = PROTOCOL_JSON
+
+    def encode(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode() + b"\n"
+
+    def decode(self, frame: bytes) -> dict[str, Any]:
+        return json.loads(frame.decode().strip())
+
+    async def read(
+        self, reader: asyncio.StreamReader, max_frame: int = MAX_FRAME_SIZE
+    ) -> Optional[dict[str, Any]]:
+        # the line length itself is capped by the StreamReader limit
+        try:
+            data = await reader.readline()
+        except ValueError as e:
+            raise ProtocolError(f"line too long: {e}")
+        if not data:
+            return None
+        if len(data) > max_frame:
+            raise ProtocolError(f"frame of {len(data)} bytes is over the limit")
+        return self.decode(data)
+
+
+class BinaryCodec:
+    name = PROTOCOL_BINARY
+
+    def encode(self, obj: Any) -> bytes:
+        body = self._encode_compact(obj)
+        if body is None:
+            body = bytes([KIND_JSON]) + COMPACT_JSON.encode(obj).encode()
+        return encode_varint(len(body)) + body
+
+    def decode(self, frame: bytes) -> dict[str, Any]:
+        # frame is <kind><payload>, without the length prefix
+        if not frame:
+            raise ProtocolError("empty frame")
+        kind = frame[0]
+        payload = frame[1:]
+
+        if kind == KIND_JSON:
+            return json.loads(payload.decode())
+        if kind == KIND_MOVE:
+            if len(payload) < 2:
+                raise ProtocolError("short move frame")
+            message = {
+                "type": "move",
+                "from": square_pos(payload[0]),
+                "to": square_pos(payload[1]),
+            }
+            if len(payload) > 2:
+                message["seq"], _ = decode_varint(payload, 2)
+            return message
+        if kind == KIND_LEGAL_MOVES:
+            if len(payload) != LEGAL_STRUCT.size:
+                raise ProtocolError("bad legal move frame")
+            square, mask = LEGAL_STRUCT.unpack(payload)
+            return {
+                "type": "legalmoves",
+                "from": square_pos(square),
+                "moves": [square_pos(i) for i in range(BOARD_SIZE * BOARD_SIZE) if mask >> i & 1],
+            }
+        if kind in PLAYER_TYPES:
+            if len(payload) < PLAYER_STRUCT.size:
+                raise ProtocolError("short player frame")
+            player_id, connected_at, flags = PLAYER_STRUCT.unpack_from(payload)
+            name = None
+            if not flags & FLAG_NO_NAME:
+                name = payload[PLAYER_STRUCT.size :].decode()
+            color_idx = flags >> COLOR_SHIFT
+            if color_idx >= len(COLORS):
+                raise ProtocolError("bad player color")
+            return {
+                "type": PLAYER_TYPES[kind],
+                "player": {
+                    "name": name,
+                    "id": player_id,
+                    "color": COLORS[color_idx],
+                    "ready": bool(flags & FLAG_READY),
+                    "connected_at": connected_at,
+                },
+            }
+        if kind == KIND_CONFIG:
+            return self._decode_config(payload)
+        if kind == KIND_CONFIG_BOOK:
+            length, offset = decode_varint(payload)
+            if offset + length > len(payload):
+                raise ProtocolError("short config book frame")
+            book = json.loads(payload[offset : offset + length])
+            message = self._decode_config(payload[offset + length :])
+            message["book"] = book
+            return message
+        if kind == KIND_SNAPSHOT_PLY:
+            ply, offset = decode_varint(payload, 0)
+            message = self._decode_snapshot(payload[offset:])
+            message["ply"] = ply
+            return message
+        if kind == KIND_SNAPSHOT:
+            return self._decode_snapshot(payload)
+        raise ProtocolError(f"unknown frame kind {kind}")
+
+    async def read(
+        self, reader: asyncio.StreamReader, max_frame: int = MAX_FRAME_SIZE
+    ) -> Optional[dict[str, Any]]:
+        try:
+            length = 0
+            shift = 0
+            while True:
+                byte = (await reader.readexactly(1))[0]
+                length |= (byte & 0x7F) << shift
+                if not byte & 0x80:
+                    break
+                shift += 7
+                if shift > 28:
+                    raise ProtocolError("frame length too long")
+            if length > max_frame:
+                # refuse before buffering any of it
+                raise ProtocolError(f"frame of {length} bytes is over the limit")
+            frame = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            return None
+        return self.decode(frame)
+
+    def _decode_config(self, payload: bytes) -> dict[str, Any]:
+        if len(payload) < CONFIG_HASH_SIZE:
+            raise ProtocolError("short config frame")
+        message = {"type": "matchconfig", "hash": payload[:CONFIG_HASH_SIZE].hex()}
+        if len(payload) > CONFIG_HASH_SIZE:
+            encoding_idx = payload[CONFIG_HASH_SIZE]
+            if encoding_idx >= len(CONFIG_ENCODINGS):
+                raise ProtocolError("bad config encoding")
+            message["encoding"] = CONFIG_ENCODINGS[encoding_idx]
+            message["data"] = base64.b64encode(payload[CONFIG_HASH_SIZE + 1 :]).decode()
+        return message
+
+    def _decode_snapshot(self, payload: bytes) -> dict[str, Any]:
+        match_id, offset = decode_varint(payload, 0)
+        seq, offset = decode_varint(payload, offset)
+        if offset >= len(payload):
+            raise ProtocolError("short snapshot frame")
+        turn = payload[offset]
+        offset += 1
+        pieces = []
+        while offset < len(payload):
+            square = payload[offset]
+            piece_kind, offset = decode_varint(payload, offset + 1)
+            if offset >= len(payload):
+                raise ProtocolError("short snapshot frame")
+            team = payload[offset]
+            move_count, offset = decode_varint(payload, offset + 1)
+            pieces.append([*square_pos(square), piece_kind, team, move_count])
+        return {
+            "type": "snapshot",
+            "match_id": match_id,
+            "seq": seq,
+            "turn": turn,
+            "pieces": pieces,
+        }
+
+    def _encode_compact(self, obj: Any) -> Optional[bytes]:
+        # returns None when the message doesn't fit any fixed layout
+        if not isinstance(obj, dict):
+            return None
+        mtype = obj.get("type")
+        try:
+            if mtype == "move" and obj.keys() <= {"type", "from", "to", "seq"}:
+                body = bytes([KIND_MOVE, square_index(obj["from"]), square_index(obj["to"])])
+                if "seq" in obj:
+                    body += encode_varint(int(obj["seq"]))
+                return body
+
+            if mtype == "legalmoves" and obj.keys() == {"type", "from", "moves"}:
+                mask = 0
+                for move in obj["moves"]:
+                    mask |= 1 << square_index(move)
+                return bytes([KIND_LEGAL_MOVES]) + LEGAL_STRUCT.pack(square_index(obj["from"]), mask)
+
+            if mtype in PLAYER_KINDS and obj.keys() == {"type", "player"}:
+                player = obj["player"]
+                if player.keys() != PLAYER_FIELDS or player["color"] not in COLORS:
+                    return None
+                flags = COLORS.index(player["color"]) << COLOR_SHIFT
+                if player["ready"]:
+                    flags |= FLAG_READY
+                name = b""
+                if player["name"] is None:
+                    flags |= FLAG_NO_NAME
+                else:
+                    name = str(player["name"]).encode()
+                return (
+                    bytes([PLAYER_KINDS[mtype]])
+                    + PLAYER_STRUCT.pack(player["id"], player["connected_at"], flags)
+                    + name
+                )
+
+            if mtype == "matchconfig" and "hash" in obj:
+                book = obj.get("book")
+                fields = obj.keys() - {"book"}
+                digest = bytes.fromhex(obj["hash"])
+                if len(digest) != CONFIG_HASH_SIZE:
+                    return None
+                if fields == {"type", "hash"}:
+                    body = digest
+                elif fields == {"type", "hash", "encoding", "data"}:
+                    # raw blob on the wire instead of base64
+                    body = (
+                        digest
+                        + bytes([CONFIG_ENCODINGS.index(obj["encoding"])])
+                        + base64.b64decode(obj["data"])
+                    )
+                else:
+                    return None
+                if book is None:
+                    return bytes([KIND_CONFIG]) + body
+                book_json = COMPACT_JSON.encode(book).encode()
+                return bytes([KIND_CONFIG_BOOK]) + encode_varint(len(book_json)) + book_json + body
+
+            if mtype == "snapshot" and obj.keys() - {"ply"} == {"type", "match_id", "seq", "turn", "pieces"}:
+                if "ply" in obj:
+                    body = bytearray([KIND_SNAPSHOT_PLY])
+                    body += encode_varint(obj["ply"])
+                else:
+                    body = bytearray([KIND_SNAPSHOT])
+                body += encode_varint(obj["match_id"])
+                body += encode_varint(obj["seq"])
+                body.append(obj["turn"])
+                for row, col, piece_kind, team, move_count in obj["pieces"]:
+                    body.append(square_index((row, col)))
+                    body += encode_varint(piece_kind)
+                    body.append(team)
+                    body += encode_varint(move_count)
+                return bytes(body)
+        except (ProtocolError, TypeError, ValueError, KeyError, struct.error):
+            return None
+        return None
+
+
+JSON_CODEC = JsonCodec()
+BINARY_CODEC = BinaryCodec()
+
+CODECS = {JSON_CODEC.name: JSON_CODEC, BINARY_CODEC.name: BINARY_CODEC}
+
+
+def pick_protocol(offered: list[str]) -> str:
+    for name in SUPPORTED_PROTOCOLS:
+        if name in offered:
+            return name
+    return PROTOCOL_JSON
@@ -0,0 +1,159 @@
+import mmap
+import os
+import threading
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from chess.configstore import config_hash
+from chess.protocol import ProtocolError, decode_varint, encode_varint, square_index, square_pos
+
+# compact archive of finished games, for re-checking them all after engine
+# changes (python -m chess.replay).
+#
+# a game is its config hash, who won and why, then two bytes per move: the
+# from and to squares. nothing else about the position is stored, move counts,
+# captures and whose turn it is all fall out of replaying the moves from the
+# config's starting position.
+#
+# an archive file is MAGIC then entries of <u8 type><varint length><payload>.
+# a config entry (its hash plus the zlib'd json) comes before the first game
+# that uses it, so every archive can be replayed on its own. a torn entry at
+# the end (the server died mid write) is cut off when the archive is reopened.
+
+MAGIC = b"WTCR\x01"
+
+ENTRY_CONFIG = 1
+ENTRY_GAME = 2
+
+# winner byte of a draw or a game nobody won
+NO_WINNER = 2
+
+Move = Tuple[Tuple[int, int], Tuple[int, int]]
+
+
+class RecordError(Exception):
+    pass
+
+
+@dataclass
+class GameRecord:
+    config_hash: str
+    moves: List[Move] = field(default_factory=list)
+    winner: Optional[int] = None
+    reason: str = ""
+
+
+def encode_game(record: GameRecord) -> bytes:
+    reason = record.reason.encode()
+    out = bytearray(bytes.fromhex(record.config_hash))
+    out.append(NO_WINNER if record.winner is None else record.winner)
+    out += encode_varint(len(reason)) + reason
+    for from_pos, to_pos in record.moves:
+        out.append(square_index(from_pos))
+        out.append(square_index(to_pos))
+    return bytes(out)
+
+
+def decode_game(payload: bytes) -> GameRecord:
+    if len(payload) < 33:
+        raise RecordError("game entry too short")
+    winner = payload[32]
+    reason_length, offset = decode_varint(payload, 33)
+    reason = payload[offset : offset + reason_length].decode()
+    offset += reason_length
+    if (len(payload) - offset) % 2:
+        raise RecordError("game entry has half a move")
+    moves = [
+        (tuple(square_pos(payload[i])), tuple(square_pos(payload[i + 1])))
+        for i in range(offset, len(payload), 2)
+    ]
+    return GameRecord(payload[:32].hex(), moves, None if winner == NO_WINNER else winner, reason)
+
+
+def encode_entry(etype: int, payload: bytes) -> bytes:
+    return bytes([etype]) + encode_varint(len(payload)) + payload
+
+
+def config_entry(config_hash: str, config_json: str) -> bytes:
+    return encode_entry(ENTRY_CONFIG, bytes.fromhex(config_hash) + zlib.compress(config_json.encode()))
+
+
+def iter_entries(path: str) -> Iterator[Tuple[int, int, bytes]]:
+    """Yields (end offset, type, payload) of every whole entry in the archive."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise RecordError(f"{path} is not a game archive")
+        if os.fstat(f.fileno()).st_size == len(MAGIC):
+            return
+        # mapped rather than read, archives get big and only a window is needed at a time
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = len(MAGIC)
+            while offset < len(data):
+                etype = data[offset]
+                try:
+                    length, start = decode_varint(data, offset + 1)
+                except ProtocolError:
+                    return
+                end = start + length
+                if end > len(data):
+                    return
+                yield end, etype, data[start:end]
+                offset = end
+
+
+def iter_games(path: str, configs: Dict[str, str]) -> Iterator[bytes]:
+    """Yields the encoded games in an archive, adding its configs to configs as they come up.
+
+    Games are left encoded so they can be handed to other processes as is,
+    decode_game turns one into a GameRecord.
+    """
+    for _, etype, payload in iter_entries(path):
+        if etype == ENTRY_CONFIG:
+            h = payload[:32].hex()
+            if h in configs:
+                continue
+            config_json = zlib.decompress(payload[32:]).decode()
+            # a config that doesn't match its hash would replay games against the wrong rules
+            if config_hash(config_json) == h:
+                configs[h] = config_json
+        elif etype == ENTRY_GAME:
+            yield payload
+
+
+class GameArchive:
+    """Appends finished games to an archive file, safe to call from worker threads."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.written_configs: set[str] = set()
+        self.lock = threading.Lock()
+        self.opened = False
+
+    def _open(self) -> None:
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, "wb") as f:
+                f.write(MAGIC)
+            return
+        # pick up where the last run left off: its configs don't need writing
+        # again, and anything after its last whole entry would hide new games
+        valid_length = len(MAGIC)
+        for end, etype, payload in iter_entries(self.path):
+            valid_length = end
+            if etype == ENTRY_CONFIG:
+                self.written_configs.add(payload[:32].hex())
+        if valid_length < os.path.getsize(self.path):
+            os.truncate(self.path, valid_length)
+
+    def add(self, record: GameRecord, config_json: str) -> None:
+        game = encode_entry(ENTRY_GAME, encode_game(record))
+        with self.lock:
+            if not self.opened:
+                self._open()
+                self.opened = True
+            data = b""
+            if record.config_hash not in self.written_configs:
+                data = config_entry(record.config_hash, config_json)
+            with open(self.path, "ab") as f:
+                f.write(data + game)
+            self.written_configs.add(record.config_hash)
@@ -0,0 +1,155 @@
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple
+
+from chess.Game import RESULT_REASONS, Game
+from chess.record import GameRecord, RecordError, decode_game, iter_games
+
+# replays archived games (see chess.record) through Game.move_piece with
+# validation on and reports every game that doesn't play out the way it did
+# when it was recorded: a move the engine now rejects, or the board deciding
+# the game differently. meant for after engine changes.
+#
+#   python -m chess.replay games.wtcr [more archives] [--workers N]
+#
+# games are streamed off disk in batches to a process pool, with only a few
+# batches in flight so memory stays flat however big the archives are.
+
+BATCH_SIZE = 64
+# batches queued per worker before reading waits for results
+IN_FLIGHT_PER_WORKER = 4
+
+# (archive path, game number in it, encoded game)
+Job = Tuple[str, int, bytes]
+# (games, moves, [(archive path, game number, what went wrong)])
+BatchResult = Tuple[int, int, List[Tuple[str, int, str]]]
+
+
+def _describe(result) -> str:
+    if result is None:
+        return "still going"
+    winner = "draw" if result.winner is None else f"team {result.winner} won"
+    return f"{winner} ({result.reason})"
+
+
+def check_game(record: GameRecord, config_json: Optional[str]) -> Tuple[int, Optional[str]]:
+    """(moves replayed, divergence or None) for one game."""
+    if config_json is None:
+        return 0, "config is not in the archive"
+    try:
+        game = Game.from_config(config_json, [])
+    except Exception as e:
+        return 0, f"config no longer loads: {e}"
+
+    for i, (from_pos, to_pos) in enumerate(record.moves):
+        if not game.move_piece(from_pos, to_pos, validate=True):
+            if game.result is not None:
+                return i, f"move {i + 1} {from_pos}->{to_pos} after the game ended, {_describe(game.result)}"
+            return i, f"move {i + 1} {from_pos}->{to_pos} rejected"
+
+    # games that ended off the board (timeouts, disconnects) should still be going
+    if record.reason in RESULT_REASONS:
+        expected = (record.winner, record.reason)
+        actual = (game.result.winner, game.result.reason) if game.result else None
+        if actual != expected:
+            return len(record.moves), f"recorded {_describe(record)}, replay says {_describe(game.result)}"
+    elif game.result is not None:
+        return len(record.moves), f"recorded {record.reason or 'no result'}, replay says {_describe(game.result)}"
+    return len(record.moves), None
+
+
+def check_batch(configs: Dict[str, str], jobs: List[Job]) -> BatchResult:
+    moves = 0
+    divergences = []
+    for path, number, payload in jobs:
+        try:
+            record = decode_game(payload)
+        except (RecordError, ValueError) as e:
+            divergences.append((path, number, f"unreadable: {e}"))
+            continue
+        played, divergence = check_game(record, configs.get(record.config_hash))
+        moves += played
+        if divergence is not None:
+            divergences.append((path, number, divergence))
+    return len(jobs), moves, divergences
+
+
+def iter_batches(paths: List[str], batch_size: int):
+    """Yields (configs the batch needs, jobs) across every archive."""
+    configs: Dict[str, str] = {}
+    jobs: List[Job] = []
+    for path in paths:
+        for number, payload in enumerate(iter_games(path, configs)):
+            jobs.append((path, number, payload))
+            if len(jobs) == batch_size:
+                yield _batch_configs(configs, jobs), jobs
+                jobs = []
+    if jobs:
+        yield _batch_configs(configs, jobs), jobs
+
+
+def _batch_configs(configs: Dict[str, str], jobs: List[Job]) -> Dict[str, str]:
+    hashes = {payload[:32].hex() for _, _, payload in jobs}
+    return {h: configs[h] for h in hashes if h in configs}
+
+
+def replay(paths: List[str], workers: int, batch_size: int = BATCH_SIZE, out=sys.stdout) -> Tuple[int, int, int]:
+    """Checks every game in the archives, printing divergences as they turn up.
+
+    Returns (games, moves, divergences).
+    """
+    games = moves = diverged = 0
+
+    def collect(result: BatchResult) -> None:
+        nonlocal games, moves, diverged
+        games += result[0]
+        moves += result[1]
+        for path, number, divergence in result[2]:
+            diverged += 1
+            print(f"{path} game {number}: {divergence}", file=out)
+
+    if workers <= 1:
+        # in process, for profiling
+        for configs, jobs in iter_batches(paths, batch_size):
+            collect(check_batch(configs, jobs))
+        return games, moves, diverged
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Future] = deque()
+        for configs, jobs in iter_batches(paths, batch_size):
+            pending.append(pool.submit(check_batch, configs, jobs))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                collect(pending.popleft().result())
+        while pending:
+            collect(pending.popleft().result())
+    return games, moves, diverged
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m chess.replay")
+    parser.add_argument("archives", nargs="+", help="game archives written by the server")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        games, moves, diverged = replay(args.archives, args.workers, args.batch_size)
+    except (OSError, RecordError) as e:
+        sys.exit(f"Failed to read archive: {e}")
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{games} games, {moves} moves in {elapsed:.2f}s: "
+        f"{games / elapsed:.0f} games/s, {moves / elapsed:.0f} moves/s, "
+        f"{diverged} diverged"
+    )
+    sys.exit(1 if diverged else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import ast
+import math
+from typing import Callable, Dict, List, Optional, Tuple
+
+# compiles the llm written mv_func/tk_func sources into lookup tables.
+#
+# sources are parsed with ast and only a small expression language is accepted:
+# int constants, n, tuples/lists, list comprehensions over constant ranges,
+# arithmetic, comparisons, and/or/not, conditional expressions, abs/min/max,
+# and (from tk_func) a call to mv_func. anything else is rejected and the
+# config fails to load, nothing else is ever run, see chess/sandbox.py.
+#
+# most functions only look at n through `n % k` and comparisons against
+# constants. those are periodic past the largest threshold, so they lower to a
+# prefix table for small n plus a cycle indexed by n % lcm(k...), and a function
+# that never looks at n is a single constant vector set. the rest still run as
+# the restricted compiled code, evaluated (and memoised) per n on lookup.
+
+Vector = Tuple[int, int]
+Vectors = Tuple[Vector, ...]
+
+# limits on what gets lowered to a table
+MAX_PERIOD = 64
+MAX_THRESHOLD = 256
+# range() inside a ruleset can't produce more than this many values
+MAX_RANGE = 64
+# nested comprehensions beyond this are rejected, 64^3 iterations is plenty
+MAX_COMPREHENSION_DEPTH = 3
+# anything further than this from the piece is off every board we make
+MAX_OFFSET = 64
+# vectors one call may return
+MAX_VECTORS = 512
+
+SAFE_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod)
+SAFE_UNARYOPS = (ast.USub, ast.UAdd, ast.Not)
+SAFE_CMPOPS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn)
+SAFE_CALLS = {"abs", "min", "max", "range"}
+
+
+class RuleCompileError(Exception):
+    pass
+
+
+def _safe_range(*args):
+    r = range(*args)
+    if len(r) > MAX_RANGE:
+        raise RuleCompileError(f"range of {len(r)} values is too long")
+    return r
+
+
+SAFE_GLOBALS = {"__builtins__": {}, "abs": abs, "min": min, "max": max, "range": _safe_range}
+
+
+class VectorTable:
+    """Movement vectors of one function, as (row, col) board deltas per n."""
+
+    def __init__(
+        self,
+        prefix: List[Vectors],
+        cycle: List[Vectors],
+        func: Optional[Callable[[int], list]] = None,
+    ) -> None:
+        # f(n) for n in 1..len(prefix), then cycle[n % len(cycle)]
+        self.prefix = prefix
+        self.cycle = cycle
+        # only set when the function couldn't be lowered, results memoised per n
+        self.func = func
+        self.memo: Dict[int, Vectors] = {}
+        self.flipped: Dict[int, Vectors] = {}
+
+    @property
+    def constant(self) -> bool:
+        return self.func is None and not self.prefix and len(self.cycle) == 1
+
+    def lookup(self, n: int) -> Vectors:
+        if self.func is None:
+            if 1 <= n <= len(self.prefix):
+                return self.prefix[n - 1]
+            return self.cycle[n % len(self.cycle)]
+        vectors = self.memo.get(n)
+        if vectors is None:
+            if len(self.memo) >= MAX_THRESHOLD:
+                self.memo.clear()
+            try:
+                vectors = normalise(self.func(n))
+            except Exception:
+                # only 1..MAX_THRESHOLD were checked when the config loaded, a
+                # move number that breaks it past that just has no vectors
+                vectors = ()
+            self.memo[n] = vectors
+        return vectors
+
+    def lookup_flipped(self, n: int) -> Vectors:
+        """Same vectors seen from the other side of the board."""
+        vectors = self.flipped.get(n)
+        if vectors is None:
+            if len(self.flipped) >= MAX_THRESHOLD:
+                self.flipped.clear()
+            vectors = self.flipped[n] = tuple((-r, -c) for r, c in self.lookup(n))
+        return vectors
+
+    def __call__(self, n: int) -> List[Tuple[int, int]]:
+        # the raw (x, y) offsets, like the original function returned
+        return [(c, r) for r, c in self.lookup(n)]
+
+
+def normalise(vectors) -> Vectors:
+    """Turns (x, y) offsets into (row, col) deltas, raising RuleCompileError if malformed."""
+    if vectors is None:
+        return ()
+    if not isinstance(vectors, (tuple, list)):
+        raise RuleCompileError(f"expected a list of vectors, got {type(vectors).__name__}")
+    if len(vectors) > MAX_VECTORS:
+        raise RuleCompileError(f"{len(vectors)} vectors, at most {MAX_VECTORS} allowed")
+    out = []
+    for vec in vectors:
+        if not isinstance(vec, (tuple, list)) or len(vec) != 2:
+            raise RuleCompileError(f"malformed vector {vec!r}")
+        x, y = vec
+        if type(x) is not int or type(y) is not int:
+            raise RuleCompileError(f"non integer vector {vec!r}")
+        if abs(x) > MAX_OFFSET or abs(y) > MAX_OFFSET:
+            # well formed, just never lands on the board
+            continue
+        out.append((y, x))
+    return tuple(out)
+
+
+def parse_function(src: str) -> ast.FunctionDef:
+    """The single one-argument function in src, its body a single return."""
+    try:
+        module = ast.parse(src)
+    except SyntaxError as e:
+        raise RuleCompileError(f"syntax error: {e}") from e
+
+    if len(module.body) != 1 or not isinstance(module.body[0], ast.FunctionDef):
+        raise RuleCompileError("expected exactly one function definition")
+    func = module.body[0]
+    args = func.args
+    if (
+        len(args.args) != 1
+        or args.posonlyargs
+        or args.kwonlyargs
+        or args.vararg
+        or args.kwarg
+        or args.defaults
+        or func.decorator_list
+    ):
+        raise RuleCompileError("function must take exactly one plain argument")
+
+    body = func.body
+    # allow a docstring in front of the return
+    if len(body) == 2 and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+        body = body[1:]
+    if len(body) != 1 or not isinstance(body[0], ast.Return) or body[0].value is None:
+        raise RuleCompileError("function body must be a single return")
+    return func
+
+
+class _Checker:
+    """Walks a return expression, rejecting anything outside the whitelist.
+
+    Also records how the argument is used, to decide whether it can be lowered.
+    """
+
+    def __init__(self, arg: str, callables: set) -> None:
+        self.arg = arg
+        self.callables = callables
+        self.moduli: List[int] = []
+        self.thresholds: List[float] = []
+        # n used in a way that isn't n % k or a comparison against constants
+        self.dynamic = False
+
+    def check(self, node: ast.AST, bound: frozenset, depth: int = 0, parent: Optional[ast.AST] = None) -> None:
+        if isinstance(node, ast.Constant):
+            if type(node.value) not in (int, bool):
+                raise RuleCompileError(f"constant {node.value!r} not allowed")
+        elif isinstance(node, ast.Name):
+            if node.id == self.arg and node.id not in bound:
+                self._note_arg_use(node, parent)
+            elif node.id not in bound:
+                raise RuleCompileError(f"name {node.id!r} not allowed")
+        elif isinstance(node, (ast.Tuple, ast.List)):
+            for elt in node.elts:
+                self.check(elt, bound, depth, node)
+        elif isinstance(node, ast.BinOp):
+            if not isinstance(node.op, SAFE_BINOPS):
+                raise RuleCompileError(f"operator {type(node.op).__name__} not allowed")
+            self.check(node.left, bound, depth, node)
+            self.check(node.right, bound, depth, node)
+        elif isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, SAFE_UNARYOPS):
+                raise RuleCompileError(f"operator {type(node.op).__name__} not allowed")
+            self.check(node.operand, bound, depth, node)
+        elif isinstance(node, ast.BoolOp):
+            for value in node.values:
+                self.check(value, bound, depth, node)
+        elif isinstance(node, ast.Compare):
+            if not all(isinstance(op, SAFE_CMPOPS) for op in node.ops):
+                raise RuleCompileError("comparison not allowed")
+            self.check(node.left, bound, depth, node)
+            for comparator in node.comparators:
+                self.check(comparator, bound, depth, node)
+        elif isinstance(node, ast.IfExp):
+            self.check(node.test, bound, depth, node)
+            self.check(node.body, bound, depth, node)
+            self.check(node.orelse, bound, depth, node)
+        elif isinstance(node, ast.Call):
+            if (
+                not isinstance(node.func, ast.Name)
+                or node.func.id not in self.callables
+                or node.keywords
+            ):
+                raise RuleCompileError("call not allowed")
+            for arg in node.args:
+                if isinstance(arg, ast.Starred):
+                    raise RuleCompileError("starred call not allowed")
+                self.check(arg, bound, depth, node)
+        elif isinstance(node, ast.ListComp):
+            depth += 1
+            if depth > MAX_COMPREHENSION_DEPTH:
+                raise RuleCompileError("comprehensions nested too deep")
+            inner = bound
+            for gen in node.generators:
+                if gen.is_async:
+                    raise RuleCompileError("async comprehension not allowed")
+                self.check(gen.iter, inner, depth, gen)
+                inner = inner | self._targets(gen.target)
+                for cond in gen.ifs:
+                    self.check(cond, inner, depth, gen)
+            self.check(node.elt, inner, depth, node)
+        else:
+            raise RuleCompileError(f"{type(node).__name__} not allowed")
+
+    def _targets(self, target: ast.AST) -> frozenset:
+        if isinstance(target, ast.Name):
+            if target.id in SAFE_CALLS or target.id in self.callables:
+                raise RuleCompileError(f"can't rebind {target.id!r}")
+            return frozenset([target.id])
+        if isinstance(target, ast.Tuple):
+            names = frozenset()
+            for elt in target.elts:
+                names |= self._targets(elt)
+            return names
+        raise RuleCompileError("comprehension target not allowed")
+
+    def _note_arg_use(self, node: ast.Name, parent: Optional[ast.AST]) -> None:
+        # n % k with a constant k only depends on n's phase
+        if (
+            isinstance(parent, ast.BinOp)
+            and isinstance(parent.op, ast.Mod)
+            and parent.left is node
+            and (_int_value(parent.right) or 0) > 0
+        ):
+            self.moduli.append(_int_value(parent.right))
+            return
+
+        if isinstance(parent, ast.Compare):
+            operands = [parent.left] + parent.comparators
+            others = [o for o in operands if o is not node]
+            # comparisons against constants are fixed past the largest constant
+            if all(
+                isinstance(op, (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE))
+                for op in parent.ops
+            ) and all(_int_value(o) is not None for o in others):
+                self.thresholds.extend(_int_value(o) for o in others)
+                return
+            # and so is membership in a constant tuple, like n in (1, 2)
+            if (
+                len(parent.ops) == 1
+                and isinstance(parent.ops[0], (ast.In, ast.NotIn))
+                and parent.left is node
+                and isinstance(parent.comparators[0], (ast.Tuple, ast.List))
+                and all(_int_value(e) is not None for e in parent.comparators[0].elts)
+            ):
+                self.thresholds.extend(_int_value(e) for e in parent.comparators[0].elts)
+                return
+
+        self.dynamic = True
+
+
+def _int_value(node: ast.AST) -> Optional[int]:
+    """The value of an int constant (negative ones included), else None."""
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = _int_value(node.operand)
+        return None if value is None else -value
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        return node.value
+    return None
+
+
+def compile_function(src: str, inline: Optional[Dict[str, VectorTable]] = None):
+    """Validates src and returns (callable, checker) for the restricted function."""
+    func = parse_function(src)
+    inline = inline or {}
+    checker = _Checker(func.args.args[0].arg, SAFE_CALLS | set(inline))
+    checker.check(func.body[-1].value, frozenset())
+
+    # calls to other ruleset functions are only there when they were inlined,
+    # they depend on n in ways this function's own analysis can't see
+    for name, table in inline.items():
+        if _calls(func, name) and not table.constant:
+            checker.dynamic = True
+
+    func.returns = None
+    func.args.args[0].annotation = None
+    module = ast.Module(body=[func], type_ignores=[])
+    code = compile(module, "<ruleset>", "exec")
+    namespace = dict(SAFE_GLOBALS)
+    # inlined functions hand back the raw (x, y) offsets like the originals did
+    namespace.update(inline)
+    exec(code, namespace)
+    return namespace[func.name], checker
+
+
+def _calls(func: ast.FunctionDef, name: str) -> bool:
+    return any(
+        isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == name
+        for node in ast.walk(func)
+    )
+
+
+def lower(src: str, inline: Optional[Dict[str, VectorTable]] = None) -> VectorTable:
+    """Compiles src into a VectorTable, raising RuleCompileError if it isn't allowed."""
+    func, checker = compile_function(src, inline)
+
+    period = 1
+    for k in checker.moduli:
+        period = period * k // math.gcd(period, k)
+    threshold = max([0] + [math.floor(t) for t in checker.thresholds])
+
+    try:
+        if checker.dynamic or period > MAX_PERIOD or threshold > MAX_THRESHOLD:
+            # still only whitelisted code, just evaluated per n
+            table = VectorTable([], [()], func)
+            table.lookup(1)
+            return table
+
+        prefix = [normalise(func(n)) for n in range(1, threshold + 1)]
+        cycle: List[Vectors] = [()] * period
+        for n in range(threshold + 1, threshold + 1 + period):
+            cycle[n % period] = normalise(func(n))
+    except RuleCompileError:
+        raise
+    except Exception as e:
+        raise RuleCompileError(f"evaluating failed: {e}") from e
+
+    # trailing prefix entries that match the cycle don't need to be there
+    while prefix and prefix[-1] == cycle[len(prefix) % period]:
+        prefix.pop()
+    return VectorTable(prefix, cycle)
@@ -0,0 +1,182 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from chess.rulecompiler import MAX_THRESHOLD, RuleCompileError, VectorTable, lower
+
+try:
+    import resource
+except ImportError:
+    # windows, only the wall clock timeout applies there
+    resource = None
+
+# evaluates the llm written ruleset functions in a separate worker process when
+# a config is loaded, so a function that spins or eats memory takes down the
+# worker instead of the server's event loop. only sources chess/rulecompiler.py
+# accepts are ever run, anything else fails the config. most come back as a
+# plain VectorTable (no code attached). the few that couldn't be lowered are
+# checked over move numbers 1..MAX_THRESHOLD in the worker and then compiled
+# again here, from the same whitelisted code, to be evaluated per n on use.
+#
+# each function gets FUNCTION_BUDGET seconds of cpu. the worker as a whole also
+# runs under rlimits for code stuck in a single C call (range(10**12) summed,
+# say) that the budget timer can't interrupt, plus a wall clock timeout.
+#
+# the worker is `python -m chess.sandbox` with sources in and tables out as json
+# over stdin/stdout, rather than multiprocessing, which would re-run the
+# parent's __main__ (the whole client, say) in every worker.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FUNCTION_BUDGET = 0.5  # cpu seconds per function
+MEMORY_LIMIT = 512 * 1024 * 1024
+RECURSION_LIMIT = 200
+
+Sources = Tuple[str, str]
+
+MAX_CACHED = 512
+_cache: Dict[Sources, Tuple[VectorTable, VectorTable]] = {}
+
+
+class BudgetExceeded(BaseException):
+    # not an Exception, so the function under test can't swallow it
+    pass
+
+
+def _over_budget(signum, frame) -> None:
+    raise BudgetExceeded()
+
+
+def _evaluate(src: str, inline: Dict[str, VectorTable]) -> VectorTable:
+    if hasattr(signal, "setitimer"):
+        signal.setitimer(signal.ITIMER_PROF, FUNCTION_BUDGET)
+    try:
+        # raises RuleCompileError for anything outside the whitelist
+        table = lower(src, inline)
+        if table.func is not None:
+            # evaluated per n wherever it's used, make sure that stays cheap
+            for n in range(1, MAX_THRESHOLD + 1):
+                table.lookup(n)
+        return table
+    finally:
+        if hasattr(signal, "setitimer"):
+            signal.setitimer(signal.ITIMER_PROF, 0)
+
+
+def _table_json(table: VectorTable) -> dict:
+    if table.func is not None:
+        # code doesn't cross over, it's compiled again on the other side
+        return {"lazy": True}
+    return {"prefix": table.prefix, "cycle": table.cycle}
+
+
+def _table_from_json(data: dict, src: str, inline: Dict[str, VectorTable]) -> VectorTable:
+    if data.get("lazy"):
+        # the worker already ran it within budget, this only compiles whitelisted code
+        return lower(src, inline)
+
+    def vectors(entry) -> tuple:
+        return tuple((int(r), int(c)) for r, c in entry)
+
+    return VectorTable([vectors(e) for e in data["prefix"]], [vectors(e) for e in data["cycle"]])
+
+
+def _worker(sources: List[Sources], cpu_limit: int) -> List[dict]:
+    if resource is not None:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+        resource.setrlimit(resource.RLIMIT_AS, (MEMORY_LIMIT, MEMORY_LIMIT))
+    if hasattr(signal, "SIGPROF"):
+        signal.signal(signal.SIGPROF, _over_budget)
+    sys.setrecursionlimit(RECURSION_LIMIT)
+
+    results = []
+    for mv_src, tk_src in sources:
+        name = "mv_func"
+        try:
+            mv_table = _evaluate(mv_src, {})
+            name = "tk_func"
+            # tk_func may build on mv_func
+            tk_table = _evaluate(tk_src, {"mv_func": mv_table})
+            results.append({"mv": _table_json(mv_table), "tk": _table_json(tk_table)})
+        except BudgetExceeded:
+            results.append({"error": f"{name} went over its {FUNCTION_BUDGET}s budget"})
+        except RecursionError:
+            results.append({"error": f"{name} recursed too deep"})
+        except MemoryError:
+            results.append({"error": f"{name} went over the memory limit"})
+        except Exception as e:
+            results.append({"error": f"{name} failed: {e}"})
+    return results
+
+
+def _worker_env() -> Dict[str, str]:
+    # windows can't start python without SYSTEMROOT
+    if os.name == "nt" and "SYSTEMROOT" in os.environ:
+        return {"SYSTEMROOT": os.environ["SYSTEMROOT"]}
+    return {}
+
+
+def _run(sources: List[Sources]) -> List[dict]:
+    # every function gets its budget, plus some slack for starting the worker
+    cpu_limit = int(len(sources) * 2 * FUNCTION_BUDGET) + 2
+    timeout = cpu_limit * 2.0
+
+    request = json.dumps({"sources": sources, "cpu_limit": cpu_limit})
+    try:
+        proc = subprocess.run(
+            # -S: nothing from site-packages is needed, and it starts faster
+            [sys.executable, "-S", "-m", "chess.sandbox"],
+            input=request.encode(),
+            capture_output=True,
+            cwd=ROOT,
+            # none of the server's secrets (the gemini api key, say)
+            env=_worker_env(),
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        raise RuleCompileError(f"ruleset evaluation took longer than {timeout:.0f}s") from None
+    if proc.returncode != 0:
+        raise RuleCompileError("ruleset evaluation worker died, over its cpu or memory limit")
+    try:
+        return json.loads(proc.stdout)
+    except ValueError:
+        raise RuleCompileError("ruleset evaluation worker sent back garbage") from None
+
+
+def evaluate(sources: List[Sources]) -> List[Tuple[VectorTable, VectorTable]]:
+    """(mv_table, tk_table) for each (mv_func, tk_func) source pair.
+
+    Raises RuleCompileError if any function is over budget or returns
+    malformed vectors. Results are cached per source pair, so only sources not
+    seen before cost a worker.
+    """
+    missing = list(dict.fromkeys(s for s in sources if s not in _cache))
+    if missing:
+        results = _run(missing)
+        for pair, result in zip(missing, results):
+            if "error" in result:
+                raise RuleCompileError(f"ruleset {sources.index(pair)}: {result['error']}")
+        if len(_cache) + len(missing) > MAX_CACHED:
+            _cache.clear()
+        for (mv_src, tk_src), result in zip(missing, results):
+            mv_table = _table_from_json(result["mv"], mv_src, {})
+            tk_table = _table_from_json(result["tk"], tk_src, {"mv_func": mv_table})
+            _cache[(mv_src, tk_src)] = (mv_table, tk_table)
+    return [_cache[s] for s in sources]
+
+
+def evaluate_one(mv_src: str, tk_src: str) -> Tuple[VectorTable, VectorTable]:
+    return evaluate([(mv_src, tk_src)])[0]
+
+
+def main() -> None:
+    request = json.load(sys.stdin)
+    sources = [tuple(pair) for pair in request["sources"]]
+    json.dump(_worker(sources, request["cpu_limit"]), sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
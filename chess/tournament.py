@@ -0,0 +1,293 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Optional, Set
+
+from chess.configstore import config_hash
+from chess.engine import Engine, parse_variant
+from chess.Game import Game
+
+# engine against engine over a corpus of match configs (the json the server
+# gets from gemini), for comparing engine variants and search settings.
+#
+#   python -m chess.tournament bench/configs --engines alphabeta material random
+#   python -m chess.tournament configs/ --engines alphabeta:depth=2 greedy --gauntlet
+#
+# every pairing plays each config twice, once with each side as white. games run
+# on a process pool and each one is appended to the results file (jsonl) as it
+# finishes, so a tournament that gets interrupted picks up where it left off when
+# started again with the same file. the table at the end is worked out from
+# everything in the file, games from earlier runs included.
+
+DEFAULT_RESULTS = "tournament.jsonl"
+DEFAULT_MOVE_TIME = 0.1
+# games queued per worker, more just sit in the pool's pipe
+IN_FLIGHT_PER_WORKER = 2
+
+# bayeselo style prior: everyone is given this many draws against an average
+# player, so an engine that wins every game gets a large but finite rating
+PRIOR_DRAWS = 2.0
+ELO_ITERATIONS = 1000
+
+
+@dataclass
+class Pairing:
+    id: str
+    config: str  # path of the config, reported in the results
+    white: str
+    black: str
+    round: int
+
+
+@dataclass
+class GameOutcome:
+    id: str
+    config: str
+    white: str
+    black: str
+    round: int
+    # from white's side: 1 win, 0.5 draw, 0 loss. None when the config wouldn't load
+    score: Optional[float]
+    reason: str
+    plies: int = 0
+    # per side, white then black
+    nodes: List[int] = field(default_factory=lambda: [0, 0])
+    seconds: List[float] = field(default_factory=lambda: [0.0, 0.0])
+    depth: List[float] = field(default_factory=lambda: [0.0, 0.0])
+
+
+def load_corpus(paths: List[str]) -> Dict[str, str]:
+    """Config json by path, for every config file given or in the directories given."""
+    corpus = {}
+    for path in paths:
+        files = (
+            sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json"))
+            if os.path.isdir(path)
+            else [path]
+        )
+        for file in files:
+            with open(file) as f:
+                corpus[file] = f.read()
+    return corpus
+
+
+def pairings(
+    corpus: Dict[str, str], engines: List[str], gauntlet: bool, rounds: int
+) -> Iterator[Pairing]:
+    if gauntlet:
+        # the first engine against each of the others
+        pairs = [(engines[0], other) for other in engines[1:]]
+    else:
+        pairs = list(itertools.combinations(engines, 2))
+    for path, config_json in corpus.items():
+        h = config_hash(config_json)[:12]
+        for a, b in pairs:
+            for r in range(rounds):
+                for white, black in ((a, b), (b, a)):
+                    yield Pairing(f"{h}:{white}:{black}:{r}", path, white, black, r)
+
+
+def play_game(pairing: Pairing, config_json: str, move_time: float) -> GameOutcome:
+    outcome = GameOutcome(pairing.id, pairing.config, pairing.white, pairing.black, pairing.round, None, "")
+    try:
+        game = Game.from_config(config_json, [])
+    except Exception as e:
+        outcome.reason = f"config failed to load: {e}"
+        return outcome
+
+    # not hash(), that's salted per process
+    seed = zlib.crc32(pairing.id.encode())
+    engines = [Engine(parse_variant(pairing.white), seed), Engine(parse_variant(pairing.black), seed + 1)]
+    searches = [0, 0]
+    while game.result is None:
+        side = game.current_turn
+        search = engines[side].choose_move(game, move_time)
+        if search.move is None:
+            break  # can't happen while the result is None, but don't spin if it does
+        game.move_piece(*search.move, validate=False)
+        outcome.nodes[side] += search.nodes
+        outcome.seconds[side] += search.elapsed
+        outcome.depth[side] += search.depth
+        searches[side] += 1
+
+    outcome.plies = game.ply
+    outcome.depth = [depth / max(n, 1) for depth, n in zip(outcome.depth, searches)]
+    result = game.result
+    if result is None or result.winner is None:
+        outcome.score = 0.5
+    else:
+        outcome.score = 1.0 if result.winner == 0 else 0.0
+    outcome.reason = result.reason if result else "no result"
+    return outcome
+
+
+def load_results(path: str) -> List[GameOutcome]:
+    outcomes = []
+    if not os.path.exists(path):
+        return outcomes
+    with open(path, "r+b") as f:
+        data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            # half written line from a run that got killed, cut it off so the
+            # next result doesn't get appended onto the end of it
+            f.truncate(complete)
+    for line in data[:complete].splitlines():
+        try:
+            outcomes.append(GameOutcome(**json.loads(line)))
+        except (ValueError, TypeError):
+            pass  # mangled some other way, skip it
+    return outcomes
+
+
+def elo_ratings(outcomes: List[GameOutcome]) -> Dict[str, float]:
+    """Maximum likelihood Bradley-Terry ratings, draws counting half a win each way.
+
+    Solved with minorization-maximization (Hunter 2004) under the PRIOR_DRAWS
+    prior, then shifted so the average engine is 0.
+    """
+    names = sorted({o.white for o in outcomes} | {o.black for o in outcomes})
+    wins = {name: PRIOR_DRAWS / 2 for name in names}
+    games: Dict[tuple, float] = {}
+    for o in outcomes:
+        if o.score is None:
+            continue
+        wins[o.white] += o.score
+        wins[o.black] += 1 - o.score
+        key = tuple(sorted((o.white, o.black)))
+        games[key] = games.get(key, 0) + 1
+
+    strength = {name: 1.0 for name in names}
+    for _ in range(ELO_ITERATIONS):
+        updated = {}
+        for name in names:
+            # the prior's games are against an opponent of strength 1
+            denominator = PRIOR_DRAWS / (strength[name] + 1.0)
+            for (a, b), n in games.items():
+                if name in (a, b):
+                    other = b if name == a else a
+                    denominator += n / (strength[name] + strength[other])
+            updated[name] = wins[name] / denominator
+        converged = all(abs(updated[n] - strength[n]) < 1e-9 * strength[n] for n in names)
+        strength = updated
+        if converged:
+            break
+
+    ratings = {name: 400 * math.log10(strength[name]) for name in names}
+    mean = sum(ratings.values()) / max(len(ratings), 1)
+    return {name: rating - mean for name, rating in ratings.items()}
+
+
+def table(outcomes: List[GameOutcome]) -> str:
+    ratings = elo_ratings(outcomes)
+    stats = {
+        name: {"games": 0, "score": 0.0, "draws": 0, "nodes": 0, "seconds": 0.0, "depth": 0.0}
+        for name in ratings
+    }
+    for o in outcomes:
+        if o.score is None:
+            continue
+        for side, name in enumerate((o.white, o.black)):
+            s = stats[name]
+            s["games"] += 1
+            s["score"] += o.score if side == 0 else 1 - o.score
+            s["draws"] += o.score == 0.5
+            s["nodes"] += o.nodes[side]
+            s["seconds"] += o.seconds[side]
+            s["depth"] += o.depth[side]
+
+    lines = [f"{'#':>2}  {'engine':<28} {'elo':>6} {'+/-':>5} {'games':>6} {'score':>6} {'draws':>6} {'nodes/s':>8} {'depth':>5}"]
+    ranked = sorted(ratings, key=ratings.get, reverse=True)
+    for rank, name in enumerate(ranked, 1):
+        s = stats[name]
+        n = max(s["games"], 1)
+        p = min(max(s["score"] / n, 0.01), 0.99)
+        # one standard error, from how spread out a score of p over n games is
+        margin = 400 / math.log(10) / math.sqrt(n * p * (1 - p))
+        nps = s["nodes"] / s["seconds"] if s["seconds"] else 0.0
+        lines.append(
+            f"{rank:>2}  {name:<28} {ratings[name]:>6.0f} {margin:>5.0f} {s['games']:>6} "
+            f"{s['score'] / n * 100:>5.1f}% {s['draws'] / n * 100:>5.1f}% {nps:>8.0f} {s['depth'] / n:>5.1f}"
+        )
+    return "\n".join(lines)
+
+
+def run(
+    corpus: Dict[str, str],
+    todo: List[Pairing],
+    results_path: str,
+    move_time: float,
+    workers: int,
+) -> None:
+    def record(outcome: GameOutcome) -> None:
+        with open(results_path, "a") as f:
+            f.write(json.dumps(asdict(outcome)) + "\n")
+        score = "-" if outcome.score is None else outcome.score
+        print(f"{outcome.white} vs {outcome.black} on {outcome.config}: {score} ({outcome.reason}, {outcome.plies} plies)")
+
+    if workers <= 1:
+        for pairing in todo:
+            record(play_game(pairing, corpus[pairing.config], move_time))
+        return
+
+    # games are cpu bound and each one times its own moves, so a worker per core
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = iter(todo)
+        pending: Set[Future] = set()
+        while True:
+            for pairing in itertools.islice(queue, workers * IN_FLIGHT_PER_WORKER - len(pending)):
+                pending.add(pool.submit(play_game, pairing, corpus[pairing.config], move_time))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record(future.result())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m chess.tournament")
+    parser.add_argument("configs", nargs="+", help="config files, or directories of them")
+    parser.add_argument("--engines", nargs="+", required=True, help="variants, e.g. alphabeta material:depth=2")
+    parser.add_argument("--gauntlet", action="store_true", help="first engine against the rest instead of round-robin")
+    parser.add_argument("--rounds", type=int, default=1, help="games per config, pairing and color")
+    parser.add_argument("--move-time", type=float, default=DEFAULT_MOVE_TIME, help="seconds per move")
+    # one per core would have games fight over cores and mess up the time control
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) - 1, 1))
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="jsonl file games are appended to")
+    args = parser.parse_args()
+
+    try:
+        for spec in args.engines:
+            parse_variant(spec)
+    except ValueError as e:
+        sys.exit(str(e))
+    if len(args.engines) < 2:
+        sys.exit("need at least two engines")
+
+    corpus = load_corpus(args.configs)
+    done = {o.id for o in load_results(args.results)}
+    scheduled = list(pairings(corpus, args.engines, args.gauntlet, args.rounds))
+    todo = [p for p in scheduled if p.id not in done]
+    print(f"{len(corpus)} configs, {len(scheduled) - len(todo)} games already played, {len(todo)} to go")
+
+    start = time.perf_counter()
+    try:
+        run(corpus, todo, args.results, args.move_time, args.workers)
+    except KeyboardInterrupt:
+        print("Stopped, run again with the same --results to carry on")
+    elapsed = time.perf_counter() - start
+
+    outcomes = [o for o in load_results(args.results) if o.white in args.engines and o.black in args.engines]
+    print(f"\n{len(outcomes)} of {len(scheduled)} games in {elapsed:.0f}s\n")
+    print(table(outcomes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import math
+import random
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from chess.rulecompiler import Vectors
+
+# estimates what each piece type of a config is worth from how far it reaches:
+# squares it could move to plus squares it could take on, averaged over every
+# origin square, a spread of random board fillings and its first few move
+# numbers (pawn style pieces move differently on move 1).
+#
+# move generation here is bit-parallel instead of per square. a board filling
+# is one int with a bit per square, and each ray step shifts the bits of every
+# origin square at once, so a whole board of pieces costs what one piece does.
+# the rules are the same as Board.get_valid_actions: a non-unit slide vector
+# (2, 2) is blocked by anything on the squares its path steps through.
+
+SAMPLES = 24
+MIN_DENSITY = 0.15
+MAX_DENSITY = 0.5
+# move numbers averaged over
+PHASES = (1, 2, 3, 4)
+# a square it can take on counts this much next to a square it can move to
+CAPTURE_WEIGHT = 1.0
+# average reach times this is the value, so a knight comes out around 30
+VALUE_SCALE = 6
+
+MAX_CACHED = 256
+_cache: Dict[str, List[int]] = {}
+
+
+@lru_cache(maxsize=None)
+def _keep_mask(size: int, dr: int, dc: int) -> int:
+    """Squares that stay on the board when stepped by (dr, dc)."""
+    mask = 0
+    for row in range(size):
+        for col in range(size):
+            if 0 <= row + dr < size and 0 <= col + dc < size:
+                mask |= 1 << (row * size + col)
+    return mask
+
+
+def _step(bits: int, size: int, dr: int, dc: int) -> int:
+    bits &= _keep_mask(size, dr, dc)
+    offset = dr * size + dc
+    return bits << offset if offset >= 0 else bits >> -offset
+
+
+@lru_cache(maxsize=None)
+def _samples(size: int) -> Tuple[int, ...]:
+    # fixed seed, so the same config always gets the same values
+    rng = random.Random(size)
+    fillings = []
+    for _ in range(SAMPLES):
+        density = rng.uniform(MIN_DENSITY, MAX_DENSITY)
+        occupied = 0
+        for square in range(size * size):
+            if rng.random() < density:
+                occupied |= 1 << square
+        fillings.append(occupied)
+    return tuple(fillings)
+
+
+def _reach(vectors: Vectors, jump: bool, max_range: int, size: int, takes: bool) -> int:
+    """Targets summed over every origin square and sample.
+
+    Moves land on empty squares, takes on occupied ones.
+    """
+    full = (1 << (size * size)) - 1
+    total = 0
+    for occupied in _samples(size):
+        empty = full & ~occupied
+        landing = occupied if takes else empty
+        for dr, dc in vectors:
+            if jump:
+                total += (_step(full, size, dr, dc) & landing).bit_count()
+                continue
+            steps = math.gcd(abs(dr), abs(dc))
+            if steps == 0:
+                continue
+            unit_r, unit_c = dr // steps, dc // steps
+            # the rays still going, one bit per origin at the square they got to
+            alive = full
+            for k in range(1, max_range * steps + 1):
+                alive = _step(alive, size, unit_r, unit_c)
+                if not alive:
+                    break
+                if k % steps == 0:
+                    total += (alive & landing).bit_count()
+                # anything in the way ends the ray, target or not
+                alive &= empty
+    return total
+
+
+def piece_values(config_hash: str, templates: List[dict], size: int) -> List[int]:
+    """Value of each piece template (as built by Board.from_config), cached per config."""
+    values = _cache.get(config_hash)
+    if values is not None:
+        return values
+
+    scores: Dict[tuple, float] = {}
+    per_origin = size * size * SAMPLES * len(PHASES)
+    raw = []
+    for template in templates:
+        score = 0.0
+        for rule_set in template["rule_sets"]:
+            for n in PHASES:
+                mv = rule_set.mv_table.lookup(n)
+                tk = rule_set.tk_table.lookup(n)
+                key = (mv, tk, rule_set.jump, rule_set.max_range)
+                if key not in scores:
+                    moves = _reach(mv, rule_set.jump, rule_set.max_range, size, takes=False)
+                    takes = _reach(tk, rule_set.jump, rule_set.max_range, size, takes=True)
+                    scores[key] = moves + CAPTURE_WEIGHT * takes
+                score += scores[key]
+        raw.append(score / per_origin)
+
+    values = [max(1, round(score * VALUE_SCALE)) for score in raw]
+    if len(_cache) >= MAX_CACHED:
+        _cache.clear()
+    _cache[config_hash] = values
+    return values
@@ -2,7 +2,14 @@ import asyncio
 import json
 from typing import Any, Awaitable, Callable, Dict, List, Optional
 
+from chess.configstore import ENCODING_ZSTD, available_encodings
 from chess.player import PlayerState
+from chess.protocol import (
+    CODECS,
+    JSON_CODEC,
+    ProtocolError,
+    pick_protocol,
+)
 
 
 class ClientConnection:
@@ -11,6 +18,13 @@ class ClientConnection:
         self.writer: Optional[asyncio.StreamWriter] = None
         self.reader: Optional[asyncio.StreamReader] = None
         self.connected: bool = False
+        # separate read/write codecs, they flip at different points in the handshake
+        self.read_codec = JSON_CODEC
+        self.write_codec = JSON_CODEC
+        # optional protocol features announced to the server
+        self.features: list[str] = ["confighash", "openingbook"]
+        if ENCODING_ZSTD in available_encodings():
+            self.features.append(ENCODING_ZSTD)
 
     async def start(self) -> None:
         try:
@@ -21,6 +35,17 @@ class ClientConnection:
             print(f"Error connecting to {self.server_ip}: {e}")
             self.connected = False
 
+    async def reconnect(self, attempts: int = 10, delay: float = 2.0) -> bool:
+        # a new socket always starts over on json
+        self.read_codec = JSON_CODEC
+        self.write_codec = JSON_CODEC
+        for _ in range(attempts):
+            await self.start()
+            if self.connected:
+                return True
+            await asyncio.sleep(delay)
+        return False
+
     async def listen(
         self, on_recv: Callable[[dict[str, Any]], Awaitable[None]]
     ) -> None:
@@ -30,16 +55,25 @@ class ClientConnection:
 
         try:
             while self.connected:
-                data = await self.reader.readline()
-                if not data:
-                    break
-
                 try:
-                    message: dict[str, Any] = json.loads(data.decode().strip())
-                    await on_recv(message)
+                    message: Optional[dict[str, Any]] = await self.read_codec.read(self.reader)
                 except json.JSONDecodeError as e:
                     print(f"Failed to parse JSON: {e}")
+                    continue
+                if message is None:
+                    break
 
+                if message.get("type") == "hello":
+                    await self.handle_hello(message)
+                    continue
+                if message.get("type") == "ping":
+                    await self.send({"type": "pong"})
+                    continue
+
+                await on_recv(message)
+
+        except ProtocolError as e:
+            print(f"Protocol error: {e}")
         except Exception as e:
             print(f"Error: {e}")
         finally:
@@ -49,15 +83,32 @@ class ClientConnection:
                 await self.writer.wait_closed()
             print("Disconnected from server")
 
+    async def handle_hello(self, message: dict[str, Any]) -> None:
+        if "protocols" in message:
+            # server advertisement, answer with our pick
+            protocol = pick_protocol(message["protocols"])
+            if not self.writer:
+                return
+            self.writer.write(
+                self.write_codec.encode(
+                    {"type": "hello", "protocol": protocol, "features": self.features}
+                )
+            )
+            # switch before yielding so no other send can sneak a json frame in
+            self.write_codec = CODECS[protocol]
+            await self.writer.drain()
+        elif "protocol" in message:
+            # server ack, every frame after this one uses the new codec
+            self.read_codec = CODECS[message["protocol"]]
+
     async def send(self, obj: Any) -> None:
         if not self.connected or not self.writer:
             print("Not connected to server")
             return
 
         try:
-            json_data: str = json.dumps(obj)
-            self.writer.write(json_data.encode() + b"\n")
+            self.writer.write(self.write_codec.encode(obj))
             await self.writer.drain()
-            # print(f"Sent message {json_data}")
+            # print(f"Sent message {obj}")
         except Exception as e:
             print(f"Failed to send message: {e}")
@@ -1,20 +1,32 @@
 import asyncio
+import base64
+import itertools
 import math
+import time
 from typing import Any, Dict, List, Optional
 
 import pygame
 import pygame_gui
 
+from chess.configstore import ConfigCache, config_hash, decompress_config
 from chess.Game import Game
 from chess.match import Match
+from chess.opening import book_move
 from chess.player import PlayerState
 from client.conn import ClientConnection
-
-pygame.init()
+from client.inbox import PacketInbox
+from client.legalmoves import LegalMoveMap
+from client.matchlist import MatchList
+from client.profiler import PHASES, FrameProfiler
+from client.render import RenderCache
 
 WINDOW_WIDTH = 1200
 WINDOW_HEIGHT = 800
 FPS = 60
+# with no input or packets for IDLE_AFTER seconds the loop drops to IDLE_FPS,
+# just enough to tick the clock labels and notice new input
+IDLE_FPS = 5
+IDLE_AFTER = 1.0
 
 COLORS = {
     "bg_dark": (28, 32, 38),
@@ -27,20 +39,34 @@ COLORS = {
     "button_hover": (76, 86, 106),
     "move_active": (255, 100, 100),
     "move_passive": (128, 128, 138),
+    "threat": (191, 97, 106),
+    "hint": (163, 190, 140),
 }
 
-IMAGESDICT = {"lavatile": pygame.image.load("resources/lava.png"),
-              "grasstile": pygame.image.load("resources/grass.png")}
-
+# piece info box on the left, it overlaps the board's first column
+INFO_BOX_RECT = pygame.Rect(50, WINDOW_HEIGHT // 2 - 100, 300, 200)
+
+# how long the result stays up over the final position before going back to the lobby
+RESULT_SECONDS = 3.0
+RESULT_REASONS = {
+    "eliminated": "no pieces left",
+    "no_moves": "no moves left",
+    "move_cap": "move limit reached",
+    "repetition": "repetition",
+    "timeout": "on time",
+    "disconnect": "opponent left",
+    "abandoned": "opponent left",
+    "config_failed": "the board couldn't be generated",
+}
 
 class ClientGame:
     def __init__(self, conn: ClientConnection):
         self.conn = conn
         self.players: Dict[int, PlayerState] = {}
 
+        pygame.init()
         self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("Chess • Game")
-        self.clock = pygame.time.Clock()
         self.running = True
 
         self.ui_manager = pygame_gui.UIManager((WINDOW_WIDTH, WINDOW_HEIGHT))
@@ -54,6 +80,24 @@ class ClientGame:
         self.player_name = ""
         self.connected = False
         self.available_matches = {}
+        self.live_matches = {}  # match_id -> {"p1_name", "p2_name", ...}
+        self.spectating = False
+        self.searching = False  # waiting in the matchmaking queue
+        self.watching_id = None
+        self.last_seq = 0  # seq of the last move applied, ours included
+        # seqs of our own moves applied locally that the server hasn't acked yet
+        self.pending_moves: List[int] = []
+        self.session_token: Optional[str] = None
+        self.resuming = False
+        self.fresh_session_token: Optional[str] = None
+        self.opponent_away = False
+        # "You win (on time)" and the like, shown once the match is over
+        self.match_result: Optional[str] = None
+        # chess clock mirrored from the server's, None until the match sends one
+        self.clock_remaining: Optional[List[float]] = None
+        self.clock_increment = 0.0
+        self.clock_turn = 0
+        self.clock_mark = 0.0
         self.game_state = "lobby"  # lobby, vs_screen, game
         self.opponent_name = ""
         self.opponent_id = None
@@ -61,9 +105,41 @@ class ClientGame:
         self.hovered_tile = None  # (x, y) tuple or None
         self.selected_tile = None  # (x, y) tuple or None for piece selection
         self.valid_moves = []  # list of valid moves for selected piece
+        self.legal_moves = LegalMoveMap()
+        # F4 marks pieces the other side could take
+        self.show_threats = False
+        # F5 outlines the opening book's move while the game is still in book
+        self.show_hints = False
+        self.opening_book: dict = {}
+        # pieces of the config being generated, shown on the vs screen as they stream in
+        self.incoming_pieces: List[dict] = []
+        # a snapshot and the moves after it that got here before the config did,
+        # e.g. while a configreq was out, applied once the board is built
+        self.held_packets: List[Dict[str, Any]] = []
+        # selected a piece before the worker got to it, fill valid_moves in once it does
+        self.awaiting_moves = False
         self.game: Optional[Game] = None
         self.current_match: Optional[Match] = None
         self.my_team = 0  # 0 for white (host), 1 for black (joiner)
+        self.config_cache = ConfigCache()
+        self.render_cache = RenderCache()
+        self.profiler = FrameProfiler()
+        # packets wait here until the next frame applies them all at once
+        self.inbox = PacketInbox()
+        # lobby widgets only get rebuilt when something they show changed, the
+        # match lists go by these versions, bumped on every change to their dicts
+        self.roster_dirty = False
+        self.available_version = 0
+        self.live_version = 0
+
+        # frame pacing and what is currently on screen, for dirty rect updates
+        self.wake = asyncio.Event()
+        self.last_activity = time.monotonic()
+        self.needs_redraw = True
+        self.drawn_view = None
+        self.drawn_squares: Dict[tuple[int, int], tuple] = {}
+        self.drawn_labels: list = []
+        self.drawn_info_piece = None
 
         self.create_lobby_ui()
 
@@ -130,23 +206,42 @@ class ClientGame:
         # create match button (hidden initially)
         self.create_match_button = pygame_gui.elements.UIButton(
             relative_rect=pygame.Rect(
-                WINDOW_WIDTH // 2 - 100, WINDOW_HEIGHT // 2 + 50, 200, 40
+                WINDOW_WIDTH // 2 - 210, WINDOW_HEIGHT // 2 + 50, 200, 40
             ),
             text="Host Match",
             manager=self.ui_manager,
         )
         self.create_match_button.hide()
 
-        # match list area
-        self.match_buttons = {}  # will store {host_id: button}
+        # quick match button, puts us in the server's matchmaking queue
+        self.quick_match_button = pygame_gui.elements.UIButton(
+            relative_rect=pygame.Rect(
+                WINDOW_WIDTH // 2 + 10, WINDOW_HEIGHT // 2 + 50, 200, 40
+            ),
+            text="Quick Match",
+            manager=self.ui_manager,
+        )
+        self.quick_match_button.hide()
+
+        # open matches under the host/quick match buttons, live ones down the right
+        list_top = WINDOW_HEIGHT // 2 + 100
+        self.join_list = MatchList(
+            self.ui_manager,
+            pygame.Rect(WINDOW_WIDTH // 2 - 150, list_top, 300, WINDOW_HEIGHT - list_top - 20),
+            lambda host_id, host_name: f"Join {host_name}",
+        )
+        self.watch_list = MatchList(
+            self.ui_manager,
+            pygame.Rect(WINDOW_WIDTH - 330, 80, 300, WINDOW_HEIGHT - 100),
+            lambda match_id, info: f"Watch {info['p1_name']} vs {info['p2_name']}",
+        )
 
     def draw_title_and_decorations(self):
-        font_large = pygame.font.Font(None, 72)
-        font_medium = pygame.font.Font(None, 36)
+        cache = self.render_cache
 
         # slightly animated title with pulse
         pulse_scale = 1 + math.sin(self.title_pulse) * 0.02
-        title_text = font_large.render("WTC", True, COLORS["text"])
+        title_text = cache.text("WTC", 72, COLORS["text"])
         title_rect = title_text.get_rect()
 
         # scale the title
@@ -165,15 +260,14 @@ class ClientGame:
         else:
             subtitle_text = "What the chess!??!?!?!??!"
 
-        subtitle = font_medium.render(subtitle_text, True, COLORS["text_muted"])
+        subtitle = cache.text(subtitle_text, 36, COLORS["text_muted"])
         subtitle_rect = subtitle.get_rect(
             center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 80)
         )
         self.screen.blit(subtitle, subtitle_rect)
 
         if self.connected:
-            rooms_font = pygame.font.Font(None, 28)
-            rooms_text = rooms_font.render("rooms", True, COLORS["accent_light"])
+            rooms_text = cache.text("rooms", 28, COLORS["accent_light"])
             rooms_rect = rooms_text.get_rect(
                 center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 10)
             )
@@ -195,6 +289,16 @@ class ClientGame:
         if event.type == pygame.QUIT:
             self.running = False
 
+        elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+            self.needs_redraw = True
+
+        elif event.type == pygame.MOUSEWHEEL and self.game_state == "lobby":
+            # wheel up is positive y, which scrolls back up the list
+            pos = pygame.mouse.get_pos()
+            for match_list in (self.join_list, self.watch_list):
+                if match_list.scroll_at(pos, -event.y):
+                    self.needs_redraw = True
+
         elif event.type == pygame_gui.UI_BUTTON_PRESSED:
             if event.ui_element == self.connect_button:
                 self.player_name = self.name_input.get_text()
@@ -202,12 +306,16 @@ class ClientGame:
                     asyncio.create_task(self.send_player_name())
             elif event.ui_element == self.create_match_button:
                 asyncio.create_task(self.create_match())
+            elif event.ui_element == self.quick_match_button:
+                asyncio.create_task(self.toggle_quick_match())
             else:
                 # check if it's a match button
-                for host_id, button in self.match_buttons.items():
-                    if event.ui_element == button:
-                        asyncio.create_task(self.join_match(host_id))
-                        break
+                host_id = self.join_list.key_for(event.ui_element)
+                if host_id is not None:
+                    asyncio.create_task(self.join_match(host_id))
+                match_id = self.watch_list.key_for(event.ui_element)
+                if match_id is not None:
+                    asyncio.create_task(self.spectate_match(match_id))
 
         elif event.type == pygame_gui.UI_TEXT_ENTRY_FINISHED:
             if event.ui_element == self.name_input:
@@ -215,6 +323,19 @@ class ClientGame:
                 if self.player_name.strip():
                     asyncio.create_task(self.send_player_name())
 
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_F3:
+                self.profiler.visible = not self.profiler.visible
+                self.needs_redraw = True
+            elif event.key == pygame.K_F4:
+                # square_states picks the change up, no full redraw needed
+                self.show_threats = not self.show_threats
+            elif event.key == pygame.K_F5:
+                self.show_hints = not self.show_hints
+            elif event.key == pygame.K_ESCAPE and self.spectating:
+                asyncio.create_task(self.conn.send({"type": "unspectate"}))
+                self.return_to_lobby()
+
         elif event.type == pygame.MOUSEBUTTONDOWN:
             mouse_pos = pygame.mouse.get_pos()
 
@@ -245,24 +366,36 @@ class ClientGame:
                         )
 
                         attempting_move = (
-                            self.selected_tile is not None
+                            not self.spectating
+                            and self.selected_tile is not None
                             and self.is_my_turn()
                             and selected_piece is not None
                             and selected_piece.team == self.my_team
                             and clicked_pos in self.valid_moves
+                            and self.match_result is None
+                            and self.game.result is None
                         )
 
                         if attempting_move:
-                            success = self.game.move_piece(self.selected_tile, clicked_pos)
+                            # valid_moves comes from the move map for this exact board
+                            # version, no need to generate the moves again here
+                            success = self.game.move_piece(
+                                self.selected_tile, clicked_pos, validate=False
+                            )
                             if success:
+                                # shown right away, the server acks or rejects it by seq
                                 if self.current_match:
                                     self.current_match.move += 1
-                                asyncio.create_task(self.send_move(self.selected_tile, clicked_pos))
+                                self.last_seq += 1
+                                self.pending_moves.append(self.last_seq)
+                                self.switch_clock()
+                                asyncio.create_task(
+                                    self.send_move(self.selected_tile, clicked_pos, self.last_seq)
+                                )
                             self.selected_tile = None
                             self.valid_moves = []
                         elif piece is not None:
-                            self.selected_tile = clicked_pos
-                            self.valid_moves = self.game.board.get_valid_actions(clicked_pos) or []
+                            self.select_tile(clicked_pos)
                         else:
                             self.selected_tile = None
                             self.valid_moves = []
@@ -292,6 +425,8 @@ class ClientGame:
                 self.hovered_tile = None
 
     async def create_match(self):
+        if self.searching:
+            await self.toggle_quick_match()
         self.my_team = 0  # Host is white (team 0)
         print(f"TEAM: Set my_team to {self.my_team} (host)")
         # Create local match with self as p1
@@ -306,17 +441,87 @@ class ClientGame:
         await self.conn.send({"type": "matchcreate"})
 
     async def join_match(self, host_id):
+        if self.searching:
+            await self.toggle_quick_match()
         self.my_team = 1  # Joiner is black (team 1)
         print(f"TEAM: Set my_team to {self.my_team} (joiner)")
         await self.conn.send({"type": "matchjoin", "player_id": host_id})
 
-    async def send_move(self, from_pos, to_pos):
+    async def toggle_quick_match(self):
+        if self.current_match is not None:
+            return
+        self.searching = not self.searching
+        if self.searching:
+            self.quick_match_button.set_text("Cancel Search")
+            await self.conn.send({"type": "matchqueue"})
+        else:
+            self.quick_match_button.set_text("Quick Match")
+            await self.conn.send({"type": "matchunqueue"})
+
+    async def spectate_match(self, match_id):
+        info = self.live_matches.get(match_id)
+        if info is None:
+            return
+        self.spectating = True
+        self.my_team = 0
+        self.opponent_id = None
+        self.opponent_name = info["p2_name"] or "?"
+        self.current_match = None
+        self.watching_id = match_id
+        if self.searching:
+            await self.toggle_quick_match()
+
+        self.create_match_button.hide()
+        self.quick_match_button.hide()
+        self.join_list.hide()
+        self.watch_list.hide()
+
+        await self.conn.send({"type": "spectate", "match_id": match_id})
+
+    def return_to_lobby(self):
+        self.game = None
+        self.current_match = None
+        self.spectating = False
+        self.selected_tile = None
+        self.hovered_tile = None
+        self.valid_moves = []
+        self.last_seq = 0
+        self.pending_moves = []
+        self.watching_id = None
+        self.opponent_away = False
+        self.match_result = None
+        self.clock_remaining = None
+        self.opening_book = {}
+        self.incoming_pieces = []
+        self.held_packets = []
+        self.game_state = "lobby"
+        if not self.connected:
+            return
+        self.create_match_button.show()
+        self.quick_match_button.show()
+        self.join_list.show()
+        self.watch_list.show()
+
+    async def send_move(self, from_pos, to_pos, seq):
         await self.conn.send({
             "type": "move",
             "from": [from_pos[0], from_pos[1]],
-            "to": [to_pos[0], to_pos[1]]
+            "to": [to_pos[0], to_pos[1]],
+            "seq": seq,
         })
 
+    def rollback_moves(self, seq: int) -> None:
+        """Takes back our predicted moves from seq onwards, newest first."""
+        while self.pending_moves and self.pending_moves[-1] >= seq:
+            self.pending_moves.pop()
+            if self.game:
+                self.game.undo_move()
+            if self.current_match:
+                self.current_match.move -= 1
+            self.last_seq -= 1
+        self.selected_tile = None
+        self.valid_moves = []
+
     async def send_player_name(self):
         if not self.player_name.strip():
             self.status_label.set_text("Please enter a name first")
@@ -332,6 +537,9 @@ class ClientGame:
         self.connect_button.hide()
         self.player_count_label.show()
         self.create_match_button.show()
+        self.quick_match_button.show()
+        self.join_list.show()
+        self.watch_list.show()
         self.update_player_count()
 
     def update_player_count(self):
@@ -341,49 +549,45 @@ class ClientGame:
     def update_match_buttons(self):
         if not self.connected or self.game_state != "lobby":
             return
-
-        # remove buttons for matches that no longer exist
-        to_remove = []
-        for host_id, button in self.match_buttons.items():
-            if host_id not in self.available_matches:
-                button.kill()
-                to_remove.append(host_id)
-        for host_id in to_remove:
-            del self.match_buttons[host_id]
-
-        # create buttons for new matches
-        y_offset = WINDOW_HEIGHT // 2 + 100
-        for i, (host_id, host_name) in enumerate(self.available_matches.items()):
-            if host_id not in self.match_buttons:
-                button_rect = pygame.Rect(
-                    WINDOW_WIDTH // 2 - 150, y_offset + i * 50, 300, 40
-                )
-                button = pygame_gui.elements.UIButton(
-                    relative_rect=button_rect,
-                    text=f"Join {host_name}",
-                    manager=self.ui_manager,
-                )
-                self.match_buttons[host_id] = button
+        changed = self.join_list.sync(self.available_matches, self.available_version)
+        changed |= self.watch_list.sync(self.live_matches, self.live_version)
+        if changed:
+            # this frame's ui update already ran, the new button text would only show next frame
+            self.ui_manager.update(0)
+        self.join_list.draw(self.screen, COLORS["bg_light"], COLORS["accent"])
+        self.watch_list.draw(self.screen, COLORS["bg_light"], COLORS["accent"])
 
     # the loading screen p much
     def draw_vs_screen(self):
-        font_large = pygame.font.Font(None, 72)
         vs_text = f"{self.player_name} VS {self.opponent_name}"
-        text_surface = font_large.render(vs_text, True, COLORS["text"])
+        text_surface = self.render_cache.text(vs_text, 72, COLORS["text"])
         text_rect = text_surface.get_rect(
             center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2)
         )
         self.screen.blit(text_surface, text_rect)
 
+        # the config's pieces, as the server gets them from the generator
+        if self.incoming_pieces:
+            names = "   ".join(piece["name"] for piece in self.incoming_pieces)
+            y = text_rect.bottom + 30
+            for line in self.render_cache.wrap(names, 28, WINDOW_WIDTH - 200):
+                surface = self.render_cache.text(line, 28, COLORS["text_muted"])
+                self.screen.blit(surface, surface.get_rect(center=(WINDOW_WIDTH // 2, y)))
+                y += 30
+
+        # a match called off before it started, shown until the lobby takes over
+        if self.match_result:
+            result_text = self.render_cache.text(self.match_result, 40, COLORS["accent_light"])
+            self.screen.blit(
+                result_text, result_text.get_rect(center=(WINDOW_WIDTH // 2, text_rect.top - 60))
+            )
+
     def draw_piece_info_box(self, piece):
         if not piece:
             return
 
         # info box on left side
-        box_width = 300
-        box_height = 200
-        box_x = 50
-        box_y = WINDOW_HEIGHT // 2 - box_height // 2
+        box_x, box_y, box_width, box_height = INFO_BOX_RECT
 
         # background
         pygame.draw.rect(self.screen, COLORS["bg_light"],
@@ -391,59 +595,30 @@ class ClientGame:
         pygame.draw.rect(self.screen, COLORS["accent"],
                         (box_x, box_y, box_width, box_height), 2)
 
-        font_title = pygame.font.Font(None, 28)
-        font_text = pygame.font.Font(None, 20)
-
+        cache = self.render_cache
         y_offset = box_y + 10
 
         # piece name
-        name_text = font_title.render(piece.name, True, COLORS["text"])
+        name_text = cache.text(piece.name, 28, COLORS["text"])
         self.screen.blit(name_text, (box_x + 10, y_offset))
         y_offset += 35
 
         # piece description
-        desc_lines = []
-        words = piece.piece_desc.split()
-        current_line = ""
-        for word in words:
-            test_line = current_line + " " + word if current_line else word
-            if font_text.size(test_line)[0] < box_width - 20:
-                current_line = test_line
-            else:
-                if current_line:
-                    desc_lines.append(current_line)
-                current_line = word
-        if current_line:
-            desc_lines.append(current_line)
-
-        for line in desc_lines:
-            desc_text = font_text.render(line, True, COLORS["text_muted"])
+        for line in cache.wrap(piece.piece_desc, 20, box_width - 20):
+            desc_text = cache.text(line, 20, COLORS["text_muted"])
             self.screen.blit(desc_text, (box_x + 10, y_offset))
             y_offset += 20
 
         y_offset += 10
 
         # movement description
-        move_lines = []
-        words = piece.move_desc.split()
-        current_line = ""
-        for word in words:
-            test_line = current_line + " " + word if current_line else word
-            if font_text.size(test_line)[0] < box_width - 20:
-                current_line = test_line
-            else:
-                if current_line:
-                    move_lines.append(current_line)
-                current_line = word
-        if current_line:
-            move_lines.append(current_line)
-
-        for line in move_lines:
-            move_text = font_text.render(line, True, COLORS["accent_light"])
+        for line in cache.wrap(piece.move_desc, 20, box_width - 20):
+            move_text = cache.text(line, 20, COLORS["accent_light"])
             self.screen.blit(move_text, (box_x + 10, y_offset))
             y_offset += 20
 
-    def draw_chess_board(self):
+    def draw_chess_board(self) -> None:
+        """Draws the whole board screen and remembers what went where."""
         board_size = 600
         board_x = (WINDOW_WIDTH - board_size) // 2
         board_y = (WINDOW_HEIGHT - board_size) // 2
@@ -455,24 +630,127 @@ class ClientGame:
         self.board_size = board_size
         self.square_size = square_size
 
-        # draw checkerboard respecting board orientation
-        for row in range(self.grid_size):
-            for col in range(self.grid_size):
-                color = COLORS["bg_light"] if (row + col) % 2 == 0 else COLORS["accent"]
-                display_row, display_col = self.board_display_coords(row, col)
-                square_rect = pygame.Rect(
-                    board_x + display_col * square_size,
-                    board_y + display_row * square_size,
-                    square_size,
-                    square_size,
+        # checkerboard respecting board orientation, rendered once per side
+        checkerboard = self.render_cache.board(
+            self.grid_size, square_size, self.my_team, COLORS["bg_light"], COLORS["accent"]
+        )
+        self.screen.blit(checkerboard, (board_x, board_y))
+
+        self.drawn_squares = self.square_states()
+        for pos, state in self.drawn_squares.items():
+            self.draw_square(pos, state)
+
+        # draw border
+        pygame.draw.rect(
+            self.screen,
+            COLORS["text"],
+            pygame.Rect(board_x - 2, board_y - 2, board_size + 4, board_size + 4),
+            2,
+        )
+
+        # player names
+        self.drawn_labels = self.player_labels()
+        for text, color, surface, rect in self.drawn_labels:
+            self.screen.blit(surface, rect)
+
+        # draw piece info box if hovering over a piece
+        self.drawn_info_piece = self.hovered_piece()
+        if self.drawn_info_piece:
+            self.draw_piece_info_box(self.drawn_info_piece)
+
+    def draw_board_changes(self) -> List[pygame.Rect]:
+        """Redraws only what changed since the last frame, returns the dirty rects."""
+        dirty: List[pygame.Rect] = []
+
+        states = self.square_states()
+        changed = [
+            pos
+            for pos in self.drawn_squares.keys() | states.keys()
+            if self.drawn_squares.get(pos) != states.get(pos)
+        ]
+        if changed:
+            checkerboard = self.render_cache.board(
+                self.grid_size, self.square_size, self.my_team, COLORS["bg_light"], COLORS["accent"]
+            )
+            for pos in changed:
+                rect = self.square_rect(pos)
+                # put the bare square back, then whatever sits on it now
+                self.screen.blit(
+                    checkerboard, rect, rect.move(-self.board_x, -self.board_y)
                 )
-                pygame.draw.rect(self.screen, color, square_rect)
+                if pos in states:
+                    self.draw_square(pos, states[pos])
+                dirty.append(rect)
+            self.drawn_squares = states
+
+        labels = self.player_labels()
+        # the result label comes and goes, the others only change text
+        for old, new in itertools.zip_longest(self.drawn_labels, labels):
+            if old is None or new is None or old[:2] != new[:2]:
+                area = old[3].union(new[3]) if old and new else (old or new)[3]
+                self.screen.fill(COLORS["bg_dark"], area)
+                if new:
+                    self.screen.blit(new[2], new[3])
+                dirty.append(area)
+        self.drawn_labels = labels
+
+        # the info box sits on top of the board's left edge, so when it changes or
+        # something under it was redrawn, repaint that corner with a clip
+        if self.hovered_piece() is not self.drawn_info_piece or (
+            self.drawn_info_piece and any(r.colliderect(INFO_BOX_RECT) for r in dirty)
+        ):
+            self.screen.set_clip(INFO_BOX_RECT)
+            self.screen.fill(COLORS["bg_dark"])
+            self.draw_chess_board()
+            self.screen.set_clip(None)
+            dirty.append(INFO_BOX_RECT)
+        return dirty
+
+    def select_tile(self, pos: tuple[int, int]) -> None:
+        self.selected_tile = pos
+        self.legal_moves.refresh(self.game.board, self.game.current_turn)
+        moves = self.legal_moves.lookup(self.game.board, pos)
+        self.valid_moves = moves or []
+        self.awaiting_moves = moves is None
+
+    def update_legal_moves(self) -> None:
+        """Keeps the background move map in step with the board, once per frame."""
+        if self.game is None or self.game_state != "game":
+            return
+        board = self.game.board
+        # no-op unless the board changed, then the side to move is worked out first
+        self.legal_moves.refresh(board, self.game.current_turn)
+        if self.awaiting_moves and self.selected_tile is not None:
+            moves = self.legal_moves.lookup(board, self.selected_tile)
+            if moves is not None:
+                self.valid_moves = moves
+                self.awaiting_moves = False
+
+    def square_rect(self, pos: tuple[int, int]) -> pygame.Rect:
+        display_row, display_col = self.board_display_coords(*pos)
+        return pygame.Rect(
+            self.board_x + display_col * self.square_size,
+            self.board_y + display_row * self.square_size,
+            self.square_size,
+            self.square_size,
+        )
 
-        # draw valid move highlights (color depends on ownership/turn)
-        selected_piece = None
-        if self.selected_tile and self.game and self.game.board:
-            selected_piece = self.game.board.get_piece(self.selected_tile)
+    def square_states(self) -> Dict[tuple[int, int], tuple]:
+        """What each non-plain square shows: (piece, move highlight, selected, hovered, threatened, hint)."""
+        board = self.game.board if self.game else None
+        states = {}
 
+        pieces = {}
+        if board:
+            for row in range(self.grid_size):
+                for col in range(self.grid_size):
+                    piece = board.get_piece((row, col))
+                    if piece is not None:
+                        pieces[(row, col)] = (piece.name, piece.team)
+
+        # valid move highlight color depends on ownership/turn
+        move_color = None
+        selected_piece = board.get_piece(self.selected_tile) if board and self.selected_tile else None
         if selected_piece:
             is_my_piece = selected_piece.team == self.my_team
             move_color = (
@@ -480,189 +758,311 @@ class ClientGame:
                 if is_my_piece and self.is_my_turn()
                 else COLORS["move_passive"]
             )
-
-            for move_row, move_col in self.valid_moves:
-                display_row, display_col = self.board_display_coords(move_row, move_col)
-                move_rect = pygame.Rect(
-                    board_x + display_col * square_size,
-                    board_y + display_row * square_size,
-                    square_size,
-                    square_size,
-                )
-                pygame.draw.rect(self.screen, move_color, move_rect, 3)
-
-        # draw selection outline (selected piece border)
-        if self.selected_tile:
-            selected_row, selected_col = self.selected_tile
-            display_row, display_col = self.board_display_coords(selected_row, selected_col)
-            selected_rect = pygame.Rect(
-                board_x + display_col * square_size,
-                board_y + display_row * square_size,
-                square_size,
-                square_size,
+        moves = set(self.valid_moves) if move_color else set()
+
+        threatened = set()
+        if board and self.show_threats:
+            threatened = {*board.threatened_pieces(0), *board.threatened_pieces(1)}
+
+        hint = set()
+        if self.game and self.show_hints and self.opening_book:
+            book_hit = book_move(self.opening_book, self.game)
+            if book_hit is not None:
+                hint = set(book_hit[0])
+
+        for pos in pieces.keys() | moves | hint | {self.selected_tile, self.hovered_tile}:
+            if pos is None:
+                continue
+            states[pos] = (
+                pieces.get(pos),
+                move_color if pos in moves else None,
+                pos == self.selected_tile,
+                pos == self.hovered_tile,
+                pos in threatened,
+                pos in hint,
             )
-            pygame.draw.rect(self.screen, COLORS["accent"], selected_rect, 3)
-
-        # draw hover outline
-        if self.hovered_tile:
-            hover_row, hover_col = self.hovered_tile
-            display_row, display_col = self.board_display_coords(hover_row, hover_col)
-            hover_rect = pygame.Rect(
-                board_x + display_col * square_size,
-                board_y + display_row * square_size,
-                square_size,
-                square_size,
+        return states
+
+    def draw_square(self, pos: tuple[int, int], state: tuple) -> None:
+        piece, move_color, selected, hovered, threatened, hint = state
+        rect = self.square_rect(pos)
+
+        # threat marker, book move and valid move highlights, then selection and hover outlines, then the piece
+        if threatened:
+            pygame.draw.rect(self.screen, COLORS["threat"], rect.inflate(-8, -8), border_radius=6)
+        if hint:
+            pygame.draw.rect(self.screen, COLORS["hint"], rect.inflate(-6, -6), 3, border_radius=6)
+        if move_color:
+            pygame.draw.rect(self.screen, move_color, rect, 3)
+        if selected:
+            pygame.draw.rect(self.screen, COLORS["accent"], rect, 3)
+        if hovered:
+            pygame.draw.rect(self.screen, COLORS["text"], rect, 2)
+        if piece:
+            name, team = piece
+            token = self.render_cache.piece(
+                name,
+                team,
+                self.square_size,
+                self.get_team_color(team),
+                self.get_piece_text_color(team),
             )
-            pygame.draw.rect(self.screen, COLORS["text"], hover_rect, 2)
-
-        # draw pieces
-        if self.game and self.game.board:
-            piece_font = pygame.font.Font(None, 24)
-            piece_count = 0
-            for row in range(self.grid_size):
-                for col in range(self.grid_size):
-                    piece = self.game.board.get_piece((row, col))
-                    if piece is not None:
-                        piece_count += 1
-                        piece_text = piece.name[:4].upper()
-                        text_color = self.get_piece_text_color(piece.team)
-                        text_surface = piece_font.render(piece_text, True, text_color)
-                        display_row, display_col = self.board_display_coords(row, col)
-                        center = (
-                            board_x + display_col * square_size + square_size // 2,
-                            board_y + display_row * square_size + square_size // 2,
-                        )
-                        circle_color = self.get_team_color(piece.team)
-                        circle_radius = max(square_size // 2 - 6, square_size // 3)
-                        pygame.draw.circle(self.screen, circle_color, center, circle_radius, 5)
-                        text_rect = text_surface.get_rect(
-                            center=center
-                        )
-                        self.screen.blit(text_surface, text_rect)
+            self.screen.blit(token, rect)
 
-        # draw border
-        pygame.draw.rect(
-            self.screen,
-            COLORS["text"],
-            pygame.Rect(board_x - 2, board_y - 2, board_size + 4, board_size + 4),
-            2,
-        )
-
-        # player names
-        font = pygame.font.Font(None, 36)
+    def hovered_piece(self):
+        if self.hovered_tile and self.game and self.game.board:
+            return self.game.board.get_piece(self.hovered_tile)
+        return None
 
+    def player_labels(self) -> list:
+        """(text, color, surface, rect) of the you/opponent labels around the board."""
         # you at bottom right
         you_color = self.get_contrast_color(self.my_team)
         you_is_turn = self.is_my_turn()
         you_text_color = (100, 200, 120) if you_is_turn else you_color
-        you_text = font.render("YOU", True, you_text_color)
+        you_label = "YOU"
+        if self.spectating:
+            info = self.live_matches.get(self.watching_id)
+            you_label = info["p1_name"] if info else "?"
+        you_label += self.clock_text(self.my_team)
+        you_text = self.render_cache.text(you_label, 36, you_text_color)
         you_rect = you_text.get_rect(
-            bottomright=(board_x + board_size + 120, board_y + board_size + 40)
+            bottomright=(self.board_x + self.board_size + 120, self.board_y + self.board_size + 40)
         )
-        self.screen.blit(you_text, you_rect)
 
         # opponent name (top left)
         opp_color = self.get_contrast_color(1 - self.my_team)
         opp_is_turn = self.game and self.game.current_turn == (1 - self.my_team)
         opp_text_color = (100, 200, 120) if opp_is_turn else opp_color
-        opp_text = font.render(self.opponent_name, True, opp_text_color)
-        opp_rect = opp_text.get_rect(topleft=(board_x - 120, board_y - 40))
-        self.screen.blit(opp_text, opp_rect)
-
-        # draw piece info box if hovering over a piece
-        if self.hovered_tile and self.game and self.game.board:
-            hovered_piece = self.game.board.get_piece(self.hovered_tile)
-            if hovered_piece:
-                self.draw_piece_info_box(hovered_piece)
+        opp_label = self.opponent_name + (" (away)" if self.opponent_away else "")
+        opp_label += self.clock_text(1 - self.my_team)
+        opp_text = self.render_cache.text(opp_label, 36, opp_text_color)
+        opp_rect = opp_text.get_rect(topleft=(self.board_x - 120, self.board_y - 40))
+
+        labels = [
+            (you_label, you_text_color, you_text, you_rect),
+            (opp_label, opp_text_color, opp_text, opp_rect),
+        ]
+        if self.match_result:
+            result_text = self.render_cache.text(self.match_result, 40, COLORS["accent_light"])
+            result_rect = result_text.get_rect(
+                center=(self.board_x + self.board_size // 2, self.board_y - 40)
+            )
+            labels.append((self.match_result, COLORS["accent_light"], result_text, result_rect))
+        return labels
 
     def render_gui(self, time_delta):
-        # clear screen w the color thing
-        self.screen.fill(COLORS["bg_dark"])
-
-        if self.game_state == "lobby":
-            self.draw_title_and_decorations()
-            self.update_match_buttons()
-        elif self.game_state == "vs_screen":
-            self.draw_vs_screen()
-        elif self.game_state == "game":
-            self.draw_chess_board()
-
-        self.ui_manager.draw_ui(self.screen)
-
-        pygame.display.flip()
+        profiler = self.profiler
+        if self.game_state == "game":
+            view = (self.game_state, id(self.game), self.my_team, self.grid_size)
+            if not self.needs_redraw and view == self.drawn_view:
+                with profiler.phase("render.scene"):
+                    dirty = self.draw_board_changes()
+                    if profiler.visible:
+                        dirty.append(self.draw_profiler())
+                with profiler.phase("render.present"):
+                    if dirty:
+                        pygame.display.update(dirty)
+                return
+            self.drawn_view = view
+        elif self.idle and not self.needs_redraw:
+            # lobby and vs screen only change on input or packets
+            return
+        else:
+            self.drawn_view = None
+        self.needs_redraw = False
+
+        with profiler.phase("render.scene"):
+            # clear screen w the color thing
+            self.screen.fill(COLORS["bg_dark"])
+
+            if self.game_state == "lobby":
+                self.draw_title_and_decorations()
+                self.update_match_buttons()
+            elif self.game_state == "vs_screen":
+                self.draw_vs_screen()
+            elif self.game_state == "game":
+                self.draw_chess_board()
+
+        with profiler.phase("render.ui"):
+            self.ui_manager.draw_ui(self.screen)
+
+        if profiler.visible:
+            self.draw_profiler()
+
+        with profiler.phase("render.present"):
+            pygame.display.flip()
+
+    def draw_profiler(self) -> pygame.Rect:
+        """Per-phase timings in the bottom left corner, F3 toggles it."""
+        rows = [("frame", *self.profiler.frame_ms())] + self.profiler.summary()[: len(PHASES)]
+        rect = pygame.Rect(10, WINDOW_HEIGHT - 40 - 18 * (len(PHASES) + 2), 270, 18 * (len(PHASES) + 2) + 20)
+        self.screen.fill(COLORS["bg_dark"], rect)
+        pygame.draw.rect(self.screen, COLORS["accent"], rect, 1)
+
+        cache = self.render_cache
+        y = rect.y + 10
+        # proportional font, so every column is placed on its own
+        for label, avg, worst in [("ms", "avg", "max")] + [
+            (name, f"{avg:.2f}", f"{worst:.2f}") for name, avg, worst in rows
+        ]:
+            color = COLORS["text"] if label in ("ms", "frame") else COLORS["text_muted"]
+            self.screen.blit(cache.text(label, 20, color), (rect.x + 10, y))
+            for text, right in ((avg, rect.x + 190), (worst, rect.right - 10)):
+                surface = cache.text(text, 20, color)
+                self.screen.blit(surface, surface.get_rect(topright=(right, y)))
+            y += 18
+        return rect
+
+    @property
+    def idle(self) -> bool:
+        return time.monotonic() - self.last_activity > IDLE_AFTER
+
+    def wake_up(self) -> None:
+        """Marks activity and cuts the current frame's sleep short."""
+        self.last_activity = time.monotonic()
+        self.wake.set()
 
     async def game_loop(self):
-        while self.running:
-            time_delta = self.clock.tick(FPS) / 1000.0
+        loop = asyncio.get_running_loop()
+        self.legal_moves.on_ready = lambda: loop.call_soon_threadsafe(self.wake_up)
 
-            for event in pygame.event.get():
-                self.handle_gui_events(event)
+        last_frame = time.monotonic()
+        while self.running:
+            frame_start = time.monotonic()
+            time_delta = frame_start - last_frame
+            last_frame = frame_start
+
+            profiler = self.profiler
+            with profiler.phase("events"):
+                events = pygame.event.get()
+                for event in events:
+                    self.handle_gui_events(event)
+            if events:
+                self.last_activity = frame_start
 
             # update UI manager
-            self.ui_manager.update(time_delta)
+            with profiler.phase("ui.update"):
+                self.ui_manager.update(time_delta)
             self.time_accumulator += time_delta
-            self.title_pulse += time_delta * 2
+            idle = self.idle
+            if not idle:
+                self.title_pulse += time_delta * 2
 
+            await self.process_inbox()
+            with profiler.phase("legalmoves"):
+                self.update_legal_moves()
             self.render_gui(time_delta)
+            profiler.end_frame()
+
+            # sleep out the rest of the frame instead of spinning, packets wake us early
+            frame_time = 1 / (IDLE_FPS if idle else FPS)
+            remaining = frame_time - (time.monotonic() - frame_start)
+            if remaining > 0:
+                try:
+                    await asyncio.wait_for(self.wake.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(0)
+            self.wake.clear()
 
-            await asyncio.sleep(0.001)
-
+        self.legal_moves.shutdown()
         pygame.quit()
 
-    async def handle_packet(self, message: Dict[str, Any]):
-        mtype = message["type"]
+    async def receive_packet(self, message: Dict[str, Any]):
+        self.inbox.push(message)
+        self.wake_up()
 
-        print(message)
-
-        if mtype == "playerjoin":
-            player: PlayerState = PlayerState(**message["player"])
-            self.players[player.id] = player
-            print(f"New player joined the server: {player.name}:{player.id}")
-
-            if self.connected:
+    async def process_inbox(self) -> None:
+        """Applies every packet that arrived since the last frame."""
+        if not len(self.inbox):
+            return
+        with self.profiler.phase("packets"):
+            for message in self.inbox.drain():
+                await self.handle_packet(message)
+            if self.roster_dirty and self.connected:
                 self.update_player_count()
+            self.roster_dirty = False
 
-        elif mtype == "playerleave":
-            player: PlayerState = PlayerState(**message["player"])
-            print(f"{player.name}:{player.id} left the server")
-            if player.id in self.players:
-                del self.players[player.id]
-
-            # remove from available matches if they were hosting
-            if player.id in self.available_matches:
-                del self.available_matches[player.id]
+    async def handle_packet(self, message: Dict[str, Any]):
+        mtype = message["type"]
 
-            if self.connected:
-                self.update_player_count()
+        print(message)
 
-        elif mtype == "playermod":
-            player: PlayerState = PlayerState(**message["player"])
-            self.players[player.id] = player
+        if mtype == "session":
+            # while resuming, hang on to the old token until the server answers
+            if not self.resuming:
+                self.session_token = message["token"]
+            else:
+                self.fresh_session_token = message["token"]
+
+        elif mtype == "resumed":
+            self.resuming = False
+            self.my_team = message["team"]
+            self.opponent_away = False
+            print(f"Resumed match {message['match_id']} at move {message['seq']}")
+
+        elif mtype == "resumefail":
+            # match is gone, carry on as a new player
+            self.resuming = False
+            self.session_token = self.fresh_session_token
+            self.return_to_lobby()
+            if self.player_name.strip():
+                await self.conn.send({"type": "name", "name": self.player_name})
+
+        elif mtype == "clock":
+            self.clock_remaining = message["remaining"]
+            self.clock_turn = message["turn"]
+            self.clock_increment = message["increment"]
+            self.clock_mark = time.monotonic()
+
+        elif mtype == "opponentaway":
+            self.opponent_away = True
+
+        elif mtype == "opponentback":
+            self.opponent_away = False
+
+        elif mtype == "roster":
+            # a run of playerjoin/playerleave/playermod, merged by the inbox
+            for player_id, pd in message["players"].items():
+                if pd is None:
+                    self.players.pop(player_id, None)
+                    # remove from available matches if they were hosting
+                    if self.available_matches.pop(player_id, None) is not None:
+                        self.available_version += 1
+                else:
+                    self.players[player_id] = PlayerState(**pd)
+            self.roster_dirty = True
 
         elif mtype == "playerlist":
             # update playerlist
             self.players.update(
                 {pd["id"]: PlayerState(**pd) for pd in message["players"]}
             )
+            self.roster_dirty = True
 
-            if self.connected:
-                self.update_player_count()
+        elif mtype == "queued":
+            print(f"MATCH: Queued for a quick match, {message['size']} searching")
 
         elif mtype == "matchcreate":
             host_id = message["host_id"]
             if host_id in self.players:
                 host_name = self.players[host_id].name
                 self.available_matches[host_id] = host_name
+                self.available_version += 1
 
         elif mtype == "matchlist":
             self.available_matches.update(
                 {md["host_id"]: md["host_name"] for md in message["matches"]}
             )
+            self.available_version += 1
 
         elif mtype == "matchremove":
             host_id = message["host_id"]
             if host_id in self.available_matches:
                 del self.available_matches[host_id]
+                self.available_version += 1
 
         elif mtype == "matchstart":
             if "team" in message:
@@ -673,6 +1073,7 @@ class ClientGame:
                 self.opponent_name = self.players[other_id].name
                 self.opponent_id = other_id
                 self.game_state = "vs_screen"
+                self.incoming_pieces = []
 
                 # Update current match with both players
                 current_player = None
@@ -682,36 +1083,119 @@ class ClientGame:
                         current_player = player
                         break
 
+                match_id = message.get("match_id", 0)
                 if current_player:
                     if self.my_team == 0:  # Host
-                        self.current_match = Match(p1=current_player, p2=other_player, move=0, game=None)
+                        self.current_match = Match(id=match_id, p1=current_player, p2=other_player, move=0, game=None)
                     else:  # Joiner
-                        self.current_match = Match(p1=other_player, p2=current_player, move=0, game=None)
+                        self.current_match = Match(id=match_id, p1=other_player, p2=current_player, move=0, game=None)
 
                 # HIDE HTE LOBBY UI STUFF
                 self.create_match_button.hide()
+                self.quick_match_button.hide()
+                self.searching = False
+                self.quick_match_button.set_text("Quick Match")
 
                 # hide all match buttons
-                for button in self.match_buttons.values():
-                    button.hide()
+                self.join_list.hide()
+                self.watch_list.hide()
 
                 asyncio.create_task(self.vs_screen_timer())
 
-        elif mtype == "matchconfig":
-            # recieved match config and start the game
-            config_json = message.get("config", "{}")
-            players = [self.players[self.opponent_id]] if self.opponent_id else []
-            self.game = Game.from_config(config_json, players)
+        elif mtype == "openingbook":
+            # follows the matchconfig once the server has searched it
+            if (self.current_match and self.current_match.id == message["match_id"]) or (
+                self.spectating and self.watching_id == message["match_id"]
+            ):
+                self.opening_book = message["book"]
+                self.needs_redraw = True
 
-            if self.current_match:
-                self.current_match.game = self.game
+        elif mtype == "matchconfigpart":
+            if self.current_match and self.current_match.id == message["match_id"]:
+                self.incoming_pieces.append(message["piece"])
 
-            self.game_state = "game"
+        elif mtype == "matchconfig":
+            # recieved match config and start the game
+            if "book" in message:
+                self.opening_book = message["book"]
+            if "config" in message:
+                # inline config from a server without config hashes
+                config_json = message["config"]
+            elif "data" in message:
+                config_json = decompress_config(
+                    base64.b64decode(message["data"]), message["encoding"]
+                )
+                if config_hash(config_json) != message["hash"]:
+                    print("Config hash mismatch, dropping config")
+                    return
+                self.config_cache.put(message["hash"], config_json)
+            else:
+                config_json = self.config_cache.get(message["hash"])
+                if config_json is None:
+                    # server thought we had it cached, ask for the full thing
+                    await self.conn.send({"type": "configreq", "hash": message["hash"]})
+                    return
+
+            self.start_game(config_json)
+            held, self.held_packets = self.held_packets, []
+            for held_message in held:
+                await self.handle_packet(held_message)
+
+        elif mtype == "livelist":
+            self.live_matches.update(
+                {md["match_id"]: md for md in message["matches"]}
+            )
+            self.live_version += 1
+
+        elif mtype == "matchlive":
+            self.live_matches[message["match_id"]] = message
+            self.live_version += 1
+
+        elif mtype == "matchend":
+            self.live_matches.pop(message["match_id"], None)
+            self.live_version += 1
+
+            ended = message["match_id"]
+            if (self.current_match and self.current_match.id == ended) or (
+                self.spectating and self.watching_id == ended
+            ):
+                print(f"Match over, winner: {message.get('winner')} ({message.get('reason')})")
+                self.show_result(message.get("winner"), message.get("reason", ""))
+
+        elif mtype == "snapshot":
+            # spectator catch up, moves after message["seq"] follow
+            if not self.game:
+                # the config is still on its way, a newer snapshot replaces this one
+                self.held_packets = [message]
+                return
+            # without the ply the opening book would take this for the start position
+            self.game.load_snapshot(message["turn"], message["pieces"], message.get("ply", 0))
+            self.watching_id = message["match_id"]
+            self.last_seq = message["seq"]
+            self.pending_moves = []
+            self.selected_tile = None
+            self.valid_moves = []
+
+        elif mtype == "moveack":
+            # the server took our move, nothing to redo
+            while self.pending_moves and self.pending_moves[0] <= message["seq"]:
+                self.pending_moves.pop(0)
+
+        elif mtype == "movereject":
+            print(f"Move {message['seq']} rejected: {message.get('reason')}")
+            # the clock packet that follows puts the clock back
+            self.rollback_moves(message["seq"])
 
         elif mtype == "move":
             # opponent's move echoed back from server
+            if not self.game and self.held_packets:
+                self.held_packets.append(message)
+                return
             from_coord = message["from"]
             to_coord = message["to"]
+            if message.get("seq", self.last_seq + 1) <= self.last_seq:
+                return  # already applied before a resume
+            self.last_seq = message.get("seq", self.last_seq + 1)
 
             print("got move back")
             if self.game:
@@ -726,13 +1210,14 @@ class ClientGame:
                 print("thing")
                 if self.current_match:
                     self.current_match.move += 1
+                self.switch_clock()
                 if self.selected_tile is not None:
                     selected_piece = self.game.board.get_piece(self.selected_tile)
                     if selected_piece is None:
                         self.selected_tile = None
                         self.valid_moves = []
                     else:
-                        self.valid_moves = self.game.board.get_valid_actions(self.selected_tile) or []
+                        self.select_tile(self.selected_tile)
                 else:
                     self.valid_moves = []
 
@@ -743,10 +1228,83 @@ class ClientGame:
             if hasattr(self, "status_label") and self.status_label.visible:
                 self.status_label.set_text(f"Error: {error_msg}")
 
+    def switch_clock(self):
+        # local mirror of MatchClock.switch, the server stays authoritative on flags
+        if self.clock_remaining is None or self.clock_turn < 0:
+            return
+        now = time.monotonic()
+        self.clock_remaining[self.clock_turn] -= now - self.clock_mark
+        self.clock_remaining[self.clock_turn] += self.clock_increment
+        self.clock_turn = 1 - self.clock_turn
+        self.clock_mark = now
+
+    def clock_text(self, team: int) -> str:
+        if self.clock_remaining is None:
+            return ""
+        remaining = self.clock_remaining[team]
+        if team == self.clock_turn:
+            remaining -= time.monotonic() - self.clock_mark
+        remaining = max(int(remaining), 0)
+        return f"  {remaining // 60}:{remaining % 60:02d}"
+
+    def start_game(self, config_json: str):
+        players = [self.players[self.opponent_id]] if self.opponent_id else []
+        self.game = Game.from_config(config_json, players)
+
+        if self.current_match:
+            self.current_match.game = self.game
+
+        self.game_state = "game"
+
+    def show_result(self, winner: Optional[int], reason: str) -> None:
+        """Puts the result over the final position, then heads back to the lobby."""
+        if reason == "config_failed":
+            outcome = "Match cancelled"
+        elif winner is None:
+            outcome = "Draw"
+        elif self.spectating:
+            outcome = f"{'White' if winner == 0 else 'Black'} wins"
+        else:
+            outcome = "You win" if winner == self.my_team else "You lose"
+        detail = RESULT_REASONS.get(reason, reason)
+        self.match_result = f"{outcome} ({detail})" if detail else outcome
+
+        # stop the running side's clock where it is
+        if self.clock_remaining is not None and self.clock_turn >= 0:
+            self.clock_remaining[self.clock_turn] -= time.monotonic() - self.clock_mark
+            self.clock_turn = -1
+        self.selected_tile = None
+        self.valid_moves = []
+        asyncio.create_task(self.result_timer(self.match_result))
+
+    async def result_timer(self, result: str) -> None:
+        await asyncio.sleep(RESULT_SECONDS)
+        # unless something else already took us off this result
+        if self.match_result is result:
+            self.return_to_lobby()
+            self.wake_up()
+
     async def vs_screen_timer(self):
         await asyncio.sleep(2)
         if self.game_state == "vs_screen":
             pass
 
+    async def network_loop(self):
+        while self.running:
+            await self.conn.listen(self.receive_packet)
+
+            # only worth reconnecting if there's a match to get back to
+            if not self.running or self.current_match is None or self.session_token is None:
+                break
+            print("Connection lost, trying to resume the match...")
+            if not await self.conn.reconnect():
+                break
+            self.resuming = True
+            # the server may never have seen moves we predicted, it resends any it did
+            self.rollback_moves(0)
+            await self.conn.send(
+                {"type": "resume", "token": self.session_token, "seq": self.last_seq}
+            )
+
     async def run(self):
-        await asyncio.gather(self.conn.listen(self.handle_packet), self.game_loop())
+        await asyncio.gather(self.network_loop(), self.game_loop())
@@ -0,0 +1,48 @@
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+# packets queue up here as the connection reads them and the game loop takes
+# the whole lot once per frame. runs of roster packets (a join/leave storm)
+# collapse into one "roster" update, so the lobby ui is rebuilt once per frame
+# however many players came and went.
+
+ROSTER_PACKETS = {"playerjoin", "playerleave", "playermod"}
+
+
+def coalesce(messages) -> List[Dict[str, Any]]:
+    """Merges each consecutive run of roster packets into a single roster packet.
+
+    Only consecutive runs, so a matchcreate still sees its host joined first and
+    a host leaving still drops the match it created before.
+    """
+    out: List[Dict[str, Any]] = []
+    roster: Optional[Dict[str, Any]] = None
+    for message in messages:
+        mtype = message.get("type")
+        if mtype in ROSTER_PACKETS:
+            if roster is None:
+                roster = {"type": "roster", "players": {}}
+                out.append(roster)
+            player = message["player"]
+            # None means they left, the last word on each player wins
+            roster["players"][player["id"]] = None if mtype == "playerleave" else player
+        else:
+            roster = None
+            out.append(message)
+    return out
+
+
+class PacketInbox:
+    def __init__(self) -> None:
+        self.pending: Deque[Dict[str, Any]] = deque()
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def push(self, message: Dict[str, Any]) -> None:
+        self.pending.append(message)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        batch = coalesce(self.pending)
+        self.pending.clear()
+        return batch
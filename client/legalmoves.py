@@ -0,0 +1,66 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from chess.Board import Board
+
+# legal moves for every piece, worked out on a worker thread whenever the board
+# changes so selecting a piece is a dict lookup instead of a move generation
+# inside the frame. a thread rather than a process, the board would have to be
+# pickled over on every change, and a ruleset table that couldn't be lowered
+# holds its compiled function, which doesn't pickle.
+
+Pos = Tuple[int, int]
+
+
+class LegalMoveMap:
+    def __init__(self) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="legalmoves")
+        # (board, version) the current results belong to
+        self.key: Optional[Tuple[int, int]] = None
+        # team -> {pos: moves}, filled in by the worker as each side finishes
+        self.result: Dict[int, Dict[Pos, List[Pos]]] = {}
+        self.job: Optional[Future] = None
+        # called from the worker thread whenever a side is ready
+        self.on_ready: Optional[Callable[[], None]] = None
+
+    def refresh(self, board: Board, first_team: int) -> None:
+        """Starts over if the board changed since the last call, cheap otherwise."""
+        key = (id(board), board.version)
+        if key == self.key:
+            return
+        self.key = key
+        self.result = {}
+        if self.job:
+            self.job.cancel()
+        # the worker gets its own grid, the live one keeps changing under it
+        self.job = self.executor.submit(
+            self._compute, key, board.copy(), self.result, [first_team, 1 - first_team]
+        )
+
+    def lookup(self, board: Board, pos: Pos) -> Optional[List[Pos]]:
+        """Moves for the piece at pos, or None if they aren't worked out yet."""
+        piece = board.get_piece(pos)
+        if piece is None or (id(board), board.version) != self.key:
+            return None
+        moves = self.result.get(piece.team)
+        if moves is None:
+            return None
+        return moves.get(pos, [])
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _compute(
+        self,
+        key: Tuple[int, int],
+        board: Board,
+        result: Dict[int, Dict[Pos, List[Pos]]],
+        teams: List[int],
+    ) -> None:
+        for team in teams:
+            if key != self.key:
+                return  # the board moved on, don't hold up the next job
+            # a stale job can still land here, in a result nobody reads anymore
+            result[team] = board.legal_moves(team)
+            if self.on_ready:
+                self.on_ready()
@@ -0,0 +1,133 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import pygame
+import pygame_gui
+
+# scrollable list of matches in the lobby. a busy server can have thousands of
+# open matches and a pygame_gui button costs every frame whether it's on screen
+# or not, so the list only ever has one button per row that fits and points them
+# at whichever matches are scrolled into view.
+#
+# the matches live in a dict owned by the game, along with a version number it
+# bumps whenever the dict changes. sync() does nothing while the version (and
+# the scroll position) stay the same, so calling it every frame costs nothing.
+
+ROW_HEIGHT = 50
+BUTTON_HEIGHT = 40
+SCROLLBAR_WIDTH = 4
+
+Color = Tuple[int, int, int]
+
+
+class MatchList:
+    def __init__(
+        self,
+        manager: pygame_gui.UIManager,
+        rect: pygame.Rect,
+        label: Callable[[Hashable, Any], str],
+    ) -> None:
+        self.rect = rect
+        # button text for a (key, value) of the matches dict
+        self.label = label
+        self.buttons = []
+        for i in range(max(rect.height // ROW_HEIGHT, 1)):
+            button = pygame_gui.elements.UIButton(
+                relative_rect=pygame.Rect(rect.x, rect.y + i * ROW_HEIGHT, rect.width, BUTTON_HEIGHT),
+                text="",
+                manager=manager,
+            )
+            button.hide()
+            self.buttons.append(button)
+        # what each button shows, None while it's hidden
+        self.showing: List[Optional[str]] = [None] * len(self.buttons)
+
+        self.source: Dict[Hashable, Any] = {}
+        self.keys: List[Hashable] = []
+        self.version = -1
+        # index of the match in the top row
+        self.first = 0
+        self.shown = False
+        # the buttons need pointing at different rows
+        self.stale = False
+
+    def sync(self, source: Dict[Hashable, Any], version: int) -> bool:
+        """Brings the buttons up to date with source, if it or the scroll changed.
+
+        True if they were, pygame_gui redraws the buttons on its next update.
+        """
+        if version != self.version or source is not self.source:
+            self.source = source
+            self.keys = list(source)
+            self.version = version
+            self.first = min(self.first, self.max_first())
+            self.stale = True
+        if not self.stale:
+            return False
+        self.stale = False
+        self.refresh()
+        return True
+
+    def refresh(self) -> None:
+        for i, button in enumerate(self.buttons):
+            index = self.first + i
+            text = None
+            if self.shown and index < len(self.keys):
+                key = self.keys[index]
+                text = self.label(key, self.source[key])
+            if text == self.showing[i]:
+                continue
+            if text is None:
+                button.hide()
+            else:
+                # set_text rebuilds the button's image, only when it actually changed
+                button.set_text(text)
+                if self.showing[i] is None:
+                    button.show()
+            self.showing[i] = text
+
+    def max_first(self) -> int:
+        return max(len(self.keys) - len(self.buttons), 0)
+
+    def scroll(self, rows: int) -> bool:
+        """Moves the list down by rows (up if negative), False if it was already at the end."""
+        first = min(max(self.first + rows, 0), self.max_first())
+        if first == self.first:
+            return False
+        self.first = first
+        # buttons are repointed on the next sync, against the current matches
+        self.stale = True
+        return True
+
+    def scroll_at(self, pos: Tuple[int, int], rows: int) -> bool:
+        """Scrolls if pos is over the list."""
+        return self.rect.collidepoint(pos) and self.scroll(rows)
+
+    def key_for(self, element: Any) -> Optional[Hashable]:
+        """Key of the match behind a pressed button, None if it's not one of ours."""
+        for i, button in enumerate(self.buttons):
+            if button is element and self.first + i < len(self.keys):
+                return self.keys[self.first + i]
+        return None
+
+    def show(self) -> None:
+        # filled in on the next sync, the matches may have changed while hidden
+        self.shown = True
+        self.stale = True
+
+    def hide(self) -> None:
+        self.shown = False
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def draw(self, screen: pygame.Surface, track: Color, thumb: Color) -> None:
+        """Scrollbar next to the list, when there's more than fits."""
+        if not self.shown or len(self.keys) <= len(self.buttons):
+            return
+        height = len(self.buttons) * ROW_HEIGHT - (ROW_HEIGHT - BUTTON_HEIGHT)
+        bar = pygame.Rect(self.rect.right + 6, self.rect.y, SCROLLBAR_WIDTH, height)
+        pygame.draw.rect(screen, track, bar)
+        thumb_height = max(height * len(self.buttons) // len(self.keys), 8)
+        thumb_y = bar.y + (height - thumb_height) * self.first // self.max_first()
+        pygame.draw.rect(screen, thumb, (bar.x, thumb_y, SCROLLBAR_WIDTH, thumb_height))
@@ -0,0 +1,69 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Tuple
+
+# per-phase frame timings for the F3 overlay. phases add up within a frame
+# (packets can be handled several times per frame) and the last HISTORY frames
+# are kept for averages and worst cases.
+
+HISTORY = 120
+
+# display order, anything else timed shows up after these
+PHASES = [
+    "events",
+    "ui.update",
+    "legalmoves",
+    "render.scene",
+    "render.ui",
+    "render.present",
+    "packets",
+]
+
+
+class FrameProfiler:
+    def __init__(self) -> None:
+        self.visible = False
+        self.current: Dict[str, float] = {}
+        self.history: Dict[str, Deque[float]] = {}
+        self.frames: Deque[float] = deque(maxlen=HISTORY)
+        self.frame_start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.current[name] = self.current.get(name, 0.0) + seconds
+
+    def end_frame(self) -> None:
+        now = time.perf_counter()
+        self.frames.append(now - self.frame_start)
+        self.frame_start = now
+
+        for name in self.current.keys() | self.history.keys():
+            history = self.history.get(name)
+            if history is None:
+                history = self.history[name] = deque(maxlen=HISTORY)
+            history.append(self.current.get(name, 0.0))
+        self.current = {}
+
+    def summary(self) -> List[Tuple[str, float, float]]:
+        """(phase, average ms, worst ms) over the recent frames."""
+        names = [p for p in PHASES if p in self.history]
+        names += sorted(self.history.keys() - set(PHASES))
+        rows = []
+        for name in names:
+            history = self.history[name]
+            rows.append((name, sum(history) / len(history) * 1000, max(history) * 1000))
+        return rows
+
+    def frame_ms(self) -> Tuple[float, float]:
+        """Average and worst wall time between frames, sleep included."""
+        if not self.frames:
+            return 0.0, 0.0
+        return sum(self.frames) / len(self.frames) * 1000, max(self.frames) * 1000
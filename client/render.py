@@ -0,0 +1,101 @@
+from typing import Dict, List, Tuple
+
+import pygame
+
+# surfaces and fonts the client draws with every frame. creating a Font reads
+# the font file and every render() rasterizes text, so anything that doesn't
+# change between frames is built once here and blitted from then on.
+
+Color = Tuple[int, int, int]
+
+# rendered strings kept around before the text cache starts over. clock labels
+# change every second, so this can't just grow forever.
+MAX_CACHED_TEXT = 512
+
+
+class RenderCache:
+    def __init__(self) -> None:
+        self.fonts: Dict[int, pygame.font.Font] = {}
+        self.texts: Dict[Tuple[str, int, Color], pygame.Surface] = {}
+        self.wrapped: Dict[Tuple[str, int, int], List[str]] = {}
+        self.pieces: Dict[Tuple[str, int, int], pygame.Surface] = {}
+        self.boards: Dict[Tuple[int, int, int], pygame.Surface] = {}
+
+    def font(self, size: int) -> pygame.font.Font:
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.Font(None, size)
+        return font
+
+    def text(self, text: str, size: int, color: Color) -> pygame.Surface:
+        key = (text, size, color)
+        surface = self.texts.get(key)
+        if surface is None:
+            if len(self.texts) >= MAX_CACHED_TEXT:
+                self.texts.clear()
+            surface = self.texts[key] = self.font(size).render(text, True, color)
+        return surface
+
+    def wrap(self, text: str, size: int, width: int) -> List[str]:
+        """Splits text into lines that fit in width pixels."""
+        key = (text, size, width)
+        lines = self.wrapped.get(key)
+        if lines is not None:
+            return lines
+
+        font = self.font(size)
+        lines = []
+        current_line = ""
+        for word in text.split():
+            test_line = current_line + " " + word if current_line else word
+            if font.size(test_line)[0] < width:
+                current_line = test_line
+            else:
+                if current_line:
+                    lines.append(current_line)
+                current_line = word
+        if current_line:
+            lines.append(current_line)
+        self.wrapped[key] = lines
+        return lines
+
+    def piece(
+        self, name: str, team: int, square_size: int, ring: Color, label: Color
+    ) -> pygame.Surface:
+        """A piece token (team ring plus short name), keyed by (name, team)."""
+        key = (name, team, square_size)
+        surface = self.pieces.get(key)
+        if surface is None:
+            surface = pygame.Surface((square_size, square_size), pygame.SRCALPHA)
+            center = (square_size // 2, square_size // 2)
+            radius = max(square_size // 2 - 6, square_size // 3)
+            pygame.draw.circle(surface, ring, center, radius, 5)
+            text = self.font(24).render(name[:4].upper(), True, label)
+            surface.blit(text, text.get_rect(center=center))
+            self.pieces[key] = surface
+        return surface
+
+    def board(
+        self, grid_size: int, square_size: int, my_team: int, light: Color, dark: Color
+    ) -> pygame.Surface:
+        """The bare checkerboard as seen from my_team's side."""
+        key = (grid_size, square_size, my_team)
+        surface = self.boards.get(key)
+        if surface is None:
+            size = grid_size * square_size
+            surface = pygame.Surface((size, size)).convert()
+            for row in range(grid_size):
+                for col in range(grid_size):
+                    # same orientation as ClientGame.board_display_coords
+                    if my_team == 1:
+                        display_row, display_col = row, grid_size - 1 - col
+                    else:
+                        display_row, display_col = grid_size - 1 - row, col
+                    color = light if (row + col) % 2 == 0 else dark
+                    pygame.draw.rect(
+                        surface,
+                        color,
+                        (display_col * square_size, display_row * square_size, square_size, square_size),
+                    )
+            self.boards[key] = surface
+        return surface
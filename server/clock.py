@@ -0,0 +1,57 @@
+import time
+from typing import Any, Callable, List, Optional
+
+from .timers import Timer, TimerWheel
+
+# default time control, 10 minutes each plus 5 seconds per move
+BASE_TIME = 600.0
+INCREMENT = 5.0
+
+
+class MatchClock:
+    """Chess clock for one match, the running side's flag is a timer on the wheel."""
+
+    def __init__(
+        self,
+        timers: TimerWheel,
+        on_timeout: Callable[[int], Any],
+        base: float = BASE_TIME,
+        increment: float = INCREMENT,
+    ) -> None:
+        self.timers = timers
+        self.on_timeout = on_timeout
+        self.increment = increment
+        self.remaining: List[float] = [base, base]
+        self.turn = 0
+        self.turn_started = 0.0
+        self.timer: Optional[Timer] = None
+
+    def start(self, turn: int) -> None:
+        self.turn = turn
+        self.turn_started = time.monotonic()
+        self.timer = self.timers.schedule(
+            self.remaining[turn], lambda: self.on_timeout(turn)
+        )
+
+    def switch(self) -> None:
+        """Called after the side to move made its move."""
+        self.stop()
+        self.remaining[self.turn] += self.increment
+        self.start(1 - self.turn)
+
+    def stop(self) -> None:
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+            self.remaining[self.turn] -= time.monotonic() - self.turn_started
+
+    def state(self) -> dict:
+        remaining = list(self.remaining)
+        if self.timer:
+            remaining[self.turn] -= time.monotonic() - self.turn_started
+        return {
+            "type": "clock",
+            "remaining": [max(r, 0.0) for r in remaining],
+            "turn": self.turn,
+            "increment": self.increment,
+        }
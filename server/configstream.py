@@ -0,0 +1,130 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# incremental parsing of a match config while gemini is still streaming it.
+#
+# the config is {"rulesets": [...], "pieces": [...], "starting_pos": [...]}.
+# the parser keeps the text seen so far and scans only the new part for where
+# each element of those lists starts and ends, tracking nesting and strings,
+# and hands every finished element out as soon as its closing brace arrives.
+# nothing is ever parsed twice, each element goes through json.loads once.
+
+SECTIONS = ("rulesets", "pieces", "starting_pos")
+
+# (section, index in it, the element)
+Element = Tuple[str, int, Dict[str, Any]]
+
+
+class ConfigStreamError(ValueError):
+    pass
+
+
+class ConfigStreamParser:
+    def __init__(self) -> None:
+        self.text = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        # top level key whose value is being read, and the last string closed at depth 1
+        self.key: Optional[str] = None
+        self.string_start = 0
+        self.last_string: Optional[str] = None
+        self.element_start = 0
+        self.counts = {section: 0 for section in SECTIONS}
+        # sections whose list has closed
+        self.finished: List[str] = []
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Element]:
+        """Elements completed by chunk, in order."""
+        if self.done:
+            if chunk.strip():
+                raise ConfigStreamError("text after the end of the config")
+            return []
+        self.text += chunk
+        text = self.text
+        elements = []
+        i = self.pos
+        while i < len(text):
+            c = text[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif c == "\\":
+                    self.escaped = True
+                elif c == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.last_string = json.loads(text[self.string_start : i + 1])
+            elif c == '"':
+                self.in_string = True
+                self.string_start = i
+            elif c == ":" and self.depth == 1:
+                self.key = self.last_string
+            elif c in "{[":
+                self.depth += 1
+                if self.depth == 3 and self.key in SECTIONS:
+                    self.element_start = i
+            elif c in "}]":
+                self.depth -= 1
+                if self.depth < 0:
+                    raise ConfigStreamError("unbalanced brackets")
+                if self.depth == 2 and self.key in SECTIONS:
+                    elements.append(self._element(text[self.element_start : i + 1]))
+                elif self.depth == 1 and self.key in SECTIONS:
+                    self.finished.append(self.key)
+                elif self.depth == 0:
+                    self.done = True
+                    i += 1
+                    if text[i:].strip():
+                        raise ConfigStreamError("text after the end of the config")
+                    break
+            i += 1
+        self.pos = i
+        return elements
+
+    def _element(self, raw: str) -> Element:
+        try:
+            data = json.loads(raw)
+        except ValueError as e:
+            raise ConfigStreamError(f"bad {self.key} entry: {e}") from None
+        if not isinstance(data, dict):
+            raise ConfigStreamError(f"{self.key} entries must be objects")
+        index = self.counts[self.key]
+        self.counts[self.key] += 1
+        return self.key, index, data
+
+
+def check_element(section: str, data: Dict[str, Any], counts: Dict[str, int]) -> None:
+    """Raises ConfigStreamError if data can't be part of a valid config.
+
+    counts is how many entries each finished section has. references into a
+    section are only checked once it's in there, the schema puts rulesets
+    before pieces before starting_pos but nothing makes gemini stick to that.
+    """
+    try:
+        if section == "rulesets":
+            if not isinstance(data["target_moves"], str) or not isinstance(data["target_takes"], str):
+                raise ConfigStreamError("ruleset functions must be strings")
+            if not isinstance(data["jump"], bool) or not isinstance(data["max_range"], int):
+                raise ConfigStreamError("ruleset jump and max_range have the wrong types")
+        elif section == "pieces":
+            for key in ("name", "desc", "move_desc"):
+                if not isinstance(data[key], str):
+                    raise ConfigStreamError(f"piece {key} must be a string")
+            rulesets = data["rulesets"]
+            if not isinstance(rulesets, list) or not all(isinstance(i, int) for i in rulesets):
+                raise ConfigStreamError("piece rulesets must be a list of indices")
+            if "rulesets" in counts and not all(0 <= i < counts["rulesets"] for i in rulesets):
+                raise ConfigStreamError(f"piece {data['name']} uses rulesets that don't exist")
+        elif section == "starting_pos":
+            x, y, piece = data["x"], data["y"], data["piece"]
+            if not all(isinstance(v, int) for v in (x, y, piece)):
+                raise ConfigStreamError("starting positions must be integers")
+            if not (0 <= x < 8 and 0 <= y < 8):
+                raise ConfigStreamError(f"starting position {x}, {y} is off the board")
+            if "pieces" in counts and not 0 <= piece < counts["pieces"]:
+                raise ConfigStreamError(f"starting position uses piece {piece}, which doesn't exist")
+    except KeyError as e:
+        raise ConfigStreamError(f"{section} entry is missing {e}") from None
@@ -1,48 +1,66 @@
 import asyncio
 import json
+import multiprocessing
+import os
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import asdict
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 from dotenv import load_dotenv
-from google import genai
-from pydantic import BaseModel
 
+from chess.configstore import ConfigStore, StoredConfig
+from chess.Game import Game
 from chess.match import Match
+from chess.opening import book_workers, build_book
 from chess.player import PlayerState
-
+from chess.rulecompiler import RuleCompileError
+from chess.Ruleset import preload_rulesets
+from chess.record import GameArchive, GameRecord
+from chess.protocol import (
+    CODECS,
+    JSON_CODEC,
+    PROTOCOL_JSON,
+    SUPPORTED_PROTOCOLS,
+    ProtocolError,
+    pick_protocol,
+)
+
+from .clock import MatchClock
+from .configstream import SECTIONS, ConfigStreamError, ConfigStreamParser, check_element
+from .journal import Journal
+from .matchmaker import MATCHMAKER_TICK, Matchmaker
+from .ratelimit import RateLimiter
 from .lobby import Lobby
+from .session import SESSION_GRACE, ParkedSession, new_session_token
+from .spectate import EncodedMessage, MatchFeed
+from .timers import Timer, TimerWheel
+
+# send a ping after this long without hearing from a client, and drop them
+# once they've been silent for IDLE_TIMEOUT
+PING_INTERVAL = 15.0
+IDLE_TIMEOUT = 45.0
+
+PING = EncodedMessage({"type": "ping"})
+
+# clients only ever send small packets
+MAX_INBOUND_FRAME = 16 * 1024
+# packets read ahead of the handler, reading pauses (and tcp backs up) past this
+INBOX_SIZE = 32
+# receivers that let this much pile up unsent get disconnected
+MAX_SEND_BACKLOG = 1024 * 1024
+# names get broadcast to everyone, keep them short
+MAX_NAME_LENGTH = 32
+# gemini streams read at once, on threads of their own so slow ones can't hold
+# up the default executor (the journal's fsyncs, loading games). more wait their turn
+CONFIG_STREAMS = 8
+# threads waiting on sandbox workers for streamed rulesets
+CONFIG_COMPILERS = 4
 
 load_dotenv()
 
 
-# structured schema for gemini
-class Ruleset(BaseModel):
-    jump: bool
-    target_moves: str
-    target_takes: str
-    max_range: int
-
-
-class Piece(BaseModel):
-    name: str
-    desc: str
-    move_desc: str
-    rulesets: List[int]
-
-
-class StartPos(BaseModel):
-    x: int
-    y: int
-    piece: int  # index into pieces
-
-
-class ChessConfig(BaseModel):
-    rulesets: List[Ruleset]
-    pieces: List[Piece]
-    starting_pos: List[StartPos]
-
-
 # Connection for a signle player
 class PlayerConnection:
     def __init__(
@@ -57,31 +75,105 @@ class PlayerConnection:
         self.player_state = player_state
         # current game
         self.match: Optional[Match] = None
+        # wire codec, starts as json until the client negotiates otherwise
+        self.codec = JSON_CODEC
+        # optional features the client announced in its hello
+        self.features: set[str] = set()
+        # config hashes this client is known to have
+        self.known_configs: set[str] = set()
+        # live match feed this connection is spectating, if any
+        self.spectating: Optional[MatchFeed] = None
+        # lets the player resume their match from a new connection
+        self.token = new_session_token()
+        # for heartbeats and idle reaping
+        self.last_seen = time.monotonic()
+        self.heartbeat: Optional[Timer] = None
+        self.limiter = RateLimiter()
 
     async def send(self, obj: Any) -> None:
+        await self.send_frame(self.codec.encode(obj))
+
+    async def send_frame(self, frame: bytes) -> None:
+        await self.send_frames([frame])
+
+    async def send_frames(self, frames: List[bytes]) -> None:
+        try:
+            # all written before yielding, so nothing else gets interleaved
+            for frame in frames:
+                self.writer.write(frame)
+            await self.writer.drain()
+        except Exception as e:
+            print(f"Failed to send to client: {e}")
+
+    async def send_config(self, stored: StoredConfig, likely_cached: bool = False) -> None:
+        """Sends a config, or just its hash when the client should have it on disk.
+
+        likely_cached is for configs that aren't fresh off the generator, a
+        resumed player or a spectator that turns out not to have it asks again
+        with a configreq.
+        """
+        if "confighash" not in self.features:
+            # old clients only understand the inline json
+            await self.send({"type": "matchconfig", "config": stored.config_json})
+            return
+
+        include_book = "openingbook" in self.features
+        if likely_cached or stored.hash in self.known_configs:
+            await self.send(stored.message(include_data=False, include_book=include_book))
+            return
+
+        encoding = "zstd" if "zstd" in self.features else "zlib"
+        await self.send(stored.message(encoding, include_book=include_book))
+        self.known_configs.add(stored.hash)
+
+    async def switch_protocol(self, name: str) -> None:
+        # the ack is the last json frame, everything after it uses the new codec
+        self.writer.write(self.codec.encode({"type": "hello", "protocol": name}))
+        self.codec = CODECS[name]
         try:
-            json_data: str = json.dumps(obj)
-            self.writer.write(json_data.encode() + b"\n")
             await self.writer.drain()
         except Exception as e:
             print(f"Failed to send to client: {e}")
 
 
 class Server:
-    def __init__(self) -> None:
+    def __init__(
+        self, journal_path: Optional[str] = None, archive_path: Optional[str] = None
+    ) -> None:
         self.clients: Dict[asyncio.StreamWriter, PlayerConnection] = {}
         self.id_to_conn: Dict[int, PlayerConnection] = {}
         # TODO! use match uid instead of player id key, this uses playerid key rn
         self.matches: Dict[int, Match] = {}
+        # matches with both players, keyed by match id
+        self.live_matches: Dict[int, Match] = {}
+        self.feeds: Dict[int, MatchFeed] = {}
+        # players who dropped out of a live match, keyed by session token
+        self.parked: Dict[str, ParkedSession] = {}
+        # one wheel drives heartbeats, session expiry and chess clocks
+        self.timers = TimerWheel()
+        self.clocks: Dict[int, MatchClock] = {}
+        self.matchmaker = Matchmaker()
+        self.next_match_id = 0
         self.id = 0
-        self.gemini = genai.Client()
+        self.configs = ConfigStore()
+        # crash recovery log, disabled when no path is given
+        self.journal: Optional[Journal] = Journal(journal_path) if journal_path else None
+        # finished games, for replaying after engine changes. disabled when no path is given
+        self.archive: Optional[GameArchive] = GameArchive(archive_path) if archive_path else None
+        # built on first use, importing the genai sdk alone takes most of a second
+        self._gemini = None
+        # searches opening books for new configs, also started on first use
+        self._book_pool: Optional[ProcessPoolExecutor] = None
+        # threads only start as they're needed
+        self.stream_pool = ThreadPoolExecutor(max_workers=CONFIG_STREAMS, thread_name_prefix="configstream")
+        self.compile_pool = ThreadPoolExecutor(max_workers=CONFIG_COMPILERS, thread_name_prefix="configcompile")
         self.gemini_prompt = """
 > Craft a mirrored two-player strategy ruleset for an 8-by-8 grid world. Each side deploys custom unit types that obey the following framework:
 > * Output must be JSON only and validate against the schema {"rulesets": List[Ruleset], "pieces": List[Piece], "starting_pos": List[StartPos]}. Do not include prose outside the JSON. Creating a large amount of unique pieces is encouraged, generally above 6. Unique games with 1/2 pieces must have some mechanic that makes it a fun or interesting game to play, including a unique starting position, unique, never-seen-before abilities for the single/few pieces, etc.
 > * A ruleset is either sliding (ray-extended up to `max_range`) or jumping (single hop that ignores blockers). The boolean `jump` selects behaviour.
 > * You may compose multiple rulesets for one piece by providing multiple indices in a piece's rulesets: List[int] array. For example, creating a queen that can also jump like a knight.
 > * Movement generators `target_moves` and `target_takes` MUST be Python function definitions named `mv_func` and `tk_func`. They accept an integer `n` (the unit’s own action count, starting at 1) and RETURN a List[Tuple[int,int]] of (dx, dy) offsets relative to the owning side’s forward direction (positive y away from the owning player).
-> * These functions MUST be valid Python 3 code and MUST compile. Prefer a single-line `return ...` expression after the function header. No imports or external names.
+> * These functions MUST be valid Python 3 code and MUST compile. The body MUST be a single `return ...` expression after the function header, using only integer constants, `n`, tuples/lists, list comprehensions over `range`, arithmetic (+ - * // %), comparisons, and/or/not, conditional expressions and abs/min/max. No imports, attributes or other names; anything else is rejected.
 > * These functions MUST NOT reference each other, for example, tk_func cannot call mv_func within it, as they are independently processed.
 > * Encode alternating/conditional patterns USING `n` inside `mv_func`/`tk_func` (e.g. parity, thresholds). DO NOT compose multiple rulesets just to alternate; compose rulesets only to combine different behaviours (e.g. add jumps to a slider) or to separate movement vs capture targeting.
 > * Sliding offsets are expanded internally according to `max_range`. For a two-step opening advance followed by one-step advances, set `max_range = 1` and return both distances in `mv_func` on the first action, e.g.:
@@ -97,75 +189,521 @@ class Server:
 > You MUST avoid creating pieces with the same moveset of classical chess at any cost as that ruins uniqueness (for example, a ruleset where a piece moves two times forward on the first turn, and captures one diagonally, which belongs to a pawn in classical chess). 
 """
 
+    @property
+    def gemini(self):
+        if self._gemini is None:
+            fake_config = os.getenv("WTC_FAKE_CONFIG")
+            if fake_config:
+                # streams that config file instead of asking gemini, for running without an api key
+                from .fakegen import FakeGemini
+
+                self._gemini = FakeGemini(fake_config)
+            else:
+                from google import genai
+
+                self._gemini = genai.Client()
+        return self._gemini
+
+    @property
+    def book_pool(self) -> ProcessPoolExecutor:
+        if self._book_pool is None:
+            # forkserver, forking the server itself would copy its threads' locks mid use
+            self._book_pool = ProcessPoolExecutor(
+                max_workers=book_workers(), mp_context=multiprocessing.get_context("forkserver")
+            )
+        return self._book_pool
+
+    def generate_config(self) -> Iterator[str]:
+        """Asks gemini for a fresh match config, yielding the json as it streams in.
+
+        Blocks between chunks, so iterate it in a thread.
+        """
+        from .schema import ChessConfig
+
+        for chunk in self.gemini.models.generate_content_stream(
+            model="gemini-2.5-flash",
+            contents=self.gemini_prompt,
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": ChessConfig,
+            },
+        ):
+            if chunk.text:
+                yield chunk.text
+
+    async def stream_config(self, match: Match, players: List[PlayerConnection]) -> Optional[str]:
+        """Generates a config, getting it ready while it streams in.
+
+        Rulesets are compiled in the sandbox as they arrive and every piece is
+        sent out as a matchconfigpart for the vs screen, so once the last of the
+        json is in only the board itself is left to build. Returns the config
+        json, or None if a player left in the meantime. Raises ConfigStreamError
+        or RuleCompileError for a config that's no good.
+        """
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def pump() -> None:
+            if stop.is_set():
+                return  # given up on while it waited for a thread
+            try:
+                for chunk in self.generate_config():
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+                    if stop.is_set():
+                        return
+            except Exception as exc:
+                loop.call_soon_threadsafe(chunks.put_nowait, exc)
+            loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+        parser = ConfigStreamParser()
+        elements = []
+        compiling: List[asyncio.Future] = []
+        loop.run_in_executor(self.stream_pool, pump)
+        try:
+            while not parser.done:
+                chunk = await chunks.get()
+                if chunk is None:
+                    raise ConfigStreamError("config stream ended before the config did")
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if any(p.match is not match for p in players):
+                    return None
+
+                rulesets = []
+                for section, index, data in parser.feed(chunk):
+                    check_element(section, data, {s: parser.counts[s] for s in parser.finished})
+                    elements.append((section, data))
+                    if section == "rulesets":
+                        rulesets.append((data["target_moves"], data["target_takes"]))
+                    elif section == "pieces":
+                        part = {
+                            "type": "matchconfigpart",
+                            "match_id": match.id,
+                            "index": index,
+                            "piece": {key: data[key] for key in ("name", "desc", "move_desc")},
+                        }
+                        for p in players:
+                            await p.send(part)
+                if rulesets:
+                    # one sandbox worker for whatever this chunk finished
+                    compiling.append(loop.run_in_executor(self.compile_pool, preload_rulesets, rulesets))
+        finally:
+            stop.set()
+            for future in compiling:
+                # failures surface through the gather below, or don't matter anymore
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        # sections can come in any order, check references against the whole thing
+        missing = [s for s in SECTIONS if not parser.counts[s]]
+        if missing:
+            raise ConfigStreamError(f"config has no {', '.join(missing)}")
+        for section, data in elements:
+            check_element(section, data, parser.counts)
+        await asyncio.gather(*compiling)
+        return parser.text
+
     async def start(self):
-        server = await asyncio.start_server(self.handle_client, "0.0.0.0", 9090)
+        asyncio.create_task(self.timers.run())
+        self.timers.schedule(MATCHMAKER_TICK, self.matchmaking_tick)
+        if self.journal:
+            self.recover_matches()
+            self.journal.start()
+
+        server = await asyncio.start_server(
+            self.handle_client, "0.0.0.0", 9090, limit=MAX_INBOUND_FRAME
+        )
         addr = server.sockets[0].getsockname()
         print(f"Server started on {addr[0]}:{addr[1]}")
 
-        async with server:
-            await server.serve_forever()
-
-    async def send(self, writer: asyncio.StreamWriter, obj: Any) -> None:
         try:
-            json_data: str = json.dumps(obj)
-            writer.write(json_data.encode() + b"\n")
-            await writer.drain()
-        except Exception as e:
-            print(f"Failed to send to client: {e}")
+            async with server:
+                await server.serve_forever()
+        finally:
+            # cancelled on shutdown, get the last moves onto disk
+            if self.journal:
+                await self.journal.close()
 
     async def broadcast(self, obj: Any, exclude_id: int = 0) -> None:
-        disconnected = []
-        for writer, player_connection in self.clients.items():
+        # encode once per codec rather than once per recipient
+        frames: Dict[str, bytes] = {}
+        for writer, player_connection in list(self.clients.items()):
+            if player_connection.player_state.id == exclude_id:
+                continue
+            # no awaiting drain per client, one slow reader would hold up everyone
+            transport = writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > MAX_SEND_BACKLOG:
+                print(f"Dropping client {player_connection.player_state.id}, not reading")
+                writer.close()
+                continue
+            codec = player_connection.codec
+            if codec.name not in frames:
+                frames[codec.name] = codec.encode(obj)
+            writer.write(frames[codec.name])
+
+    def recover_matches(self) -> None:
+        state = self.journal.recover()
+        # don't hand out ids that journaled matches still refer to
+        self.id = max(self.id, state.max_player_id)
+        self.next_match_id = max([self.next_match_id, *state.matches.keys()])
+
+        for journaled in state.live_matches():
+            stored = self.configs.put(state.configs[journaled.config_hash])
+            p1, p2 = [PlayerState(**p) for p in journaled.players]
             try:
-                if player_connection.player_state.id != exclude_id:
-                    await player_connection.send(obj)
-            except Exception:
-                disconnected.append(writer)
+                game = Game.from_config(stored.config_json, [p1, p2])
+            except RuleCompileError as e:
+                print(f"Not recovering match {journaled.id}, its config was rejected: {e}")
+                continue
+            # each side's clock as of its last move, the turn that was running
+            # when the server went down starts over from there
+            remaining: List[Optional[float]] = [None, None]
+            for (from_pos, to_pos), move_time in zip(journaled.moves, journaled.move_times):
+                mover = game.current_turn
+                # these were validated when they were first accepted
+                game.move_piece(from_pos, to_pos, validate=False)
+                if move_time is not None:
+                    remaining[mover] = move_time
+            if game.result is not None:
+                # went down between the last move and journaling the end
+                self.journal.match_end(journaled.id, game.result.winner, game.result.reason)
+                continue
+
+            match = Match(
+                id=journaled.id,
+                p1=p1,
+                p2=p2,
+                move=len(journaled.moves),
+                game=game,
+                config_hash=stored.hash,
+            )
+            self.live_matches[match.id] = match
+            self.feeds[match.id] = MatchFeed(match)
+            self.start_clock(match, remaining)
+
+            # nobody is connected yet, both sides get the usual grace window
+            for player_state, token in zip((p1, p2), journaled.tokens):
+                if token:
+                    self.park_session(token, player_state, match)
+
+        print(f"Recovered {len(self.live_matches)} live matches from {self.journal.path}")
+
+    def park_session(self, token: str, player_state: PlayerState, match: Match) -> None:
+        session = ParkedSession(token, player_state, match)
+        session.expiry = self.timers.schedule(
+            SESSION_GRACE, lambda: self.expire_session(token)
+        )
+        self.parked[token] = session
+
+    async def expire_session(self, token: str) -> None:
+        session = self.parked.pop(token, None)
+        if session is None:
+            return
+        match = session.match
+        if match.id in self.live_matches:
+            winner = 1 if match.p1 and match.p1.id == session.player_state.id else 0
+            await self.end_match(match, winner, "abandoned")
+
+    async def resume_session(self, player: PlayerConnection, token: str, seq: int) -> None:
+        session = self.parked.pop(token, None)
+        if session is None or session.match.id not in self.live_matches:
+            await player.send({"type": "resumefail"})
+            return
+        session.cancel()
+        match = session.match
+
+        # the fresh identity this connection got on connect goes away again
+        await player.player_state.replicate(self, "playerleave")
+        self.id_to_conn.pop(player.player_state.id, None)
+        if player.match is not None:
+            await self.leave_match(player)
+
+        player.player_state = session.player_state
+        player.token = token
+        player.match = match
+        self.id_to_conn[player.player_state.id] = player
+        await player.player_state.replicate(self, "playerjoin", exclude_self=False)
+
+        team = 0 if match.p1 and match.p1.id == player.player_state.id else 1
+        other_state = match.p2 if team == 0 else match.p1
+        await player.send(
+            {
+                "type": "resumed",
+                "match_id": match.id,
+                "team": team,
+                "other_id": other_state.id if other_state else None,
+                "seq": match.move,
+            }
+        )
+
+        # only what they missed, unless it already fell out of the ring
+        feed = self.feeds[match.id]
+        missed = feed.moves_since(seq)
+        if missed is None:
+            await player.send_config(self.configs.get(match.config_hash), likely_cached=True)
+            snapshot = feed.current_snapshot()
+            missed = [snapshot] + (feed.moves_since(snapshot.message["seq"]) or [])
+        await player.send_frames([entry.frame(player.codec) for entry in missed])
+        await player.send(self.clocks[match.id].state())
+
+        other = self.other_player(player)
+        if other:
+            await other.send({"type": "opponentback"})
+
+    def start_clock(self, match: Match, remaining: Optional[List[Optional[float]]] = None) -> None:
+        clock = MatchClock(
+            self.timers, lambda team: self.end_match(match, 1 - team, "timeout")
+        )
+        for team, seconds in enumerate(remaining or ()):
+            if seconds is not None:
+                clock.remaining[team] = seconds
+        clock.start(match.game.current_turn)
+        self.clocks[match.id] = clock
+
+    def matchmaking_tick(self) -> None:
+        self.timers.schedule(MATCHMAKER_TICK, self.matchmaking_tick)
+
+        for p1_id, p2_id in self.matchmaker.pair(time.monotonic()):
+            host = self.id_to_conn.get(p1_id)
+            joiner = self.id_to_conn.get(p2_id)
+            if host is None or joiner is None or host.match or joiner.match:
+                # someone slipped away between queueing and pairing, requeue the other
+                for conn in (host, joiner):
+                    if conn and conn.match is None:
+                        self.matchmaker.enqueue(conn.player_state.id, time.monotonic())
+                continue
+
+            self.next_match_id += 1
+            match = Match(
+                id=self.next_match_id, p1=host.player_state, p2=joiner.player_state
+            )
+            host.match = match
+            joiner.match = match
+            # config generation takes a while, pairs shouldn't wait on each other
+            asyncio.create_task(self.start_match(host, joiner))
+
+    def schedule_heartbeat(self, conn: PlayerConnection) -> None:
+        conn.heartbeat = self.timers.schedule(PING_INTERVAL, lambda: self.heartbeat(conn))
+
+    def heartbeat(self, conn: PlayerConnection) -> None:
+        if conn.writer not in self.clients:
+            return
+
+        idle = time.monotonic() - conn.last_seen
+        if idle >= IDLE_TIMEOUT:
+            # closing makes the read loop see eof and do the usual cleanup
+            print(f"Reaping idle client {conn.player_state.id}")
+            conn.writer.close()
+            return
+        if idle >= PING_INTERVAL:
+            conn.writer.write(PING.frame(conn.codec))
+        self.schedule_heartbeat(conn)
+
+    def other_player(self, player: PlayerConnection) -> Optional[PlayerConnection]:
+        match = player.match
+        if match is None:
+            return None
+        if match.p1 and match.p1.id != player.player_state.id:
+            return self.id_to_conn.get(match.p1.id)
+        if match.p2 and match.p2.id != player.player_state.id:
+            return self.id_to_conn.get(match.p2.id)
+        return None
+
+    def live_match_info(self, match: Match) -> Dict[str, Any]:
+        return {
+            "match_id": match.id,
+            "p1_name": match.p1.name if match.p1 else None,
+            "p2_name": match.p2.name if match.p2 else None,
+            "config_hash": match.config_hash,
+        }
+
+    async def end_match(
+        self, match: Match, winner: Optional[int] = None, reason: str = ""
+    ) -> None:
+        if self.live_matches.pop(match.id, None) is None:
+            return  # already over, e.g. a timeout racing a disconnect
+        clock = self.clocks.pop(match.id, None)
+        if clock:
+            clock.stop()
+        if self.journal:
+            self.journal.match_end(match.id, winner, reason)
+        feed = self.feeds.pop(match.id, None)
+        if feed:
+            for conn in list(feed.spectators):
+                feed.remove_spectator(conn)
+
+        for state in (match.p1, match.p2):
+            conn = self.id_to_conn.get(state.id) if state else None
+            if conn and conn.match is match:
+                conn.match = None
+
+        # everyone gets it, lobbies drop it from the live list
+        await self.broadcast(
+            {"type": "matchend", "match_id": match.id, "winner": winner, "reason": reason}
+        )
+
+        if self.archive and match.game and match.config_hash:
+            await self.archive_game(match, winner, reason)
+
+    async def abort_match(self, match: Match, players: List[PlayerConnection], error_msg: str) -> None:
+        """Calls off a match that never went live, sending both players back to the lobby."""
+        print(error_msg)
+        self.matches.pop(match.p1.id if match.p1 else None, None)
+        for conn in players:
+            if conn.match is not match:
+                continue  # already left, or moved on
+            conn.match = None
+            await conn.send({"type": "error", "message": error_msg})
+            await conn.send(
+                {"type": "matchend", "match_id": match.id, "winner": None, "reason": "config_failed"}
+            )
 
-        for writer in disconnected:
-            del self.clients[writer]
+    async def archive_game(self, match: Match, winner: Optional[int], reason: str) -> None:
+        moves = [(record.from_pos, record.to_pos) for record in match.game.history]
+        record = GameRecord(match.config_hash, moves, winner, reason)
+        stored = self.configs.get(match.config_hash)
+        try:
+            await asyncio.to_thread(self.archive.add, record, stored.config_json)
+        except OSError as e:
+            print(f"Failed to archive match {match.id}: {e}")
+
+    async def leave_match(self, player: PlayerConnection) -> None:
+        match = player.match
+        if match is None:
+            return
+
+        if match.p2 is None:
+            # still waiting for an opponent, just take the listing down
+            self.matches.pop(player.player_state.id, None)
+            player.match = None
+            await self.broadcast(
+                {"type": "matchremove", "host_id": player.player_state.id}
+            )
+            return
+
+        # the other side wins by forfeit
+        winner = 1 if match.p1 and match.p1.id == player.player_state.id else 0
+        player.match = None
+        if match.id in self.live_matches:
+            await self.end_match(match, winner, "disconnect")
+        else:
+            other = self.id_to_conn.get(
+                match.p1.id if winner == 0 else match.p2.id
+            )
+            if other and other.match is match:
+                other.match = None
+                await other.send(
+                    {"type": "matchend", "match_id": match.id, "winner": winner, "reason": "disconnect"}
+                )
 
     async def handle_packet(self, player: PlayerConnection, packet: Dict[str, Any]):
         # change name via a name packet
         mtype = packet["type"]
         print(f"Processing packet for {player.player_state.name}: {packet}")
-        if mtype == "name":
-            player.player_state.name = packet["name"]
-            print(f"Registered new player {packet['name']}")
+        if mtype == "hello":
+            player.features = set(packet.get("features", []))
+            protocol = pick_protocol(packet.get("protocols", [packet.get("protocol")]))
+            if protocol != PROTOCOL_JSON:
+                await player.switch_protocol(protocol)
+
+        elif mtype == "pong":
+            pass  # last_seen is bumped for every frame already
+
+        elif mtype == "name":
+            player.player_state.name = str(packet["name"])[:MAX_NAME_LENGTH]
+            print(f"Registered new player {player.player_state.name}")
             await player.player_state.replicate(self, "playermod", exclude_self=False)
 
         elif mtype == "move":
             from_coord = packet["from"]
             to_coord = packet["to"]
 
-            if player.match and player.match.game:
-                success = player.match.game.move_piece(
-                    (from_coord[0], from_coord[1]), (to_coord[0], to_coord[1])
-                )
+            # clients that predict their moves tag them with the seq they expect
+            seq = packet.get("seq")
 
-                print(f"{player.match.p1.name}")
-                print(f"{player.match.p2.name}")
-                # Find the other player in the match and echo the move
-                other_player = None
-                if player.match.p1 and player.match.p1.id != player.player_state.id:
-                    other_player = self.id_to_conn.get(player.match.p1.id)
-                elif player.match.p2 and player.match.p2.id != player.player_state.id:
-                    other_player = self.id_to_conn.get(player.match.p2.id)
-
-                print("got it")
-                if other_player:
-                    await other_player.send(
-                        {"type": "move", "from": from_coord, "to": to_coord}
+            match = player.match
+            if not (match and match.game and match.id in self.feeds):
+                if seq is not None:
+                    await player.send(
+                        {"type": "movereject", "seq": seq, "reason": "not in a live match"}
                     )
-                    print("AWFAWAGESSG")
+                return
 
-                print("AWFW")
+            success = match.game.move_piece(
+                (from_coord[0], from_coord[1]), (to_coord[0], to_coord[1])
+            )
+            if not success:
+                if seq is not None:
+                    # the clock didn't move either, resend it so the client can undo its switch
+                    reject = {"type": "movereject", "seq": seq, "reason": "illegal move"}
+                    await player.send_frames(
+                        [
+                            player.codec.encode(reject),
+                            player.codec.encode(self.clocks[match.id].state()),
+                        ]
+                    )
+                return
+
+            # encoded once, shared by the opponent and every spectator
+            clock = self.clocks[match.id]
+            clock.switch()
+            feed = self.feeds[match.id]
+            entry = feed.publish_move(from_coord, to_coord)
+            if self.journal:
+                # the mover's clock is stopped now, with the increment added
+                self.journal.move(match.id, from_coord, to_coord, clock.remaining[1 - clock.turn])
+            other_player = self.other_player(player)
+            if other_player:
+                await other_player.send_frame(entry.frame(other_player.codec))
+            if seq is not None:
+                await player.send({"type": "moveack", "seq": match.move})
+            # spectators go after the opponent so they never delay the game itself
+            feed.fan_out(entry)
+
+            result = match.game.result
+            if result is not None:
+                await self.end_match(match, result.winner, result.reason)
+
+        elif mtype == "resume":
+            await self.resume_session(player, packet["token"], packet.get("seq", 0))
+
+        elif mtype == "spectate":
+            if player.match is not None:
+                return
+
+            feed = self.feeds.get(packet["match_id"])
+            if feed is None:
+                await player.send({"type": "error", "message": "Match is not live"})
+                return
+
+            if player.spectating:
+                player.spectating.remove_spectator(player)
+
+            await player.send_config(self.configs.get(feed.match.config_hash), likely_cached=True)
+            feed.add_spectator(player)
+
+        elif mtype == "unspectate":
+            if player.spectating:
+                player.spectating.remove_spectator(player)
+
+        elif mtype == "configreq":
+            # client was sent a hash it turned out not to have cached
+            stored = self.configs.get(packet["hash"])
+            if stored is None:
+                await player.send({"type": "error", "message": "Unknown config"})
+                return
+            player.known_configs.discard(stored.hash)
+            await player.send_config(stored)
 
         elif mtype == "matchcreate":
             if player.match is not None:
                 return
+            self.matchmaker.dequeue(player.player_state.id)
 
-            match = Match(p1=player.player_state)
+            self.next_match_id += 1
+            match = Match(id=self.next_match_id, p1=player.player_state)
             self.matches[player.player_state.id] = match
             player.match = match
 
@@ -190,6 +728,7 @@ class Server:
                 return
 
             # then we join up
+            self.matchmaker.dequeue(player.player_state.id)
 
             del self.matches[other.player_state.id]
             player.match = other.match
@@ -199,39 +738,114 @@ class Server:
                 {"type": "matchremove", "host_id": other.player_state.id}
             )
 
-            await player.send(
-                {"type": "matchstart", "other_id": other.player_state.id, "team": 1}
-            )
-            await other.send(
-                {"type": "matchstart", "other_id": player.player_state.id, "team": 0}
-            )
+            await self.start_match(other, player)
 
-            try:
-                response = self.gemini.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=self.gemini_prompt,
-                    config={
-                        "response_mime_type": "application/json",
-                        "response_schema": ChessConfig,
-                    },
-                )
-                config_json = response.text
-            except Exception as exc:
-                error_msg = f"Failed to generate match config: {exc}"
-                print(error_msg)
-                await player.send({"type": "error", "message": error_msg})
-                await other.send({"type": "error", "message": error_msg})
+        elif mtype == "matchqueue":
+            if player.match is not None or player.spectating:
                 return
+            self.matchmaker.enqueue(
+                player.player_state.id, time.monotonic(), packet.get("rating")
+            )
+            await player.send({"type": "queued", "size": len(self.matchmaker)})
+
+        elif mtype == "matchunqueue":
+            self.matchmaker.dequeue(player.player_state.id)
+
+    async def start_match(self, host: PlayerConnection, joiner: PlayerConnection) -> None:
+        """Generates the config for a freshly paired match and sets it live."""
+        match = host.match
+        player, other = joiner, host
+
+        await player.send(
+            {
+                "type": "matchstart",
+                "match_id": match.id,
+                "other_id": other.player_state.id,
+                "team": 1,
+            }
+        )
+        await other.send(
+            {
+                "type": "matchstart",
+                "match_id": match.id,
+                "other_id": player.player_state.id,
+                "team": 0,
+            }
+        )
 
-            if other.match:
-                from chess.Game import Game
+        try:
+            config_json = await self.stream_config(match, [player, other])
+            if config_json is None:
+                return  # someone left while the config was generating
+            # rulesets are compiled by now, but building the board still isn't free
+            game = await asyncio.to_thread(
+                Game.from_config, config_json, [player.player_state, other.player_state]
+            )
+        except (RuleCompileError, ConfigStreamError) as exc:
+            await self.abort_match(match, [player, other], f"Generated match config was rejected: {exc}")
+            return
+        except Exception as exc:
+            await self.abort_match(match, [player, other], f"Failed to generate match config: {exc}")
+            return
+
+        if other.match is not match or player.match is not match:
+            # someone left while the config was generating
+            return
+
+        stored = self.configs.put(config_json)
+        match.game = game
+        match.config_hash = stored.hash
+        self.live_matches[match.id] = match
+        self.feeds[match.id] = MatchFeed(match)
+        self.start_clock(match)
+        if self.journal:
+            self.journal.config(stored.hash, stored.config_json)
+            self.journal.match_start(
+                match.id,
+                stored.hash,
+                [asdict(match.p1), asdict(match.p2)],
+                [other.token, player.token],
+            )
 
-                other.match.game = Game.from_config(
-                    config_json, [player.player_state, other.player_state]
-                )
+        await player.send_config(stored)
+        await other.send_config(stored)
+        clock_state = self.clocks[match.id].state()
+        await player.send(clock_state)
+        await other.send(clock_state)
+        await self.broadcast({"type": "matchlive", **self.live_match_info(match)})
 
-            await player.send({"type": "matchconfig", "config": config_json})
-            await other.send({"type": "matchconfig", "config": config_json})
+        # the game doesn't wait on the book, it follows once it's searched
+        if stored.book is None:
+            asyncio.create_task(self.send_book(match, stored))
+
+    async def send_book(self, match: Match, stored: StoredConfig) -> None:
+        """Works out the opening book for a live match and sends it to whoever wants it."""
+        try:
+            stored.book = await asyncio.to_thread(build_book, stored.config_json, self.book_pool)
+        except Exception as exc:
+            # the game works without one
+            print(f"Failed to build an opening book: {exc}")
+            return
+        if self.live_matches.get(match.id) is not match:
+            return  # over before the book was done, it's kept for resends anyway
+
+        message = {"type": "openingbook", "match_id": match.id, "hash": stored.hash, "book": stored.book}
+        players = [self.id_to_conn.get(state.id) for state in (match.p1, match.p2) if state]
+        recipients = [conn for conn in players if conn and conn.match is match]
+        feed = self.feeds.get(match.id)
+        if feed:
+            recipients += list(feed.spectators)
+        for conn in recipients:
+            if "openingbook" in conn.features:
+                await conn.send(message)
+
+    async def process_inbox(self, player: PlayerConnection, inbox: asyncio.Queue) -> None:
+        while True:
+            message = await inbox.get()
+            try:
+                await self.handle_packet(player, message)
+            except Exception as e:
+                print(f"Error handling {message.get('type')} packet: {e}")
 
     async def handle_client(
         self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
@@ -246,9 +860,17 @@ class Server:
         self.clients[writer] = player_connection
         self.id_to_conn[player_state.id] = player_connection
 
+        # advertise the wire protocols this server speaks
+        await player_connection.send(
+            {"type": "hello", "protocols": SUPPORTED_PROTOCOLS}
+        )
+        await player_connection.send(
+            {"type": "session", "token": player_connection.token, "player_id": player_state.id}
+        )
+
         # send back all the other players
         player_states = [asdict(p.player_state) for p in self.clients.values()]
-        await self.send(writer, {"type": "playerlist", "players": player_states})
+        await player_connection.send({"type": "playerlist", "players": player_states})
 
         # send back all available matches
         match_list = [
@@ -257,29 +879,83 @@ class Server:
             if match.p2
             is None  # only send matches that are waiting for a second player
         ]
-        await self.send(writer, {"type": "matchlist", "matches": match_list})
+        await player_connection.send({"type": "matchlist", "matches": match_list})
+
+        # and the ones already being played, for spectating
+        live_list = [self.live_match_info(match) for match in self.live_matches.values()]
+        await player_connection.send({"type": "livelist", "matches": live_list})
 
         await player_state.replicate(self, "playerjoin", exclude_self=False)
+        self.schedule_heartbeat(player_connection)
+
+        # reading and handling are split so a full inbox stops the reads
+        inbox: asyncio.Queue = asyncio.Queue(maxsize=INBOX_SIZE)
+        processor = asyncio.create_task(self.process_inbox(player_connection, inbox))
 
         try:
             while True:
-                data = await reader.readline()
-                if not data:
-                    break
-
+                # the codec may change after a hello, so look it up every frame
                 try:
-                    message: Dict[str, Any] = json.loads(data.decode().strip())
-                    await self.handle_packet(player_connection, message)
+                    message: Optional[Dict[str, Any]] = (
+                        await player_connection.codec.read(reader, MAX_INBOUND_FRAME)
+                    )
                 except json.JSONDecodeError as e:
                     print(f"Invalid JSON from {client_addr}: {e}")
+                    continue
+                except ProtocolError as e:
+                    # framing is lost at this point, there's no resyncing
+                    print(f"Protocol error from {client_addr}: {e}")
+                    break
+                if message is None:
+                    break
+
+                player_connection.last_seen = time.monotonic()
+                if not isinstance(message, dict):
+                    continue
+                if not player_connection.limiter.allow(message.get("type")):
+                    if player_connection.limiter.abusive:
+                        print(f"Disconnecting {client_addr}, too many packets")
+                        break
+                    if message.get("type") == "move" and "seq" in message:
+                        # a predicted move has to hear back either way
+                        reject = {"type": "movereject", "seq": message["seq"], "reason": "rate limited"}
+                        player_connection.writer.write(player_connection.codec.encode(reject))
+                    continue
+
+                if message.get("type") == "hello":
+                    # has to happen before the next read, it can switch the codec
+                    await self.handle_packet(player_connection, message)
+                    continue
+
+                await inbox.put(message)
 
         except Exception as e:
             print(f"Error: {e}")
         finally:
+            processor.cancel()
+            if player_connection.heartbeat:
+                player_connection.heartbeat.cancel()
+            self.matchmaker.dequeue(player_connection.player_state.id)
+            if player_connection.spectating:
+                player_connection.spectating.remove_spectator(player_connection)
+
+            # the connection may have taken over a resumed identity
+            player_state = player_connection.player_state
+            match = player_connection.match
+            if match is not None and match.id in self.live_matches:
+                # hold their seat for a while instead of forfeiting right away
+                self.park_session(player_connection.token, player_state, match)
+                other = self.other_player(player_connection)
+                player_connection.match = None
+                if other:
+                    await other.send({"type": "opponentaway", "grace": SESSION_GRACE})
+            else:
+                await self.leave_match(player_connection)
+
             if writer in self.clients:
                 await player_state.replicate(self, "playerleave")
                 del self.clients[writer]
-                del self.id_to_conn[player_state.id]
+                self.id_to_conn.pop(player_state.id, None)
 
             writer.close()
             await writer.wait_closed()
@@ -0,0 +1,38 @@
+import time
+from dataclasses import dataclass
+from typing import Iterator
+
+# stand-in for the gemini client that streams a config from disk, a chunk at a
+# time at roughly the pace gemini does. for running the server without an api
+# key (WTC_FAKE_CONFIG=bench/configs/tidewater.json) and for benchmarking.
+
+CHUNK_SIZE = 200
+# gemini 2.5 flash streams a config in a few seconds
+CHUNK_DELAY = 0.1
+
+
+@dataclass
+class FakeChunk:
+    text: str
+
+
+class FakeModels:
+    def __init__(self, path: str, chunk_size: int, delay: float) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.delay = delay
+        # perf_counter when the last stream finished, for benchmarks
+        self.finished = 0.0
+
+    def generate_content_stream(self, **kwargs) -> Iterator[FakeChunk]:
+        with open(self.path) as f:
+            text = f.read()
+        for start in range(0, len(text), self.chunk_size):
+            time.sleep(self.delay)
+            yield FakeChunk(text[start : start + self.chunk_size])
+        self.finished = time.perf_counter()
+
+
+class FakeGemini:
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE, delay: float = CHUNK_DELAY) -> None:
+        self.models = FakeModels(path, chunk_size, delay)
@@ -0,0 +1,325 @@
+import asyncio
+import json
+import mmap
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from chess.protocol import decode_varint, encode_varint, square_index, square_pos
+
+# append-only journal of match lifecycle events, so live games survive a crash.
+#
+# records are <u32 length><u32 crc32><u8 type><payload>. moves are the hot path
+# and get a tiny binary payload (with the mover's clock in ms, so a recovered
+# match doesn't get its time back), the rare lifecycle events are json. appends only
+# touch an in-memory buffer; a background task writes whatever piled up and
+# fsyncs it from a worker thread, so one fsync covers every move in the window
+# and the event loop never waits on the disk. finished matches are dropped on
+# startup and, once the file has grown enough, by the flusher between commits.
+
+REC_CONFIG = 1
+REC_MATCH_START = 2
+REC_MOVE = 3
+REC_MATCH_END = 4
+
+HEADER = struct.Struct(">II")
+
+# how long appends are allowed to pile up before a group commit
+FLUSH_INTERVAL = 0.005
+
+# the journal is compacted down to the live matches once it's this big and has
+# doubled since the last compaction
+COMPACT_SIZE = 4 * 1024 * 1024
+
+# a batch that failed to write is kept and retried after this long. on shutdown
+# it gets CLOSE_RETRIES more tries before it's given up on
+RETRY_INTERVAL = 1.0
+CLOSE_RETRIES = 3
+
+
+def encode_record(rtype: int, payload: bytes) -> bytes:
+    body = bytes([rtype]) + payload
+    return HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def iter_records(data) -> Iterator[Tuple[int, int, bytes]]:
+    """Yields (end offset, type, payload), stopping at the first torn or corrupt record."""
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        length, crc = HEADER.unpack_from(data, offset)
+        start = offset + HEADER.size
+        end = start + length
+        if length == 0 or end > len(data):
+            return
+        body = bytes(data[start:end])
+        if zlib.crc32(body) != crc:
+            return
+        yield end, body[0], body[1:]
+        offset = end
+
+
+@dataclass
+class JournaledMatch:
+    id: int
+    config_hash: str
+    players: List[Dict[str, Any]]
+    # session tokens of p1 and p2, so they can resume after a restart
+    tokens: List[Optional[str]] = field(default_factory=list)
+    moves: List[Tuple[Tuple[int, int], Tuple[int, int]]] = field(default_factory=list)
+    # the mover's remaining time after each move, None for records without one
+    move_times: List[Optional[float]] = field(default_factory=list)
+    ended: bool = False
+
+
+@dataclass
+class JournalState:
+    configs: Dict[str, str] = field(default_factory=dict)
+    matches: Dict[int, JournaledMatch] = field(default_factory=dict)
+    max_player_id: int = 0
+    # length of the valid prefix, anything after it is a torn write
+    valid_length: int = 0
+
+    def live_matches(self) -> List[JournaledMatch]:
+        return [m for m in self.matches.values() if not m.ended]
+
+
+def read_journal(path: str) -> JournalState:
+    state = JournalState()
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return state
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for end, rtype, payload in iter_records(data):
+            state.valid_length = end
+            if rtype == REC_CONFIG:
+                h = payload[:32].hex()
+                state.configs[h] = zlib.decompress(payload[32:]).decode()
+            elif rtype == REC_MATCH_START:
+                info = json.loads(payload)
+                state.matches[info["match_id"]] = JournaledMatch(
+                    info["match_id"],
+                    info["config_hash"],
+                    info["players"],
+                    info.get("tokens", []),
+                )
+                for player in info["players"]:
+                    state.max_player_id = max(state.max_player_id, player["id"])
+            elif rtype == REC_MOVE:
+                match_id, offset = decode_varint(payload)
+                match = state.matches.get(match_id)
+                if match is not None:
+                    from_pos = tuple(square_pos(payload[offset]))
+                    to_pos = tuple(square_pos(payload[offset + 1]))
+                    match.moves.append((from_pos, to_pos))
+                    remaining = None
+                    if len(payload) > offset + 2:
+                        remaining = decode_varint(payload, offset + 2)[0] / 1000
+                    match.move_times.append(remaining)
+            elif rtype == REC_MATCH_END:
+                info = json.loads(payload)
+                match = state.matches.get(info["match_id"])
+                if match is not None:
+                    match.ended = True
+    return state
+
+
+class Journal:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.pending = bytearray()
+        self.written_configs: set[str] = set()
+        self.file = None
+        self.wakeup = asyncio.Event()
+        self.flusher: Optional[asyncio.Task] = None
+        # set by close, the flusher writes what's left and stops
+        self.closing = False
+        # bytes in the file, and how many it had after the last compaction
+        self.size = 0
+        self.compacted_size = 0
+        # configs appended while a compaction runs, they may be missing from its output
+        self.compacting = False
+        self.configs_during_compaction: set[str] = set()
+
+    def recover(self) -> JournalState:
+        """Reads the journal and compacts it down to the matches that are still live."""
+        state = read_journal(self.path)
+        self.written_configs = self._rewrite(state)
+        return state
+
+    def start(self) -> None:
+        self.file = open(self.path, "ab")
+        self.size = self.compacted_size = os.path.getsize(self.path)
+        self.flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """Writes out whatever is pending, waiting on a write already under way."""
+        self.closing = True
+        if self.flusher:
+            self.wakeup.set()
+            await self.flusher
+            self.flusher = None
+        elif self.pending and self.file:
+            await asyncio.to_thread(self._write_and_sync, bytes(self.pending))
+            self.pending.clear()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    '''
+    Appends, all of these return immediately
+    '''
+
+    def config(self, config_hash: str, config_json: str) -> None:
+        if self.compacting:
+            # the compaction may drop it if no live match uses it yet, a
+            # second copy is harmless
+            self.configs_during_compaction.add(config_hash)
+        elif config_hash in self.written_configs:
+            return
+        self.written_configs.add(config_hash)
+        self._append(self._config_record(config_hash, config_json))
+
+    def match_start(
+        self,
+        match_id: int,
+        config_hash: str,
+        players: List[Dict[str, Any]],
+        tokens: List[Optional[str]],
+    ) -> None:
+        self._append(self._start_record(match_id, config_hash, players, tokens))
+
+    def move(self, match_id: int, from_pos, to_pos, remaining: Optional[float] = None) -> None:
+        self._append(self._move_record(match_id, from_pos, to_pos, remaining))
+
+    def match_end(self, match_id: int, winner: Optional[int], reason: str) -> None:
+        payload = json.dumps({"match_id": match_id, "winner": winner, "reason": reason})
+        self._append(encode_record(REC_MATCH_END, payload.encode()))
+
+    '''
+    Helpers
+    '''
+
+    def _config_record(self, config_hash: str, config_json: str) -> bytes:
+        payload = bytes.fromhex(config_hash) + zlib.compress(config_json.encode())
+        return encode_record(REC_CONFIG, payload)
+
+    def _start_record(
+        self,
+        match_id: int,
+        config_hash: str,
+        players: List[Dict[str, Any]],
+        tokens: List[Optional[str]],
+    ) -> bytes:
+        payload = json.dumps(
+            {
+                "match_id": match_id,
+                "config_hash": config_hash,
+                "players": players,
+                "tokens": tokens,
+            }
+        )
+        return encode_record(REC_MATCH_START, payload.encode())
+
+    def _move_record(self, match_id: int, from_pos, to_pos, remaining: Optional[float] = None) -> bytes:
+        payload = encode_varint(match_id) + bytes([square_index(from_pos), square_index(to_pos)])
+        if remaining is not None:
+            payload += encode_varint(max(round(remaining * 1000), 0))
+        return encode_record(REC_MOVE, payload)
+
+    def _append(self, record: bytes) -> None:
+        self.pending += record
+        self.wakeup.set()
+
+    def _rewrite(self, state: JournalState) -> set[str]:
+        """Replaces the file with just the matches still live in state, returns the configs kept."""
+        # rewrite instead of appending, finished matches don't need to stick around
+        written: set[str] = set()
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            for match in state.live_matches():
+                if match.config_hash not in written:
+                    f.write(self._config_record(match.config_hash, state.configs[match.config_hash]))
+                    written.add(match.config_hash)
+                f.write(
+                    self._start_record(match.id, match.config_hash, match.players, match.tokens)
+                )
+                for (from_pos, to_pos), remaining in zip(match.moves, match.move_times):
+                    f.write(self._move_record(match.id, from_pos, to_pos, remaining))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        return written
+
+    def _compact(self) -> set[str]:
+        # worker thread, between flushes, so nothing else touches the file
+        self.file.close()
+        try:
+            written = self._rewrite(read_journal(self.path))
+        finally:
+            self.file = open(self.path, "ab")
+        self.size = self.compacted_size = os.path.getsize(self.path)
+        return written
+
+    def _write_and_sync(self, data: bytes) -> None:
+        if self.file.closed:
+            # a failed write couldn't reopen it last time
+            self._reopen()
+        try:
+            self.file.write(data)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError:
+            # cut off whatever part of the batch made it out, it's all retried
+            # and a torn record in the middle would hide every one after it
+            self._reopen()
+            raise
+        self.size += len(data)
+
+    def _reopen(self) -> None:
+        """Truncates the file back to what was last synced and opens it again."""
+        try:
+            self.file.close()
+        except OSError:
+            pass  # closing flushes the buffer, which can fail the same way
+        os.truncate(self.path, self.size)
+        self.file = open(self.path, "ab")
+
+    async def _flush_loop(self) -> None:
+        close_retries = CLOSE_RETRIES
+        while not (self.closing and not self.pending):
+            await self.wakeup.wait()
+            if not self.closing:
+                # let a few more appends join this commit
+                await asyncio.sleep(FLUSH_INTERVAL)
+            self.wakeup.clear()
+            data = bytes(self.pending)
+            self.pending.clear()
+            try:
+                await asyncio.to_thread(self._write_and_sync, data)
+            except OSError as e:
+                if self.closing:
+                    close_retries -= 1
+                    if close_retries < 0:
+                        print(f"Failed to write match journal, {len(data)} bytes lost: {e}")
+                        continue
+                # not durable yet, back in front of whatever came in meanwhile
+                self.pending[:0] = data
+                print(f"Failed to write match journal, retrying: {e}")
+                await asyncio.sleep(RETRY_INTERVAL)
+                self.wakeup.set()
+                continue
+
+            # finished matches pile up otherwise, recover() only compacts on startup
+            if not self.closing and self.size >= max(COMPACT_SIZE, self.compacted_size * 2):
+                self.compacting = True
+                self.configs_during_compaction.clear()
+                try:
+                    written = await asyncio.to_thread(self._compact)
+                except OSError as e:
+                    print(f"Failed to compact match journal: {e}")
+                else:
+                    self.written_configs = written | self.configs_during_compaction
+                finally:
+                    self.compacting = False
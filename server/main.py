@@ -15,7 +15,11 @@ async def main() -> None:
         os.environ["GOOGLE_API_KEY"] = sys.argv[1]
         print(f"Using API key from command line argument")
 
-    server_conn = Server()
+    # set WTC_JOURNAL to an empty string to run without crash recovery
+    journal_path = os.getenv("WTC_JOURNAL", "matches.journal") or None
+    # and WTC_ARCHIVE to an empty string to not keep finished games
+    archive_path = os.getenv("WTC_ARCHIVE", "games.wtcr") or None
+    server_conn = Server(journal_path=journal_path, archive_path=archive_path)
 
     await server_conn.start()
 
@@ -0,0 +1,101 @@
+import bisect
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+# players without a rating all land in the same bucket and pair first come first served
+DEFAULT_RATING = 1200
+# the rating comes from the client, anything outside this is clamped to it
+MIN_RATING = 0
+MAX_RATING = 3000
+
+# how far apart two ratings may be when pairing, widening the longer someone waits
+BASE_WINDOW = 100
+WINDOW_GROWTH = 10  # per second waited
+MAX_WINDOW = 1000
+
+# how often the server pairs up whoever is queued
+MATCHMAKER_TICK = 0.5
+
+
+@dataclass
+class QueueEntry:
+    player_id: int
+    rating: int
+    enqueued_at: float
+
+    @property
+    def key(self) -> Tuple[int, float, int]:
+        return (self.rating, self.enqueued_at, self.player_id)
+
+    def window(self, now: float) -> float:
+        return min(BASE_WINDOW + (now - self.enqueued_at) * WINDOW_GROWTH, MAX_WINDOW)
+
+
+def clamp_rating(rating: Any) -> int:
+    """A rating from the client as an int in [MIN_RATING, MAX_RATING], DEFAULT_RATING if it isn't a number."""
+    if isinstance(rating, bool) or not isinstance(rating, (int, float)) or not math.isfinite(rating):
+        return DEFAULT_RATING
+    return min(max(int(rating), MIN_RATING), MAX_RATING)
+
+
+class Matchmaker:
+    """Queue of players looking for a game, kept sorted by rating."""
+
+    def __init__(self) -> None:
+        self.entries: Dict[int, QueueEntry] = {}
+        # sorted (rating, enqueued_at, player_id), binary searched on insert and remove.
+        # inserting into a list is O(n), but it's a memmove of a few us even at 100k
+        # queued and every tick walks the whole ladder in pair() anyway
+        self.ladder: List[Tuple[int, float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, player_id: int) -> bool:
+        return player_id in self.entries
+
+    def enqueue(self, player_id: int, now: float, rating: Any = None) -> None:
+        if player_id in self.entries:
+            return
+        entry = QueueEntry(player_id, clamp_rating(rating), now)
+        self.entries[player_id] = entry
+        bisect.insort(self.ladder, entry.key)
+
+    def dequeue(self, player_id: int) -> None:
+        entry = self.entries.pop(player_id, None)
+        if entry is None:
+            return
+        idx = bisect.bisect_left(self.ladder, entry.key)
+        if idx < len(self.ladder) and self.ladder[idx] == entry.key:
+            del self.ladder[idx]
+
+    def pair(self, now: float) -> List[Tuple[int, int]]:
+        """Pairs up neighbours on the ladder whose ratings are close enough.
+
+        Returns (p1, p2) ids, with p1 the one who waited longer, and takes them
+        out of the queue.
+        """
+        pairs: List[Tuple[int, int]] = []
+        unpaired: List[Tuple[int, float, int]] = []
+        i = 0
+        ladder = self.ladder
+        while i < len(ladder):
+            if i + 1 < len(ladder):
+                a = self.entries[ladder[i][2]]
+                b = self.entries[ladder[i + 1][2]]
+                # the more patient of the two decides how wide the window is
+                window = max(a.window(now), b.window(now))
+                if b.rating - a.rating <= window:
+                    first, second = (a, b) if a.enqueued_at <= b.enqueued_at else (b, a)
+                    pairs.append((first.player_id, second.player_id))
+                    del self.entries[a.player_id]
+                    del self.entries[b.player_id]
+                    i += 2
+                    continue
+            unpaired.append(ladder[i])
+            i += 1
+
+        # still sorted, it's a subsequence of the old ladder
+        self.ladder = unpaired
+        return pairs
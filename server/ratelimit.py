@@ -0,0 +1,71 @@
+import time
+from typing import Any, Dict, Tuple
+
+# (tokens per second, burst) for each packet type. the lobby packets trigger a
+# broadcast to everyone so they get the tightest budgets.
+PACKET_LIMITS: Dict[str, Tuple[float, float]] = {
+    "name": (0.5, 3),
+    "matchcreate": (0.5, 3),
+    "matchjoin": (0.5, 3),
+    "matchqueue": (0.5, 3),
+    "matchunqueue": (0.5, 3),
+    "spectate": (1.0, 5),
+    "unspectate": (1.0, 5),
+    "configreq": (1.0, 3),
+    "resume": (0.2, 2),
+    "move": (10.0, 20),
+}
+DEFAULT_LIMIT = (5.0, 10)
+
+# budget for everything a single connection sends, whatever the type
+CONNECTION_LIMIT = (30.0, 60)
+
+# dropped packets a connection can rack up (refilling slowly) before it gets cut off
+STRIKE_LIMIT = (0.5, 50)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+class RateLimiter:
+    """Per connection limits, one bucket overall and one per packet type.
+
+    Types not in PACKET_LIMITS all share one default bucket, so made up types
+    don't each get a fresh burst (or grow per_type without bound).
+    """
+
+    def __init__(self) -> None:
+        self.total = TokenBucket(*CONNECTION_LIMIT)
+        self.per_type: Dict[str, TokenBucket] = {
+            mtype: TokenBucket(*limit) for mtype, limit in PACKET_LIMITS.items()
+        }
+        self.default = TokenBucket(*DEFAULT_LIMIT)
+        self.strikes = TokenBucket(*STRIKE_LIMIT)
+        self.abusive = False
+
+    def allow(self, mtype: Any) -> bool:
+        # the type comes straight off the wire and can be anything json allows
+        bucket = self.per_type.get(mtype) if isinstance(mtype, str) else None
+        if bucket is None:
+            bucket = self.default
+
+        # check the type bucket first so a flood of one type doesn't drain the total
+        if bucket.take() and self.total.take():
+            return True
+        if not self.strikes.take():
+            self.abusive = True
+        return False
@@ -0,0 +1,30 @@
+from typing import List
+
+from pydantic import BaseModel
+
+
+# structured schema for gemini
+class Ruleset(BaseModel):
+    jump: bool
+    target_moves: str
+    target_takes: str
+    max_range: int
+
+
+class Piece(BaseModel):
+    name: str
+    desc: str
+    move_desc: str
+    rulesets: List[int]
+
+
+class StartPos(BaseModel):
+    x: int
+    y: int
+    piece: int  # index into pieces
+
+
+class ChessConfig(BaseModel):
+    rulesets: List[Ruleset]
+    pieces: List[Piece]
+    starting_pos: List[StartPos]
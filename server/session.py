@@ -0,0 +1,30 @@
+import secrets
+from dataclasses import dataclass
+from typing import Optional
+
+from chess.match import Match
+from chess.player import PlayerState
+
+from .timers import Timer
+
+# how long a player who dropped out of a live match can come back to it
+SESSION_GRACE = 60.0
+
+
+def new_session_token() -> str:
+    return secrets.token_urlsafe(16)
+
+
+@dataclass
+class ParkedSession:
+    """A player who dropped mid match, held until they resume or the grace runs out."""
+
+    token: str
+    player_state: PlayerState
+    match: Match
+    expiry: Optional[Timer] = None
+
+    def cancel(self) -> None:
+        if self.expiry:
+            self.expiry.cancel()
+            self.expiry = None
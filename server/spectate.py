@@ -0,0 +1,105 @@
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional
+
+from chess.match import Match
+
+# how many recent moves each live match keeps around for catching up late joiners
+RING_SIZE = 256
+
+# spectators whose socket has this much unsent data get dropped instead of
+# slowing anyone else down
+MAX_SPECTATOR_BACKLOG = 256 * 1024
+
+
+class EncodedMessage:
+    """A message plus its wire frame per codec, each encoded on first use."""
+
+    def __init__(self, message: Dict[str, Any]) -> None:
+        self.message = message
+        self.frames: Dict[str, bytes] = {}
+
+    def frame(self, codec) -> bytes:
+        frame = self.frames.get(codec.name)
+        if frame is None:
+            frame = self.frames[codec.name] = codec.encode(self.message)
+        return frame
+
+
+class MatchFeed:
+    """Move stream of one live match, fanned out to its spectators."""
+
+    def __init__(self, match: Match) -> None:
+        self.match = match
+        self.moves: Deque[EncodedMessage] = deque(maxlen=RING_SIZE)
+        self.snapshot: Optional[EncodedMessage] = None
+        # PlayerConnections watching this match
+        self.spectators: List = []
+
+    @property
+    def seq(self) -> int:
+        return self.match.move
+
+    def publish_move(self, from_pos, to_pos) -> EncodedMessage:
+        self.match.move += 1
+        entry = EncodedMessage(
+            {
+                "type": "move",
+                "from": [from_pos[0], from_pos[1]],
+                "to": [to_pos[0], to_pos[1]],
+                "seq": self.match.move,
+            }
+        )
+        self.moves.append(entry)
+        return entry
+
+    def moves_since(self, seq: int) -> Optional[List[EncodedMessage]]:
+        """Moves after seq, or None if some already fell out of the ring."""
+        if seq >= self.match.move:
+            return []
+        oldest = self.match.move - len(self.moves) + 1
+        if seq + 1 < oldest:
+            return None
+        return list(islice(self.moves, seq + 1 - oldest, None))
+
+    def current_snapshot(self) -> EncodedMessage:
+        # the cached snapshot stays good as long as the ring covers every move after it
+        if self.snapshot is None or self.moves_since(self.snapshot.message["seq"]) is None:
+            game = self.match.game
+            self.snapshot = EncodedMessage(
+                {
+                    "type": "snapshot",
+                    "match_id": self.match.id,
+                    "seq": self.match.move,
+                    "turn": game.current_turn,
+                    # move cap, and chess.opening's check for a line it can't see
+                    "ply": game.ply,
+                    "pieces": game.board.snapshot(),
+                }
+            )
+        return self.snapshot
+
+    def add_spectator(self, conn) -> None:
+        snapshot = self.current_snapshot()
+        catch_up = [snapshot] + (self.moves_since(snapshot.message["seq"]) or [])
+
+        # written without yielding, so no live move can land before the catch up
+        for entry in catch_up:
+            conn.writer.write(entry.frame(conn.codec))
+        self.spectators.append(conn)
+        conn.spectating = self
+
+    def remove_spectator(self, conn) -> None:
+        if conn in self.spectators:
+            self.spectators.remove(conn)
+        if conn.spectating is self:
+            conn.spectating = None
+
+    def fan_out(self, entry: EncodedMessage) -> None:
+        for conn in list(self.spectators):
+            transport = conn.writer.transport
+            if transport.is_closing() or transport.get_write_buffer_size() > MAX_SPECTATOR_BACKLOG:
+                print(f"Dropping slow spectator {conn.player_state.id}")
+                self.remove_spectator(conn)
+                continue
+            conn.writer.write(entry.frame(conn.codec))
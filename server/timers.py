@@ -0,0 +1,108 @@
+import asyncio
+import inspect
+import math
+from typing import Any, Callable, List, Optional, Set
+
+# hierarchical timer wheel. every timer lives in exactly one slot set, so
+# scheduling and cancelling are O(1) and a tick only touches the slot that is
+# due (plus an occasional cascade from the coarser wheels). one asyncio task
+# drives the whole thing, instead of a call_later handle per connection.
+
+TICK = 0.1
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+LEVELS = 4  # 64^4 ticks of 100ms is about 19 days
+
+
+class Timer:
+    __slots__ = ("deadline", "callback", "slot")
+
+    def __init__(self, deadline: int, callback: Callable[[], Any]) -> None:
+        self.deadline = deadline
+        self.callback = callback
+        self.slot: Optional[Set["Timer"]] = None
+
+    @property
+    def active(self) -> bool:
+        return self.slot is not None
+
+    def cancel(self) -> None:
+        if self.slot is not None:
+            self.slot.discard(self)
+            self.slot = None
+
+
+class TimerWheel:
+    def __init__(self, tick: float = TICK) -> None:
+        self.tick = tick
+        self.current = 0
+        self.wheels: List[List[Set[Timer]]] = [
+            [set() for _ in range(SLOTS)] for _ in range(LEVELS)
+        ]
+
+    def schedule(self, delay: float, callback: Callable[[], Any]) -> Timer:
+        """Runs callback after delay seconds, rounded up to the next tick.
+
+        Callbacks returning a coroutine get it wrapped in a task.
+        """
+        ticks = max(1, math.ceil(delay / self.tick))
+        timer = Timer(self.current + ticks, callback)
+        self._place(timer)
+        return timer
+
+    def advance(self) -> None:
+        self.current += 1
+
+        # pull timers down from the coarser wheels whenever a finer one wraps
+        level = 1
+        while level < LEVELS and (self.current >> (SLOT_BITS * (level - 1))) & SLOT_MASK == 0:
+            slot = self.wheels[level][(self.current >> (SLOT_BITS * level)) & SLOT_MASK]
+            timers = list(slot)
+            slot.clear()
+            for timer in timers:
+                timer.slot = None
+                self._place(timer)
+            level += 1
+
+        slot = self.wheels[0][self.current & SLOT_MASK]
+        due = list(slot)
+        slot.clear()
+        for timer in due:
+            timer.slot = None
+            self._fire(timer)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        while True:
+            await asyncio.sleep(self.tick)
+            # catch up on ticks missed while the loop was busy
+            target = int((loop.time() - start) / self.tick)
+            while self.current < target:
+                self.advance()
+
+    def __len__(self) -> int:
+        return sum(len(slot) for wheel in self.wheels for slot in wheel)
+
+    def _place(self, timer: Timer) -> None:
+        delta = timer.deadline - self.current
+        if delta <= 0:
+            # due already (cascaded right onto the current tick)
+            self._fire(timer)
+            return
+
+        level = 0
+        while level < LEVELS - 1 and delta >= 1 << (SLOT_BITS * (level + 1)):
+            level += 1
+        slot = self.wheels[level][(timer.deadline >> (SLOT_BITS * level)) & SLOT_MASK]
+        slot.add(timer)
+        timer.slot = slot
+
+    def _fire(self, timer: Timer) -> None:
+        try:
+            result = timer.callback()
+            if inspect.isawaitable(result):
+                asyncio.ensure_future(result)
+        except Exception as e:
+            print(f"Timer callback failed: {e}")